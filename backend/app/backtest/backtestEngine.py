@@ -1,4 +1,5 @@
 import numpy as np
+from numba import njit
 from app.backtest.computeMaxDD import compute_max_drawdown
 
 def backtest(historical, signal_func, initial_capital):
@@ -23,3 +24,46 @@ def backtest(historical, signal_func, initial_capital):
         "returns": portfolio_values.tolist(),
         "max_drawdown": float(compute_max_drawdown(portfolio_values)),
     }
+
+
+@njit(cache=True)
+def _run_positions(prices, signals, cash):
+    # same position/cash transitions as the loop in backtest()
+    position = 0.0
+    portfolio_values = np.zeros_like(prices)
+
+    for i in range(prices.shape[0]):
+        price = prices[i]
+        signal = signals[i]
+        if signal == 1 and cash > 0:
+            position = cash / price
+            cash = 0.0
+        elif signal == -1 and position > 0:
+            cash = position * price
+            position = 0.0
+
+        portfolio_values[i] = cash + position * price
+
+    return portfolio_values
+
+
+def backtest_batch(historical, signals_func, initial_capital):
+    """
+    Batch counterpart of backtest().
+    signals_func(prices) returns the full signal array in one pass
+    (e.g. sma_signals, macd_signals, fama_french_signals).
+    """
+    prices = np.array([h["close"] for h in historical], dtype=float)
+    cash = float(initial_capital or 100)
+
+    signals = np.asarray(signals_func(prices), dtype=np.int8)
+    if signals.shape != prices.shape:
+        raise ValueError("signals_func must return one signal per price.")
+
+    portfolio_values = _run_positions(prices, signals, cash)
+
+    return {
+        "final_value": float(portfolio_values[-1]),
+        "returns": portfolio_values.tolist(),
+        "max_drawdown": float(compute_max_drawdown(portfolio_values)),
+    }
@@ -1,3 +1,5 @@
+from functools import partial
+
 import numpy as np
 
 
@@ -27,24 +29,82 @@ def compute_ff_factors(prices, window=20):
         "VOL": vol[-min_len:]
     }
 
-def fama_french_strategy(index, prices, betas=None, window=20):
+def ff_factor_series(prices, window=20):
+    """
+    Factor series for a whole backtest, computed once.
+    Returns the compute_ff_factors dict plus "offset": the bar index of the
+    first factor value. The value fama_french_strategy sees at bar i is
+    series[i - offset], since each factor only depends on prices[:i + 1].
+    """
+    factors = compute_ff_factors(prices, window=window)
+    factors["offset"] = window - 1
+    return factors
+
+
+def fama_french_strategy(index, prices, betas=None, window=20, factors=None):
     """
     FF-style factor model for crypto.
     Predict expected return from 3 factors:
         E[R] = β1*MKT + β2*MOM + β3*VOL
     BUY if E[R] > 0, else SELL.
+    factors: optional ff_factor_series(prices) output; without it the factors
+    are recomputed from the price prefix on every call. Per-bar backtests
+    should pass make_fama_french_strategy(prices) instead of this function.
     """
 
     if betas is None:
         betas = np.array([1.0, 0.7, -0.4], dtype=float)
     if index < window + 5:
         return 0
-    factors = compute_ff_factors(prices[:index + 1], window=window)
 
-    MKT = factors["MKT"][-1]
-    MOM = factors["MOM"][-1]
-    VOL = factors["VOL"][-1]
+    if factors is None:
+        factors = compute_ff_factors(prices[:index + 1], window=window)
+        pos = -1
+    else:
+        pos = index - factors["offset"]
+
+    MKT = factors["MKT"][pos]
+    MOM = factors["MOM"][pos]
+    VOL = factors["VOL"][pos]
 
     expected_ret = float(betas[0] * MKT + betas[1] * MOM + betas[2] * VOL)
 
     return 1 if expected_ret > 0 else -1
+
+def make_fama_french_strategy(prices, betas=None, window=20):
+    """
+    fama_french_strategy bound to the factor series of `prices`, for per-bar
+    callers such as backtest(): the factors are computed once here instead of
+    once per bar. Only valid for this price series (or a prefix of it).
+    """
+    prices = np.asarray(prices, dtype=float)
+    # too short for any factor value: every bar is still in the warm-up
+    factors = ff_factor_series(prices, window=window) if len(prices) >= window + 2 else None
+    return partial(fama_french_strategy, betas=betas, window=window, factors=factors)
+
+def fama_french_signals(prices, betas=None, window=20, factors=None):
+    """
+    Whole-series version of fama_french_strategy.
+    factors: optional ff_factor_series(prices) output, computed here if missing.
+    Returns: int8 array with the signal fama_french_strategy would emit at every index.
+    """
+    if betas is None:
+        betas = np.array([1.0, 0.7, -0.4], dtype=float)
+    prices = np.asarray(prices, dtype=float)
+    n = len(prices)
+    start = window + 5
+    signals = np.zeros(n, dtype=np.int8)
+    if n <= start:
+        return signals
+
+    if factors is None:
+        factors = ff_factor_series(prices, window=window)
+    first = start - factors["offset"]
+    MKT = factors["MKT"][first:]
+    MOM = factors["MOM"][first:]
+    VOL = factors["VOL"][first:]
+
+    expected_ret = betas[0] * MKT + betas[1] * MOM + betas[2] * VOL
+
+    signals[start:] = np.where(expected_ret > 0, 1, -1)
+    return signals
@@ -1,4 +1,6 @@
 import numpy as np 
+from numba import njit
+
 def ema(prices,window):
     alpha = 2/(window+1)
     ema_values = [prices[0]]
@@ -6,6 +8,18 @@ def ema(prices,window):
         ema_values.append(alpha * p + (1 - alpha) * ema_values[-1])
     return ema_values
 
+@njit(cache=True)
+def _ema_array(prices, window):
+    # same recursion as ema(), kept in float64 so results match it exactly
+    alpha = 2 / (window + 1)
+    out = np.empty(prices.shape[0], dtype=np.float64)
+    if prices.shape[0] == 0:
+        return out
+    out[0] = prices[0]
+    for i in range(1, prices.shape[0]):
+        out[i] = alpha * prices[i] + (1 - alpha) * out[i - 1]
+    return out
+
 def macd_indicator(prices, fast=12, slow=26, signal=9):
     fast_ema = ema(prices, fast)
     slow_ema = ema(prices, slow)
@@ -28,3 +42,29 @@ def macd_strategy(index, prices, fast=12, slow=26, signal=9):
 
     return 0
 
+def macd_signals(prices, fast=12, slow=26, signal=9):
+    """
+    Whole-series version of macd_strategy.
+    The EMAs are recursive from prices[0], so the indicator over prices[:index]
+    is a prefix of the indicator over the full series and only needs one pass.
+    Returns: int8 array with the signal macd_strategy would emit at every index.
+    """
+    prices = np.asarray(prices, dtype=float)
+    n = len(prices)
+    signals = np.zeros(n, dtype=np.int8)
+    if n <= slow:
+        return signals
+
+    macd_line = _ema_array(prices, fast) - _ema_array(prices, slow)
+    signal_line = _ema_array(macd_line, signal)
+
+    # at index i the strategy compares bars i - 2 and i - 1
+    macd_prev = macd_line[slow - 2 : n - 2]
+    signal_prev = signal_line[slow - 2 : n - 2]
+    macd_now = macd_line[slow - 1 : n - 1]
+    signal_now = signal_line[slow - 1 : n - 1]
+
+    buy = (macd_prev < signal_prev) & (macd_now > signal_now)
+    sell = (macd_prev > signal_prev) & (macd_now < signal_now)
+    signals[slow:] = np.where(buy, 1, np.where(sell, -1, 0))
+    return signals
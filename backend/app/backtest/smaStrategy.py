@@ -11,6 +11,26 @@ def sma_strategy(index, prices, window=26):
     elif price < sma:
         return -1
     return 0
+
+def sma_signals(prices, window=26):
+    """
+    Whole-series version of sma_strategy.
+    Returns: int8 array with the signal sma_strategy would emit at every index.
+    """
+    prices = np.asarray(prices, dtype=float)
+    n = len(prices)
+    signals = np.zeros(n, dtype=np.int8)
+    if n <= window:
+        return signals
+
+    # row j of the view is prices[j : j + window], i.e. the window used at index j + window
+    windows = np.lib.stride_tricks.sliding_window_view(prices, window)[: n - window]
+    sma = windows.mean(axis=1)
+    price = prices[window:]
+
+    signals[window:] = np.where(price > sma, 1, np.where(price < sma, -1, 0))
+    return signals
+
 def compute_sma_series(prices, window=30):
     sma = []
     for i in range(len(prices)):
@@ -0,0 +1,205 @@
+import math
+from abc import ABC, abstractmethod
+from collections import deque
+
+import numpy as np
+
+
+class RollingWindow:
+    """
+    Fixed-size window with O(1) running sum and sum of squares.
+    The sums are rebuilt with math.fsum once per window length so rounding
+    error cannot drift on long-running feeds.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.values = deque(maxlen=size)
+        self.clear()
+
+    def clear(self):
+        self.values.clear()
+        self.total = 0.0
+        self.total_sq = 0.0
+        self._since_resync = 0
+
+    def push(self, value):
+        if len(self.values) == self.size:
+            old = self.values[0]
+            self.total -= old
+            self.total_sq -= old * old
+        self.values.append(value)
+        self.total += value
+        self.total_sq += value * value
+
+        self._since_resync += 1
+        if self._since_resync >= self.size:
+            self.total = math.fsum(self.values)
+            self.total_sq = math.fsum(v * v for v in self.values)
+            self._since_resync = 0
+
+    def full(self):
+        return len(self.values) == self.size
+
+    def mean(self):
+        return self.total / len(self.values)
+
+    def std(self):
+        n = len(self.values)
+        mean = self.total / n
+        var = self.total_sq / n - mean * mean
+        return math.sqrt(var) if var > 0 else 0.0
+
+
+class StreamingStrategy(ABC):
+    """
+    Base class for O(1)-per-bar strategies.
+    - update(price): feed the next close, returns the signal for that bar (1 / -1 / 0)
+    - reset(): back to the state before the first bar; subclasses clear their own state
+    - __call__(index, prices): signal_func interface, so an instance can be passed to backtest()
+    Live candle feeds drive update() through app.services.strategy_feed.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.index = 0
+
+    @abstractmethod
+    def update(self, price):
+        """Feed the next close; returns the signal for that bar."""
+
+    def __call__(self, index, prices):
+        if index == 0 and self.index != 0:
+            self.reset()
+        if index != self.index:
+            raise ValueError("Streaming strategies must be fed bars in order, starting at index 0.")
+        return self.update(prices[index])
+
+
+class StreamingSMA(StreamingStrategy):
+    """
+    Streaming sma_strategy: compares the new close against the mean of the
+    previous `window` closes.
+    """
+
+    def __init__(self, window=26):
+        self.window = window
+        self._closes = RollingWindow(window)
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+        self._closes.clear()
+
+    def update(self, price):
+        price = float(price)
+        signal = 0
+        if self._closes.full():
+            sma = self._closes.mean()
+            if price > sma:
+                signal = 1
+            elif price < sma:
+                signal = -1
+
+        self._closes.push(price)
+        self.index += 1
+        return signal
+
+
+class StreamingMACD(StreamingStrategy):
+    """
+    Streaming macd_strategy. The EMA recursions are the same as ema(), so the
+    signals match macd_strategy exactly. Like macd_strategy, the signal for a
+    bar is the MACD/signal crossover between the two previous bars.
+    """
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = fast
+        self.slow = slow
+        self.signal = signal
+        self._alpha_fast = 2 / (fast + 1)
+        self._alpha_slow = 2 / (slow + 1)
+        self._alpha_signal = 2 / (signal + 1)
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+        self.fast_ema = None
+        self.slow_ema = None
+        self.signal_ema = None
+        self._prev = None
+        self._now = None
+
+    def update(self, price):
+        price = float(price)
+        out = 0
+        if self.index >= self.slow:
+            macd_prev, signal_prev = self._prev
+            macd_now, signal_now = self._now
+            if macd_prev < signal_prev and macd_now > signal_now:
+                out = 1
+            elif macd_prev > signal_prev and macd_now < signal_now:
+                out = -1
+
+        if self.fast_ema is None:
+            self.fast_ema = price
+            self.slow_ema = price
+        else:
+            self.fast_ema = self._alpha_fast * price + (1 - self._alpha_fast) * self.fast_ema
+            self.slow_ema = self._alpha_slow * price + (1 - self._alpha_slow) * self.slow_ema
+
+        macd = self.fast_ema - self.slow_ema
+        if self.signal_ema is None:
+            self.signal_ema = macd
+        else:
+            self.signal_ema = self._alpha_signal * macd + (1 - self._alpha_signal) * self.signal_ema
+
+        self._prev = self._now
+        self._now = (macd, self.signal_ema)
+        self.index += 1
+        return out
+
+
+class StreamingFamaFrench(StreamingStrategy):
+    """
+    Streaming fama_french_strategy.
+    MKT is the latest log return, MOM the close over its rolling SMA and VOL the
+    rolling std of the last `window` returns; all three are kept as running sums.
+    """
+
+    def __init__(self, betas=None, window=20):
+        if betas is None:
+            betas = np.array([1.0, 0.7, -0.4], dtype=float)
+        self.betas = np.asarray(betas, dtype=float)
+        self.window = window
+        self._closes = RollingWindow(window)
+        self._returns = RollingWindow(window)
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+        self._closes.clear()
+        self._returns.clear()
+        self._last_logp = None
+
+    def update(self, price):
+        price = float(price)
+        logp = math.log(price + 1e-9)
+        self._closes.push(price)
+        if self._last_logp is not None:
+            self._returns.push(logp - self._last_logp)
+        self._last_logp = logp
+
+        index = self.index
+        self.index += 1
+        if index < self.window + 5:
+            return 0
+
+        mkt = self._returns.values[-1]
+        mom = price / self._closes.mean() - 1
+        vol = self._returns.std()
+
+        expected_ret = float(self.betas[0] * mkt + self.betas[1] * mom + self.betas[2] * vol)
+        return 1 if expected_ret > 0 else -1
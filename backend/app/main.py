@@ -1,8 +1,13 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
 from app.routers import health, data, simulation
+from app.services.http_client import start_http_client, close_http_client
+from app.services.executor import start_executor, shutdown_executor
+from app.services.jobs import job_manager
+from app.services.warmup import start_warmup, stop_warmup
 
 load_dotenv()
 
@@ -10,10 +15,24 @@ APP_NAME = "Crypto Quant API"
 APP_PORT = 8000
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_http_client()
+    start_executor()
+    await job_manager.start()
+    await start_warmup()
+    yield
+    await stop_warmup()
+    await job_manager.stop()
+    shutdown_executor()
+    await close_http_client()
+
+
 app = FastAPI(
     title=APP_NAME,
     description="API backend for Crypto Quant Simulator — supports multiple financial models.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 
@@ -1,66 +1,158 @@
 import numpy as np
 from arch import arch_model
-def simulate_garch(historical, horizon_days=30, steps=30, num_paths=10):
+from numba import njit, prange
+from app.utils.random_streams import path_seeds
+
+# vol name -> (arch_model vol, asymmetric order o)
+VOL_SPECS = {
+    "garch": ("GARCH", 0),
+    "gjr": ("GARCH", 1),
+    "egarch": ("EGARCH", 1),
+}
+DISTS = {"normal": "normal", "t": "t"}
+
+GARCH, GJR, EGARCH = 0, 1, 2
+VOL_FLAGS = {"garch": GARCH, "gjr": GJR, "egarch": EGARCH}
+
+# returns are fitted in percent, so variances carry a factor 100**2
+PCT_VAR_SCALE = 10000.0
+
+
+def fit_garch(historical, vol="garch", dist="normal"):
+    """
+    Fit a (1,1) conditional-variance model on log returns.
+    vol: "garch", "gjr" (GJR-GARCH, leverage term gamma on negative shocks)
+         or "egarch" (log-variance, asymmetric in the sign of the shock)
+    dist: "normal" or "t" (standardized Student-t, degrees of freedom nu)
+    Returns the daily-scale parameters used by simulate_garch.
+    """
+    if vol not in VOL_SPECS:
+        raise ValueError(f"vol must be one of {list(VOL_SPECS)}")
+    if dist not in DISTS:
+        raise ValueError(f"dist must be one of {list(DISTS)}")
+
     prices = np.array(historical, dtype=float)
     log_returns = np.diff(np.log(prices))
 
     if len(log_returns) < 2:
         raise ValueError("Not enough historical data for GARCH estimation.")
 
-
-    model = arch_model(log_returns * 100, vol='Garch', p=1, q=1)
+    arch_vol, o = VOL_SPECS[vol]
+    model = arch_model(log_returns * 100, vol=arch_vol, p=1, o=o, q=1, dist=DISTS[dist])
     fitted = model.fit(disp="off")
 
-    last_price = prices[-1]
-
-    
-    T = horizon_days / 365.0
-    dt = T / steps
-
-    
     params = fitted.params
 
-    
     alpha_keys = [k for k in params.index if k.startswith("alpha[")]
     beta_keys  = [k for k in params.index if k.startswith("beta[")]
+    gamma_keys = [k for k in params.index if k.startswith("gamma[")]
 
     if not alpha_keys or not beta_keys:
         raise RuntimeError(f"Could not find alpha/beta in params: {list(params.index)}")
 
     alpha = params[alpha_keys[0]]
     beta  = params[beta_keys[0]]
+    gamma = params[gamma_keys[0]] if gamma_keys else 0.0
+    nu = float(params["nu"]) if "nu" in params.index else None
 
-    
-    last_sigma2 = (fitted.conditional_volatility[-1] ** 2) / 10000.0
+    last_sigma2 = (fitted.conditional_volatility[-1] ** 2) / PCT_VAR_SCALE
 
-    
-    if "omega" in params.index:
-        omega = params["omega"] / 10000.0
+    if vol == "egarch":
+        # ln s2_pct = omega + ... + beta ln s2_pct; moving to raw units shifts omega
+        omega = params["omega"] - (1.0 - beta) * np.log(PCT_VAR_SCALE)
+    elif "omega" in params.index:
+        omega = params["omega"] / PCT_VAR_SCALE
     else:
-        
-        one_minus_ab = 1.0 - alpha - beta
+        one_minus_ab = 1.0 - alpha - beta - 0.5 * gamma
         if one_minus_ab <= 0:
-           
             omega = 1e-8 * last_sigma2
         else:
             omega = last_sigma2 * one_minus_ab
 
+    return {
+        "vol": vol,
+        "dist": dist,
+        "omega": float(omega),
+        "alpha": float(alpha),
+        "gamma": float(gamma),
+        "beta": float(beta),
+        "nu": nu,
+        "last_sigma2": float(last_sigma2),
+    }
+
+
+@njit(cache=True)
+def _innovation(nu, t_scale):
+    """Unit-variance shock: standard normal, or Student-t rescaled to variance 1 when nu > 0."""
+    if nu > 0.0:
+        return np.random.standard_t(nu) * t_scale
+    return np.random.standard_normal()
+
+
+@njit(parallel=True, cache=True)
+def _garch_paths(last_price, omega, alpha, gamma, beta, last_sigma2, dt, steps, num_paths,
+                 vol_flag, nu, seeds):
+    """
+    One pass per path over a preallocated (num_paths, steps+1) price array;
+    only the current variance is kept, so the cost is linear in steps * paths.
+    GARCH / GJR update on the dt-scaled shock, EGARCH on the standardized one.
+    """
+    paths = np.empty((num_paths, steps + 1), dtype=np.float64)
+    sqrt_dt = np.sqrt(dt)
+    t_scale = np.sqrt((nu - 2.0) / nu) if nu > 2.0 else 1.0
+    abs_mean = np.sqrt(2.0 / np.pi)
+
+    for p in prange(num_paths):
+        np.random.seed(seeds[p])
+        sigma2 = last_sigma2
+        log_price = 0.0
+        paths[p, 0] = last_price
+        for t in range(steps):
+            z = _innovation(nu, t_scale)
+            shock = np.sqrt(sigma2) * sqrt_dt * z
+            log_price += shock
+            paths[p, t + 1] = last_price * np.exp(log_price)
+
+            if vol_flag == EGARCH:
+                sigma2 = np.exp(
+                    omega + alpha * (abs(z) - abs_mean) + gamma * z + beta * np.log(sigma2)
+                )
+            else:
+                leverage = gamma * shock * shock if (vol_flag == GJR and shock < 0.0) else 0.0
+                sigma2 = omega + alpha * shock * shock + leverage + beta * sigma2
+
+    return paths
+
+
+def simulate_garch(historical, horizon_days=30, steps=30, num_paths=10, vol="garch", dist="normal",
+                   calibration=None, rng=None):
+    """
+    vol / dist: variance model and innovation distribution, see fit_garch.
+    calibration: optional fit_garch(historical, vol, dist) output, fitted here if missing.
+    """
+    prices = np.array(historical, dtype=float)
+    if calibration is None:
+        calibration = fit_garch(prices, vol=vol, dist=dist)
 
-    Z = np.random.normal(0, 1, (num_paths, steps))
-    log_ret_paths = np.zeros((num_paths, steps))
-    sigma2 = np.full((num_paths, 1), last_sigma2)
+    last_price = prices[-1]
 
-    for t in range(steps):
-        sigma_t = np.sqrt(sigma2[:, -1])
-        shocks = sigma_t * np.sqrt(dt) * Z[:, t]
-        log_ret_paths[:, t] = shocks
-        sigma2_next = omega + alpha * shocks**2 + beta * sigma2[:, -1]
-        sigma2 = np.hstack([sigma2, sigma2_next.reshape(-1, 1)])
-    cumulative_log_returns = np.cumsum(log_ret_paths, axis=1)
-    cumulative_log_returns = np.hstack(
-        [np.zeros((num_paths, 1)), cumulative_log_returns]
-    )
-    paths = last_price * np.exp(cumulative_log_returns)
+    T = horizon_days / 365.0
+    dt = T / steps
 
-    return {"paths": paths.tolist()}
+    nu = calibration.get("nu")
+    paths = _garch_paths(
+        float(last_price),
+        calibration["omega"],
+        calibration["alpha"],
+        calibration.get("gamma", 0.0),
+        calibration["beta"],
+        calibration["last_sigma2"],
+        dt,
+        int(steps),
+        int(num_paths),
+        VOL_FLAGS[calibration.get("vol", "garch")],
+        float(nu) if nu is not None else 0.0,
+        path_seeds(rng, num_paths),
+    )
 
+    return {"paths": paths}
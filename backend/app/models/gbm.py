@@ -1,13 +1,20 @@
 import numpy as np
+from app.utils.variance_reduction import gbm_control, normal_draws
 
-def simulate(last_price, mu, sigma, horizon_days=30, steps=30, num_paths=3):
+def simulate(last_price, mu, sigma, horizon_days=30, steps=30, num_paths=3, rng=None,
+             variance_reduction="none", control_variate=False):
+    """
+    variance_reduction: "none", "antithetic", "moment_matching" or "sobol"
+    (see normal_draws). control_variate=True returns {"paths", "control"}
+    instead of the bare array, the control being this GBM's own terminal values.
+    """
 
     dt = horizon_days / steps
     sqrt_dt = np.sqrt(dt)
 
     drift = (mu - 0.5 * sigma * sigma) * dt
 
-    Z = np.random.normal(0.0, 1.0, size=(num_paths, steps))
+    Z = normal_draws(rng, num_paths, steps, method=variance_reduction)[0]
 
     log_returns = drift + sigma * sqrt_dt * Z
 
@@ -17,4 +24,9 @@ def simulate(last_price, mu, sigma, horizon_days=30, steps=30, num_paths=3):
 
     paths = last_price * np.exp(cumulative)
 
-    return paths.tolist()
+    if control_variate:
+        return {
+            "paths": paths,
+            "control": gbm_control(last_price, log_returns, mu - 0.5 * sigma * sigma, sigma, horizon_days),
+        }
+    return paths
@@ -1,8 +1,24 @@
 import numpy as np
 from numba import njit, prange
+from app.utils.random_streams import path_seeds
 
 
-def _init_hmm_params(returns, n_states):
+# restarts after the first start from perturbed parameters drawn from this seed,
+# so a fit is deterministic given the history and hyperparameters
+RESTART_SEED = 0
+
+# explicit signatures (C-contiguous arrays): compiled, or loaded from the
+# on-disk cache, at import instead of on the first fit or simulation
+_FIT_SIG = "(float64[::1], float64[:, ::1], float64[:, ::1], float64[:, :, ::1], float64[:, ::1], int64, float64, int64)"
+_SIMULATE_SIG = "(float64, float64[::1], float64[::1], float64[:, ::1], float64[::1], int64, int64, uint32[::1])"
+
+
+def _init_hmm_params(returns, n_states, n_restarts=1):
+    """
+    Stacked starting points, one row per restart. Restart 0 spreads the means
+    over return quantiles with increasing sigmas and sticky transitions;
+    the others jitter all three around it.
+    """
     returns = np.asarray(returns, dtype=float)
     std_ret = returns.std() + 1e-8
 
@@ -15,128 +31,165 @@ def _init_hmm_params(returns, n_states):
     trans_init = np.full((n_states, n_states), (1.0 - 0.9) / (n_states - 1), dtype=float)
     np.fill_diagonal(trans_init, 0.9)
 
-    return mu_init, sigma_init, trans_init
+    mus = np.tile(mu_init, (n_restarts, 1))
+    sigmas = np.tile(sigma_init, (n_restarts, 1))
+    transs = np.tile(trans_init, (n_restarts, 1, 1))
+    pis = np.full((n_restarts, n_states), 1.0 / n_states)
+
+    rng = np.random.default_rng(RESTART_SEED)
+    for r in range(1, n_restarts):
+        mus[r] = np.sort(np.percentile(returns, rng.uniform(5, 95, n_states)))
+        sigmas[r] = np.sort(std_ret * rng.uniform(0.3, 2.0, n_states)) + 1e-6
+        stay = rng.uniform(0.6, 0.98, n_states)
+        transs[r] = ((1.0 - stay) / (n_states - 1))[:, None]
+        np.fill_diagonal(transs[r], stay)
 
+    return mus, sigmas, transs, pis
 
-@njit
-def _fit_hmm_gaussian(returns, mu, sigma, trans, iterations, mode_flag):
+
+@njit(cache=True)
+def _baum_welch(returns, mu, sigma, trans, pi, max_iter, tol, mode_flag):
     """
+    Gaussian-emission Baum-Welch with the scaled forward-backward recursion.
+    Emissions are shifted by their per-step log maximum before exponentiating,
+    so nothing underflows; log c_t plus the shift sums to the log-likelihood.
+    Stops once an iteration improves the log-likelihood by less than tol.
     mode_flag: 0 = full (mean + variance switching), 1 = variance-only switching (shared mean).
+    Returns (log-likelihood, M-steps run, converged, filtered state probabilities at the last step).
     """
-
     n = returns.shape[0]
     K = mu.shape[0]
 
-    gamma = np.zeros((n, K), dtype=np.float64)
-    inv_sqrt_2pi = 1.0 / np.sqrt(2 * np.pi)
-
-    for _ in range(iterations):
-        if mode_flag == 1:
-            num = 0.0
-            den = 0.0
-            for k in range(K):
-
-                num += mu[k]
-                den += 1.0
-            shared_mu = num / den
-            for k in range(K):
-                mu[k] = shared_mu
-
+    alpha = np.empty((n, K))
+    beta = np.empty((n, K))
+    b = np.empty((n, K))
+    scale = np.empty(n)
+    xi_sum = np.empty((K, K))
+    half_log_2pi = 0.5 * np.log(2.0 * np.pi)
+
+    loglik = -np.inf
+    prev = -np.inf
+    converged = False
+    it = 0
+    for it in range(max_iter + 1):
+        # E-step: emissions
+        loglik = 0.0
         for t in range(n):
-            denom = 0.0
+            shift = -np.inf
             for k in range(K):
                 diff = (returns[t] - mu[k]) / sigma[k]
-                g = (inv_sqrt_2pi / sigma[k]) * np.exp(-0.5 * diff * diff)
-                gamma[t, k] = g
-                denom += g
-
-
-            if denom <= 0.0:
-                invK = 1.0 / K
-                for k in range(K):
-                    gamma[t, k] = invK
-            else:
-                for k in range(K):
-                    gamma[t, k] /= denom
-
-
-        weights = np.zeros(K, dtype=np.float64)
-        for k in range(K):
-            w = 0.0
-            for t in range(n):
-                w += gamma[t, k]
-            weights[k] = w
-
-        for k in range(K):
-            num = 0.0
-            w = weights[k]
-            if w <= 1e-12:
-                continue
-            for t in range(n):
-                num += gamma[t, k] * returns[t]
-            mu[k] = num / w
-
-        if mode_flag == 1:
-            num = 0.0
-            den = 0.0
-            for k in range(K):
-                num += mu[k] * weights[k]
-                den += weights[k]
-            shared_mu = num / den
+                b[t, k] = -0.5 * diff * diff - np.log(sigma[k]) - half_log_2pi
+                shift = max(shift, b[t, k])
             for k in range(K):
-                mu[k] = shared_mu
+                b[t, k] = np.exp(b[t, k] - shift)
+            loglik += shift
 
-        for k in range(K):
-            w = weights[k]
-            if w <= 1e-12:
-                continue
-            num = 0.0
-            for t in range(n):
-                diff = returns[t] - mu[k]
-                num += gamma[t, k] * diff * diff
-            sigma[k] = np.sqrt(num / w) + 1e-6
-        for i in range(K):
+        # scaled forward pass
+        for t in range(n):
+            c = 0.0
             for j in range(K):
-                num = 0.0
-                den = 0.0
-                for t in range(n - 1):
-                    num += gamma[t, i] * gamma[t + 1, j]
-                    den += gamma[t, i]
-                if den <= 1e-12:
-                    trans[i, j] = 1.0 / K
+                if t == 0:
+                    a = pi[j]
                 else:
-                    trans[i, j] = num / den
-
-        for i in range(K):
-            rowsum = 0.0
+                    a = 0.0
+                    for i in range(K):
+                        a += alpha[t - 1, i] * trans[i, j]
+                alpha[t, j] = a * b[t, j]
+                c += alpha[t, j]
+            c = max(c, 1e-300)
+            scale[t] = c
             for j in range(K):
-                rowsum += trans[i, j]
-            if rowsum <= 0.0:
-                invK = 1.0 / K
-                for j in range(K):
-                    trans[i, j] = invK
-            else:
+                alpha[t, j] /= c
+            loglik += np.log(c)
+
+        if it > 0 and loglik - prev < tol:
+            converged = True
+            break
+        if it == max_iter:
+            break
+
+        # scaled backward pass, accumulating the expected transition counts
+        xi_sum[:, :] = 0.0
+        beta[n - 1, :] = 1.0
+        for t in range(n - 2, -1, -1):
+            for i in range(K):
+                acc = 0.0
                 for j in range(K):
-                    trans[i, j] /= rowsum
+                    w = trans[i, j] * b[t + 1, j] * beta[t + 1, j] / scale[t + 1]
+                    acc += w
+                    xi_sum[i, j] += alpha[t, i] * w
+                beta[t, i] = acc
+
+        # M-step
+        gamma = alpha * beta
+        weights = gamma.sum(axis=0) + 1e-12
+        pi[:] = gamma[0]
+        for i in range(K):
+            trans[i] = xi_sum[i] / max(xi_sum[i].sum(), 1e-300)
 
-    return mu, sigma, trans
+        if mode_flag == 1:
+            mu[:] = returns.mean()
+        else:
+            mu[:] = (gamma * returns.reshape(n, 1)).sum(axis=0) / weights
+        dev = returns.reshape(n, 1) - mu.reshape(1, K)
+        var = (gamma * dev * dev).sum(axis=0) / weights
+        for k in range(K):
+            sigma[k] = max(np.sqrt(var[k]), 1e-6)
+
+        prev = loglik
 
+    return loglik, it, converged, alpha[n - 1].copy()
 
-@njit(parallel=True)
+
+@njit(_FIT_SIG, parallel=True, cache=True)
+def _fit_hmm_gaussian(returns, mus, sigmas, transs, pis, max_iter, tol, mode_flag):
+    """
+    Baum-Welch from every starting point in parallel (one restart per prange
+    iteration); the stacked parameters are updated in place.
+    Returns per-restart log-likelihoods, iteration counts, convergence flags
+    and last-step filtered state probabilities.
+    """
+    R, K = mus.shape
+    logliks = np.empty(R)
+    iterations = np.empty(R, dtype=np.int64)
+    converged = np.empty(R, dtype=np.bool_)
+    filtered = np.empty((R, K))
+    for r in prange(R):
+        ll, it, conv, last = _baum_welch(
+            returns, mus[r], sigmas[r], transs[r], pis[r], max_iter, tol, mode_flag
+        )
+        logliks[r] = ll
+        iterations[r] = it
+        converged[r] = conv
+        filtered[r] = last
+    return logliks, iterations, converged, filtered
+
+
+@njit(_SIMULATE_SIG, parallel=True, cache=True)
 def _simulate_hmm_paths(
     last_price,
     mu,
     sigma,
     trans,
+    start_probs,
     steps,
-    num_paths
+    num_paths,
+    seeds
 ):
     K = mu.shape[0]
     paths = np.empty((num_paths, steps), dtype=np.float64)
 
     for p in prange(num_paths):
+        np.random.seed(seeds[p])
         cur_price = last_price
-        state = np.random.randint(0, K)
+        u = np.random.rand()
+        cumsum = 0.0
+        state = K - 1
+        for j in range(K):
+            cumsum += start_probs[j]
+            if u <= cumsum:
+                state = j
+                break
 
         for t in range(steps):
             ret = mu[state] + sigma[state] * np.random.randn()
@@ -156,46 +209,97 @@ def _simulate_hmm_paths(
     return paths
 
 
-def simulate_hmm(
+def fit_hmm(
     historical,
-    horizon_days=30,
-    steps=30,
-    num_paths=3,
     n_states=3,
     em_iterations=80,
-    regime_mode= "variance",
- 
+    regime_mode="variance",
+    tol=1e-2,
+    n_restarts=4,
 ):
-
+    """
+    Fit the Gaussian regime model on log returns by Baum-Welch.
+    em_iterations caps the EM passes per restart; a restart stops earlier once
+    the log-likelihood improves by less than tol. The best of n_restarts
+    starting points (run in parallel) is kept.
+    Returns dict with per-state mu/sigma (ordered by sigma), the transition
+    matrix, start_probs (state distribution for the first simulated step, from
+    the filtered last state), the log-likelihood and convergence info.
+    """
     prices = np.asarray(historical, dtype=float)
     log_prices = np.log(prices + 1e-9)
     returns = np.diff(log_prices)
 
     if len(returns) < max(30, n_states * 5):
         raise ValueError("HMM requires more data for stable estimation with n_states=%d." % n_states)
+    if n_restarts < 1:
+        raise ValueError("n_restarts must be >= 1")
     mode_flag = 1 if regime_mode == "variance" else 0
 
-    mu_init, sigma_init, trans_init = _init_hmm_params(returns, n_states)
-    mu, sigma, trans = _fit_hmm_gaussian(
-        returns,
-        mu_init.copy(),
-        sigma_init.copy(),
-        trans_init.copy(),
-        em_iterations,
-        mode_flag
+    mus, sigmas, transs, pis = _init_hmm_params(returns, n_states, n_restarts)
+    logliks, iterations, converged, filtered = _fit_hmm_gaussian(
+        returns, mus, sigmas, transs, pis, int(em_iterations), float(tol), mode_flag
     )
+
+    best = int(np.argmax(logliks))
+    order = np.argsort(sigmas[best])
+    trans = transs[best][np.ix_(order, order)]
+    return {
+        "mu": mus[best][order],
+        "sigma": sigmas[best][order],
+        "trans": trans,
+        "start_probs": filtered[best][order] @ trans,
+        "loglik": float(logliks[best]),
+        "iterations": int(iterations[best]),
+        "converged": bool(converged[best]),
+    }
+
+
+def simulate_hmm(
+    historical,
+    horizon_days=30,
+    steps=30,
+    num_paths=3,
+    n_states=3,
+    em_iterations=80,
+    regime_mode= "variance",
+    tol=1e-2,
+    n_restarts=4,
+    calibration=None,
+    rng=None,
+):
+    """
+    calibration: optional fit_hmm(historical, ...) output, fitted here if missing.
+    """
+    prices = np.asarray(historical, dtype=float)
+    if calibration is None:
+        calibration = fit_hmm(
+            prices,
+            n_states=n_states,
+            em_iterations=em_iterations,
+            regime_mode=regime_mode,
+            tol=tol,
+            n_restarts=n_restarts,
+        )
+    mu = calibration["mu"]
+    sigma = calibration["sigma"]
+    trans = calibration["trans"]
+
     paths_arr = _simulate_hmm_paths(
         prices[-1],
         mu,
         sigma,
         trans,
-        steps,
-        num_paths
+        calibration["start_probs"],
+        int(steps),
+        int(num_paths),
+        path_seeds(rng, num_paths)
     )
 
     return {
-        "paths": paths_arr.tolist(),
+        "paths": paths_arr,
         "mu": mu.tolist(),
         "sigma": sigma.tolist(),
-        "transition_matrix": trans.tolist()
+        "transition_matrix": trans.tolist(),
+        "loglik": calibration["loglik"],
     }
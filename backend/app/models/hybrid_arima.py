@@ -1,6 +1,7 @@
 import numpy as np
 from pmdarima import auto_arima, ARIMA
 from sklearn.ensemble import GradientBoostingRegressor
+from app.utils.random_streams import as_generator
 
 
 def choose_arima_model(closes, max_p=6, max_q=6, max_d=2, reject_flat=True):
@@ -58,13 +59,11 @@ def build_residual_features(residuals, prices, n_lags=3):
     return np.array(X, float), np.array(y, float)
 
 
-def simulate_hybrid_arima(
-    historical,
-    horizon_days=30,
-    steps=30,
-    num_paths=3,
-    n_lags=3
-):
+def fit_hybrid_arima(historical, n_lags=3):
+    """
+    Fit the ARIMA base model and the gradient-boosted residual model.
+    Returns dict with both fitted models, the in-sample residuals and their std.
+    """
     closes = np.asarray(historical, dtype=float)
     n = len(closes)
 
@@ -91,47 +90,81 @@ def simulate_hybrid_arima(
     )
     ml.fit(X, y)
 
-    arima_future = np.asarray(arima_model.predict(n_periods=steps))
-    paths = []
-
-    resid_std = float(np.std(residuals) + 1e-6)
-    clip_limit = resid_std * 3      
-    residual_decay = 0.7            
-
-    for p in range(num_paths):
-        res_ext = residuals.tolist()
-        price_ext = closes.tolist()
-        path = []
-
-        for t in range(steps):
-            if len(res_ext) < n_lags + 1:
-                feat = [0.0] * (n_lags + 1)
-            else:
-                rets = np.diff(np.log(np.asarray(price_ext) + 1e-9))
-                feat = [res_ext[-k] for k in range(1, n_lags + 1)]
-                feat.append(rets[-1])
-
-            feat = np.asarray(feat).reshape(1, -1)
-            pred_resid = float(ml.predict(feat)[0])
-
-            pred_resid *= residual_decay
-            pred_resid = 0.5 * pred_resid + 0.5 * np.random.normal(0, resid_std * 0.3)
+    return {
+        "arima_model": arima_model,
+        "ml": ml,
+        "residuals": residuals,
+        "resid_std": float(np.std(residuals) + 1e-6),
+    }
 
-            pred_resid = np.clip(pred_resid, -clip_limit, clip_limit)
 
-            noise = np.random.normal(0, resid_std * 0.5)
-            noise = np.clip(noise, -clip_limit, clip_limit)
+def simulate_hybrid_arima(
+    historical,
+    horizon_days=30,
+    steps=30,
+    num_paths=3,
+    n_lags=3,
+    calibration=None,
+    rng=None,
+):
+    """
+    calibration: optional fit_hybrid_arima(historical, n_lags) output, fitted here if missing.
+    """
+    closes = np.asarray(historical, dtype=float)
+    if calibration is None:
+        calibration = fit_hybrid_arima(closes, n_lags=n_lags)
 
-            pred_resid += noise
-            next_price = arima_future[t] + pred_resid
+    arima_model = calibration["arima_model"]
+    ml = calibration["ml"]
+    residuals = calibration["residuals"]
 
-            next_price = max(next_price, 0.01)
+    rng = as_generator(rng)
+    arima_future = np.asarray(arima_model.predict(n_periods=steps))
+    paths = np.empty((num_paths, steps), dtype=float)
 
-            res_ext.append(pred_resid)
-            price_ext.append(next_price)
-            path.append(float(next_price))
+    resid_std = calibration["resid_std"]
+    clip_limit = resid_std * 3      
+    residual_decay = 0.7            
 
-        paths.append(path)
+    # per-path state, shared history at t=0: the last n_lags residuals in a
+    # ring buffer (slot head = newest) and the last log price for the return feature
+    ring = max(n_lags, 1)
+    lags = np.zeros((num_paths, ring))
+    residuals = np.asarray(residuals, dtype=float)
+    recent = residuals[max(len(residuals) - n_lags, 0):][::-1]
+    for k, r in enumerate(recent):
+        lags[:, (-k) % ring] = r
+    head = 0
+    log_price = np.full(num_paths, np.log(closes[-1] + 1e-9))
+    last_ret = np.full(num_paths, np.log(closes[-1] + 1e-9) - np.log(closes[-2] + 1e-9))
+    feats = np.zeros((num_paths, n_lags + 1))
+
+    for t in range(steps):
+        # one predict over every path; feature k is the k-th most recent residual
+        if len(residuals) + t < n_lags + 1:
+            feats[:] = 0.0
+        else:
+            feats[:, :n_lags] = lags[:, (head - np.arange(n_lags)) % ring]
+            feats[:, n_lags] = last_ret
+        pred_resid = ml.predict(feats)
+
+        pred_resid *= residual_decay
+        pred_resid = 0.5 * pred_resid + 0.5 * rng.normal(0, resid_std * 0.3, num_paths)
+
+        pred_resid = np.clip(pred_resid, -clip_limit, clip_limit)
+
+        noise = rng.normal(0, resid_std * 0.5, num_paths)
+        noise = np.clip(noise, -clip_limit, clip_limit)
+
+        pred_resid += noise
+        next_price = np.maximum(arima_future[t] + pred_resid, 0.01)
+
+        head = (head + 1) % ring
+        lags[:, head] = pred_resid
+        next_log = np.log(next_price + 1e-9)
+        last_ret = next_log - log_price
+        log_price = next_log
+        paths[:, t] = next_price
 
     return {
         "paths": paths,
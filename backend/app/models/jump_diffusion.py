@@ -1,4 +1,74 @@
 import numpy as np
+from numba import njit, prange
+from app.utils.random_streams import as_generator
+from app.utils.variance_reduction import gbm_control, normal_draws
+
+
+def _jump_sizes(rng, total, jump_model, jump_mu, jump_sigma, kou_p, kou_alpha1, kou_alpha2):
+    """
+    Log jump sizes for `total` jumps in one draw.
+    Merton: N(jump_mu, jump_sigma^2). Kou: with probability kou_p an upward
+    Exp(kou_alpha1) jump, otherwise a downward Exp(kou_alpha2) one.
+    """
+    if jump_model == "merton":
+        return rng.normal(jump_mu, jump_sigma, size=total)
+    up = rng.random(total) < kou_p
+    return rng.standard_exponential(total) / np.where(up, kou_alpha1, -kou_alpha2)
+
+
+def jump_compensator(jump_model, jump_mu, jump_sigma, kou_p, kou_alpha1, kou_alpha2):
+    """kappa = E[e^X] - 1 for one log jump X; the drift subtracts jump_lambda * kappa."""
+    if jump_model.lower() == "merton":
+        return np.exp(jump_mu + 0.5 * jump_sigma * jump_sigma) - 1.0
+    if jump_model.lower() == "kou":
+        if kou_alpha1 <= 1:
+            raise ValueError("kou_alpha1 must be >1 for finite E[e^X]")
+        e_exp_x = (
+            kou_p * (kou_alpha1 / (kou_alpha1 - 1)) +
+            (1 - kou_p) * (kou_alpha2 / (kou_alpha2 + 1))
+        )
+        return e_exp_x - 1.0
+    raise ValueError("jump_model must be 'merton' or 'kou'")
+
+
+def _exact_jump_times(rng, jump_lambda, T, dt, steps, num_paths):
+    """
+    Draw the jump times themselves: a Poisson(lambda*T) count per path with
+    uniform times on [0, T], sorted per path. Returns the per-step counts the
+    kernel consumes and the flat, path-major array of jump times (in years).
+    """
+    per_path = rng.poisson(jump_lambda * T, size=num_paths)
+    owner = np.repeat(np.arange(num_paths), per_path)
+    times = rng.uniform(0.0, T, size=owner.size)
+    times = times[np.lexsort((times, owner))]
+    step = np.minimum((times / dt).astype(np.int64), steps - 1)
+    counts = np.bincount(owner * steps + step, minlength=num_paths * steps).reshape(num_paths, steps)
+    return counts, times
+
+
+@njit(parallel=True, cache=True)
+def _jump_diffusion_paths(S0, drift, vol_step, Z, counts, sizes, offsets):
+    """
+    One pass per path: counts[p, t] jumps are read from sizes starting at
+    offsets[p] and summed in place with the drift and diffusion of that step.
+    """
+    num_paths, steps = Z.shape
+    paths = np.empty((num_paths, steps + 1), dtype=np.float64)
+
+    for p in prange(num_paths):
+        k = offsets[p]
+        log_s = 0.0
+        paths[p, 0] = S0
+        for t in range(steps):
+            jump = 0.0
+            for _ in range(counts[p, t]):
+                jump += sizes[k]
+                k += 1
+            log_s += drift + vol_step * Z[p, t] + jump
+            paths[p, t + 1] = S0 * np.exp(log_s)
+
+    return paths
+
 
 def simulate_jump_diffusion(
     historical=None,
@@ -16,82 +86,63 @@ def simulate_jump_diffusion(
     kou_alpha1=5.0,
     kou_alpha2=5.0,
     trading_days=365,
+    jump_sampling="counts",
+    rng=None,
+    variance_reduction="none",
+    control_variate=False,
 ):
+    """
+    jump_sampling:
+      - "counts": Poisson jump counts per step, all drawn up front
+      - "exact": the jump times themselves, drawn on [0, T] and bucketed into
+        steps; the result then carries "jumps" ({"times", "sizes", "offsets"},
+        path p owning entries offsets[p]:offsets[p+1]). Both are exact at the
+        grid dates; "exact" also keeps when each jump happened, which a coarse
+        grid otherwise loses, and draws one count per path instead of per step.
+    variance_reduction ("none", "antithetic", "moment_matching", "sobol") applies
+    to the diffusion shocks; jump counts and sizes stay pseudo-random.
+    control_variate=True adds "control": the GBM driven by the same diffusion shocks.
+    """
     if last_price is None:
         if historical is None or len(historical) == 0:
             raise ValueError("Historical data or last_price required")
         last_price = float(historical[-1])
     S0 = float(last_price)
+    rng = as_generator(rng)
 
     T_years = horizon_days / trading_days
     dt = T_years / steps
     sqrt_dt = np.sqrt(dt)
 
-    if jump_model.lower() == "merton":
-        kappa = np.exp(jump_mu + 0.5 * jump_sigma * jump_sigma) - 1.0
-
-    elif jump_model.lower() == "kou":
-        if kou_alpha1 <= 1:
-            raise ValueError("kou_alpha1 must be >1 for finite E[e^X]")
-        e_exp_x = (
-            kou_p * (kou_alpha1 / (kou_alpha1 - 1)) +
-            (1 - kou_p) * (kou_alpha2 / (kou_alpha2 + 1))
-        )
-        kappa = e_exp_x - 1.0
-    else:
-        raise ValueError("jump_model must be 'merton' or 'kou'")
-
+    kappa = jump_compensator(jump_model, jump_mu, jump_sigma, kou_p, kou_alpha1, kou_alpha2)
     drift = (mu - 0.5 * sigma * sigma - jump_lambda * kappa) * dt
 
-    log_paths = np.empty((num_paths, steps + 1))
-    log_paths[:, 0] = np.log(S0)
-
-    for t in range(1, steps + 1):
-
+    Z = normal_draws(rng, num_paths, steps, method=variance_reduction)[0]
 
-        diffusion = sigma * sqrt_dt * np.random.randn(num_paths)
-
-        N_jumps = np.random.poisson(jump_lambda * dt, size=num_paths)
-
-        jump_log_total = np.zeros(num_paths)
-
-        if jump_model.lower() == "merton":
-            nonzero = N_jumps > 0
-            count = N_jumps[nonzero]
-            if count.size > 0:
-                jump_log_total[nonzero] = np.random.normal(
-                    loc=jump_mu * count,
-                    scale=jump_sigma * np.sqrt(count),
-                )
-
-        else: 
-            total = int(N_jumps.sum())
-            if total > 0:
-                idx = np.repeat(np.arange(num_paths), N_jumps)
-                u = np.random.rand(total)
-                neg = u < kou_p
-                pos = ~neg
-
-                jump_sizes = np.empty(total)
-                if neg.any():
-                    jump_sizes[neg] = -np.random.exponential(
-                        scale=1 / kou_alpha1, size=neg.sum()
-                    )
-
-                if pos.any():
-                    jump_sizes[pos] = np.random.exponential(
-                        scale=1 / kou_alpha2, size=pos.sum()
-                    )
-
-                jump_log_total = np.bincount(idx, weights=jump_sizes, minlength=num_paths)
+    if jump_sampling == "counts":
+        counts = rng.poisson(jump_lambda * dt, size=(num_paths, steps))
+        jump_times = None
+    elif jump_sampling == "exact":
+        counts, jump_times = _exact_jump_times(rng, jump_lambda, T_years, dt, steps, num_paths)
+    else:
+        raise ValueError("jump_sampling must be 'counts' or 'exact'")
 
-        log_paths[:, t] = log_paths[:, t - 1] + drift + diffusion + jump_log_total
+    sizes = _jump_sizes(rng, int(counts.sum()), jump_model.lower(), jump_mu, jump_sigma,
+                        kou_p, kou_alpha1, kou_alpha2)
+    offsets = np.zeros(num_paths + 1, dtype=np.int64)
+    np.cumsum(counts.sum(axis=1), out=offsets[1:])
 
-    paths = np.exp(log_paths)
+    paths = _jump_diffusion_paths(S0, drift, sigma * sqrt_dt, Z, counts, sizes, offsets)
 
-    return {
-        "paths": paths.tolist(),      
+    result = {
+        "paths": paths,
         "steps": steps,
         "horizon_days": horizon_days,
         "num_paths": num_paths,
     }
+    if jump_times is not None:
+        result["jumps"] = {"times": jump_times, "sizes": sizes, "offsets": offsets}
+    if control_variate:
+        log_drift = mu - 0.5 * sigma * sigma
+        result["control"] = gbm_control(S0, log_drift * dt + sigma * sqrt_dt * Z, log_drift, sigma, T_years)
+    return result
@@ -1,30 +1,115 @@
 import numpy as np
+from numba import njit
+from app.utils.random_streams import as_generator
+from app.utils.streaming_stats import RunningMoments
+
+# relative distance of the error variance from its steady state at which the
+# filter switches to the fixed steady-state gain
+STEADY_STATE_TOL = 1e-12
+
+
+def steady_state_gain(process_var, meas_var):
+    """
+    Closed-form limit of the random-walk filter: the predicted variance solves
+    P^2 - Q P - Q R = 0, so K = P / (P + R). Returns (gain, posterior variance).
+    """
+    Q = float(process_var)
+    R = float(meas_var)
+    P_pred = 0.5 * (Q + np.sqrt(Q * Q + 4.0 * Q * R))
+    K = P_pred / (P_pred + R) if P_pred + R > 0 else 0.0
+    return K, (1.0 - K) * P_pred
+
+
+@njit(cache=True)
+def _kalman_filter_numba(prices, x, P, Q, R, K_ss, P_ss, out):
+    """
+    Filter prices from state (x, P), writing levels to out; returns the final (x, P).
+    Once P is within STEADY_STATE_TOL of P_ss the gain is fixed at K_ss and the
+    variance recursion is skipped.
+    """
+    steady = abs(P - P_ss) <= STEADY_STATE_TOL * P_ss
+    for i in range(prices.shape[0]):
+        z = prices[i]
+        if steady:
+            x = x + K_ss * (z - x)
+        else:
+            P_pred = P + Q
+            K = P_pred / (P_pred + R)
+            x = x + K * (z - x)
+            P = (1 - K) * P_pred
+            if abs(P - P_ss) <= STEADY_STATE_TOL * P_ss:
+                steady = True
+                P = P_ss
+        out[i] = x
+    return x, P
+
 
 def kalman_filter_1d(prices, process_var, meas_var):
     """
     Optimized 1D Kalman filter.
     """
-    n = len(prices)
-    x_filtered = np.empty(n, dtype=float)
+    prices = np.ascontiguousarray(prices, dtype=float)
+    x_filtered = np.empty(len(prices), dtype=float)
+    if len(prices):
+        K_ss, P_ss = steady_state_gain(process_var, meas_var)
+        _kalman_filter_numba(prices, prices[0], 1.0, float(process_var), float(meas_var), K_ss, P_ss, x_filtered)
+    return x_filtered
 
-    x = prices[0]
-    P = 1.0
 
-    Q = float(process_var)
-    R = float(meas_var)
+class KalmanState:
+    """
+    Running 1D filter for one price series: the filtered level, its error
+    variance and the moments of the filtered level's increments (the
+    simulation noise scale), all updated in O(1) per new price.
+    last_price is the last observation fed in; last_close_time optionally
+    tracks the close_time of that candle.
+    """
 
-    for i in range(n):
-        z = prices[i]
-        P_pred = P + Q
-        K = P_pred / (P_pred + R)
+    def __init__(self, process_var=1e-3, meas_var=1e-2):
+        self.process_var = float(process_var)
+        self.meas_var = float(meas_var)
+        self.K_ss, self.P_ss = steady_state_gain(process_var, meas_var)
+        self.x = None
+        self.P = 1.0
+        self.count = 0
+        self.diffs = RunningMoments(1)
+        self.last_price = None
+        self.last_close_time = None
 
+    def update_many(self, prices):
+        """Feed a batch of prices through the compiled filter."""
+        prices = np.ascontiguousarray(prices, dtype=float)
+        if not len(prices):
+            return self
+        prev = prices[0] if self.x is None else self.x
+        filtered = np.empty(len(prices))
+        self.x, self.P = _kalman_filter_numba(
+            prices, prev, self.P, self.process_var, self.meas_var, self.K_ss, self.P_ss, filtered
+        )
+        steps = np.diff(filtered) if self.count == 0 else np.diff(filtered, prepend=prev)
+        self.diffs.add(steps.reshape(-1, 1))
+        self.count += len(prices)
+        self.last_price = float(prices[-1])
+        return self
 
-        x = x + K * (z - x)
-        P = (1 - K) * P_pred
+    def update(self, price):
+        """One new price."""
+        return self.update_many(np.array([price], dtype=float))
 
-        x_filtered[i] = x
+    @property
+    def noise_scale(self):
+        return float(self.diffs.std[0] + 1e-6)
 
-    return x_filtered
+    def to_dict(self):
+        return {
+            "level": self.x,
+            "error_var": self.P,
+            "gain": self.K_ss,
+            "noise_scale": self.noise_scale,
+            "count": self.count,
+            "last_price": self.last_price,
+            "last_close_time": self.last_close_time,
+        }
 
 
 def simulate_kalman(
@@ -33,23 +118,31 @@ def simulate_kalman(
     steps=30,
     num_paths=3,
     process_var=1e-3,
-    meas_var=1e-2
+    meas_var=1e-2,
+    state=None,
+    rng=None,
 ):
-
-    prices = np.asarray(historical, dtype=float)
-
-    if len(prices) < 10:
+    """
+    state: optional KalmanState already filtered up to the latest price
+    (e.g. from app.services.kalman_states); paths then start from its level and
+    noise scale instead of re-filtering the whole history.
+    """
+    if state is None:
+        prices = np.asarray(historical, dtype=float)
+        if len(prices) < 10:
+            raise ValueError("Need at least 10 price points for Kalman filter.")
+        state = KalmanState(process_var, meas_var).update_many(prices)
+    elif state.count < 10:
         raise ValueError("Need at least 10 price points for Kalman filter.")
-    filtered = kalman_filter_1d(prices, process_var, meas_var)
-    last_val = filtered[-1]
-    diffs = np.diff(filtered)
-    noise_scale = float(np.std(diffs) + 1e-6)
-    noise = np.random.normal(0.0, noise_scale, size=(num_paths, steps))
+
+    last_val = state.x
+    noise_scale = state.noise_scale
+    noise = as_generator(rng).normal(0.0, noise_scale, size=(num_paths, steps))
     paths = last_val + np.cumsum(noise, axis=1)
 
 
     return {
-        "paths": paths.tolist(),
-        "filtered": filtered.tolist(),
+        "paths": paths,
+        "filtered_level": last_val,
         "noise_scale": noise_scale
     }
@@ -0,0 +1,255 @@
+import numpy as np
+from app.models.jump_diffusion import _jump_sizes, jump_compensator
+from app.utils.random_streams import as_generator
+
+PROCESSES = ("gbm", "jump_diffusion")
+DECOMPOSITIONS = ("cholesky", "factor")
+# share of the correlation matrix's variance the factor decomposition keeps when n_factors is not given
+FACTOR_VARIANCE = 0.9
+# normal draws held in memory at once (paths x steps x assets); larger baskets simulate in more chunks
+CHUNK_ELEMENTS = 4_000_000
+
+
+def align_histories(series):
+    """
+    series: dict symbol -> (keys, closes), keys being the candle times or None.
+    When every series has keys, rows are the times all of them share;
+    otherwise the series are aligned on their last common length.
+    Returns (symbols, prices) with prices of shape (rows, assets).
+    """
+    symbols = list(series)
+    if all(keys is not None for keys, _ in series.values()):
+        common = set(series[symbols[0]][0])
+        for keys, _ in series.values():
+            common &= set(keys)
+        columns = []
+        for symbol in symbols:
+            keys, closes = series[symbol]
+            by_key = dict(zip(keys, closes))
+            columns.append([by_key[k] for k in sorted(common)])
+        prices = np.array(columns, dtype=float).T
+    else:
+        n = min(len(closes) for _, closes in series.values())
+        prices = np.array([np.asarray(closes, dtype=float)[len(closes) - n:]
+                           for _, closes in series.values()]).T
+    return symbols, prices
+
+
+def _ledoit_wolf_intensity(X, S):
+    """
+    Ledoit-Wolf (2004) optimal weight on the scaled-identity target for the
+    sample second-moment matrix S = X'X / T of the rows of X.
+    """
+    T, N = X.shape
+    mu = np.trace(S) / N
+    d2 = np.sum((S - mu * np.eye(N)) ** 2) / N
+    if d2 <= 0:
+        return 1.0
+    # sum_t ||x_t x_t' - S||^2 = sum_t |x_t|^4 - T ||S||^2
+    b2 = (np.sum(np.sum(X * X, axis=1) ** 2) - T * np.sum(S * S)) / (T * T * N)
+    return float(min(max(b2, 0.0), d2) / d2)
+
+
+def estimate_covariance(log_returns, shrinkage="ledoit_wolf"):
+    """
+    Per-step mean, volatility and correlation of aligned log returns (rows: steps, columns: assets).
+    shrinkage pulls the correlation matrix towards the identity, leaving the
+    volatilities as they are: "ledoit_wolf" (optimal intensity), None / "none",
+    or a fixed intensity in [0, 1]. Needed when there are about as many assets as
+    observations, where the sample matrix is singular or badly conditioned.
+    Returns {"mu", "sigma", "corr", "cov", "shrinkage"}.
+    """
+    log_returns = np.asarray(log_returns, dtype=float)
+    if log_returns.ndim != 2 or log_returns.shape[0] < 2:
+        raise ValueError("Need at least 3 aligned prices per asset to estimate a covariance.")
+    mu = log_returns.mean(axis=0)
+    sigma = log_returns.std(axis=0)
+    if np.any(sigma <= 0):
+        raise ValueError("Every asset needs non-constant prices to estimate a covariance.")
+
+    X = (log_returns - mu) / sigma
+    corr = X.T @ X / X.shape[0]
+    if shrinkage is None or shrinkage == "none":
+        delta = 0.0
+    elif shrinkage == "ledoit_wolf":
+        delta = _ledoit_wolf_intensity(X, corr)
+    else:
+        delta = float(shrinkage)
+        if not 0.0 <= delta <= 1.0:
+            raise ValueError("shrinkage must be 'ledoit_wolf', 'none' or a number in [0, 1]")
+    corr = (1.0 - delta) * corr + delta * np.eye(corr.shape[0])
+
+    return {
+        "mu": mu,
+        "sigma": sigma,
+        "corr": corr,
+        "cov": corr * np.outer(sigma, sigma),
+        "shrinkage": delta,
+    }
+
+
+def covariance_factors(estimate, decomposition="cholesky", n_factors=None):
+    """
+    Loadings B and idiosyncratic volatilities d with cov = B B' + diag(d^2),
+    so B z + d * e (z, e standard normal) has the estimated covariance.
+      - "cholesky": B is the Cholesky factor, d = 0; exact, O(assets^2) per draw
+      - "factor": the top n_factors principal components of the correlation
+        matrix, d making up the rest of each variance; O(assets * n_factors)
+        per draw. n_factors defaults to the fewest components explaining
+        FACTOR_VARIANCE of the correlation.
+    Returns {"loadings", "idio", "n_factors", "explained_variance"}.
+    """
+    if decomposition not in DECOMPOSITIONS:
+        raise ValueError("decomposition must be 'cholesky' or 'factor'")
+    sigma, corr = estimate["sigma"], estimate["corr"]
+    N = len(sigma)
+    if decomposition == "cholesky":
+        try:
+            L = np.linalg.cholesky(estimate["cov"])
+        except np.linalg.LinAlgError:
+            raise ValueError("Covariance is not positive definite; use shrinkage or decomposition='factor'.")
+        return {"loadings": L, "idio": np.zeros(N), "n_factors": N, "explained_variance": 1.0}
+
+    values, vectors = np.linalg.eigh(corr)
+    values, vectors = np.clip(values[::-1], 0.0, None), vectors[:, ::-1]
+    explained = np.cumsum(values) / values.sum()
+    if n_factors is None:
+        n_factors = int(np.searchsorted(explained, FACTOR_VARIANCE) + 1)
+    n_factors = int(min(max(1, n_factors), N))
+    B = vectors[:, :n_factors] * np.sqrt(values[:n_factors])
+    idio = np.sqrt(np.clip(1.0 - np.sum(B * B, axis=1), 0.0, None))
+    return {
+        "loadings": B * sigma[:, None],
+        "idio": idio * sigma,
+        "n_factors": n_factors,
+        "explained_variance": float(explained[n_factors - 1]),
+    }
+
+
+def _add_jumps(rng, log_s, lam_step, jump_model, jump_mu, jump_sigma, kou_p, kou_alpha1, kou_alpha2):
+    """
+    Add compound Poisson jumps to log_s (paths, steps, assets) in place: one
+    Poisson(lam_step * steps) count per path and asset, each jump placed on a
+    uniform step. The same law as a count per step (as jump_sampling="exact" in
+    simulate_jump_diffusion), with steps times fewer Poisson draws.
+    """
+    n, steps, n_assets = log_s.shape
+    counts = rng.poisson(lam_step * steps, size=n * n_assets)
+    total = int(counts.sum())
+    if total == 0:
+        return
+    owner = np.repeat(np.arange(n * n_assets), counts)
+    path, asset = np.divmod(owner, n_assets)
+    step = rng.integers(0, steps, size=total)
+    sizes = _jump_sizes(rng, total, jump_model, jump_mu, jump_sigma, kou_p, kou_alpha1, kou_alpha2)
+    flat = (path * steps + step) * n_assets + asset
+    log_s += np.bincount(flat, weights=sizes, minlength=log_s.size).reshape(log_s.shape)
+
+
+def simulate_multi_asset(
+    prices,
+    weights=None,
+    horizon_days=30,
+    steps=30,
+    num_paths=3,
+    process="gbm",
+    shrinkage="ledoit_wolf",
+    decomposition="cholesky",
+    n_factors=None,
+    initial_value=1.0,
+    jump_lambda=0.1,
+    jump_mu=0.0,
+    jump_sigma=0.02,
+    jump_model="merton",
+    kou_p=0.5,
+    kou_alpha1=5.0,
+    kou_alpha2=5.0,
+    trading_days=365,
+    chunk_paths=None,
+    rng=None,
+):
+    """
+    Correlated paths for a basket: prices is (rows, assets), aligned (see align_histories).
+    Each asset follows the same GBM as app.models.gbm with its own history's mu
+    and sigma (per history step); the shocks are correlated through
+    covariance_factors. process="jump_diffusion" adds independent Merton or Kou
+    jumps per asset (jump_lambda per trading_days, as in simulate_jump_diffusion),
+    compensated so the expected growth is unchanged.
+    weights: capital per asset at the start (default equal), normalised to sum
+    to 1 and held buy-and-hold. Paths are drawn in chunks of chunk_paths
+    (default: CHUNK_ELEMENTS draws per chunk), each one vectorised pass, and
+    only the portfolio value and the terminal asset prices are kept.
+    Returns {"paths" (num_paths, steps + 1) portfolio values, "terminal"
+    (num_paths, assets), "weights", "mu", "sigma", "covariance"}.
+    """
+    prices = np.asarray(prices, dtype=float)
+    if prices.ndim != 2 or prices.shape[0] < 3:
+        raise ValueError("prices must be (rows, assets) with at least 3 aligned rows.")
+    if np.any(prices <= 0):
+        raise ValueError("prices must be positive.")
+    if process not in PROCESSES:
+        raise ValueError(f"process must be one of {PROCESSES}")
+    n_assets = prices.shape[1]
+
+    if weights is None:
+        weights = np.full(n_assets, 1.0 / n_assets)
+    weights = np.asarray(weights, dtype=float)
+    if weights.shape != (n_assets,) or weights.sum() == 0:
+        raise ValueError("weights must have one entry per asset and a non-zero sum.")
+    weights = weights / weights.sum()
+
+    estimate = estimate_covariance(np.diff(np.log(prices), axis=0), shrinkage=shrinkage)
+    factors = covariance_factors(estimate, decomposition=decomposition, n_factors=n_factors)
+    B, idio = factors["loadings"], factors["idio"]
+    exact = decomposition == "cholesky"
+
+    dt = horizon_days / steps
+    sqrt_dt = np.sqrt(dt)
+    drift = (estimate["mu"] - 0.5 * estimate["sigma"] ** 2) * dt
+    if process == "jump_diffusion":
+        jump_model = jump_model.lower()
+        kappa = jump_compensator(jump_model, jump_mu, jump_sigma, kou_p, kou_alpha1, kou_alpha2)
+        lam_step = jump_lambda * horizon_days / trading_days / steps
+        drift = drift - lam_step * kappa
+
+    rng = as_generator(rng)
+    if chunk_paths is None:
+        chunk_paths = max(1, CHUNK_ELEMENTS // (steps * n_assets))
+    paths = np.empty((num_paths, steps + 1))
+    paths[:, 0] = initial_value
+    terminal = np.empty((num_paths, n_assets))
+    # portfolio value per unit of each asset's growth
+    value_weights = initial_value * weights
+
+    for start in range(0, num_paths, chunk_paths):
+        n = min(chunk_paths, num_paths - start)
+        if exact:
+            log_s = rng.standard_normal((n, steps, n_assets)) @ B.T
+        else:
+            log_s = rng.standard_normal((n, steps, B.shape[1])) @ B.T
+            log_s += rng.standard_normal((n, steps, n_assets)) * idio
+        log_s *= sqrt_dt
+        log_s += drift
+        if process == "jump_diffusion":
+            _add_jumps(rng, log_s, lam_step, jump_model, jump_mu, jump_sigma, kou_p, kou_alpha1, kou_alpha2)
+        np.cumsum(log_s, axis=1, out=log_s)
+        np.exp(log_s, out=log_s)
+        paths[start:start + n, 1:] = log_s @ value_weights
+        terminal[start:start + n] = log_s[:, -1, :] * prices[-1]
+
+    return {
+        "paths": paths,
+        "terminal": terminal,
+        "weights": weights,
+        "mu": estimate["mu"],
+        "sigma": estimate["sigma"],
+        "covariance": {
+            "shrinkage": estimate["shrinkage"],
+            "decomposition": decomposition,
+            "n_factors": factors["n_factors"],
+            "explained_variance": factors["explained_variance"],
+            "mean_correlation": float(
+                (estimate["corr"].sum() - n_assets) / max(1, n_assets * (n_assets - 1))
+            ),
+        },
+    }
@@ -1,9 +1,15 @@
 import numpy as np
 import pandas as pd
 from app.utils.helpers import estimate_ou_params
+from app.utils.variance_reduction import gbm_control, normal_draws
 
 def simulate_ou(historical=None, last_price=None, mu=None, sigma=None,
-                horizon_days=30, steps=30, num_paths=10):
+                horizon_days=30, steps=30, num_paths=10, rng=None,
+                variance_reduction="none", control_variate=False):
+    """
+    variance_reduction: "none", "antithetic", "moment_matching" or "sobol".
+    control_variate=True adds "control": a driftless GBM on the same shocks.
+    """
 
     prices = np.array(historical, dtype=float)
     logp = np.log(prices)
@@ -27,7 +33,7 @@ def simulate_ou(historical=None, last_price=None, mu=None, sigma=None,
     sqrt_dt = np.sqrt(dt)
     
     # Pre-generate random noise: shape (num_paths, steps)
-    Z = np.random.normal(0, 1, (num_paths, steps))
+    Z = normal_draws(rng, num_paths, steps, method=variance_reduction)[0]
     
     for t in range(steps):
         x = paths[:, t]
@@ -35,11 +41,16 @@ def simulate_ou(historical=None, last_price=None, mu=None, sigma=None,
         dx = theta * (mu_p - x) * dt + sigma_p * sqrt_dt * Z[:, t]
         paths[:, t+1] = x + dx
 
-    all_paths = np.exp(paths).tolist()
+    all_paths = np.exp(paths)
 
-    return {
+    result = {
         "paths": all_paths,
         "steps": steps,
         "horizon_days": horizon_days,
         "num_paths": num_paths
     }
+    if control_variate:
+        result["control"] = gbm_control(
+            float(np.exp(last_log)), sigma_p * sqrt_dt * Z, 0.0, sigma_p, horizon_days
+        )
+    return result
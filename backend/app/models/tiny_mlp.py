@@ -1,6 +1,37 @@
 import numpy as np
 from numba import njit, prange
-import app.utils.tunehyperparameters 
+from app.utils.random_streams import path_seeds
+
+# weight initialisation seed: training is deterministic, so cached calibrations
+# are exactly what a fresh fit would give
+INIT_SEED = 0
+
+OPTIMIZERS = ("adam", "gd")
+PRECISIONS = {"float64": np.float64, "float32": np.float32}
+GD_LR = 0.01
+ADAM_LR = 1e-3
+ADAM_BETA1 = 0.9
+ADAM_BETA2 = 0.999
+ADAM_EPS = 1e-8
+# trailing share of the training windows held out for early stopping
+VAL_FRACTION = 0.1
+MIN_VAL_SAMPLES = 10
+
+# explicit signatures (C-contiguous arrays): compiled, or loaded from the
+# on-disk cache, at import instead of on the first request
+_INIT_SIG = "(int64, int64, int64)"
+_EPOCHS_SIG = "(float64[:, ::1], float64[::1], float64[:, ::1], float64[::1], float64[:, ::1], float64[::1], int64, float64)"
+_TRAIN_SIG = "(float64[:, ::1], float64[::1], int64, int64, float64, int64)"
+_ADAM_SIGS = [
+    "(%s[:, ::1], %s[::1], %s[:, ::1], %s[::1], %s[::1], %s[::1], %s[::1], int64, int64, int64, float64, int64, int64, int64)"
+    % ((dtype,) * 7)
+    for dtype in ("float64", "float32")
+]
+_FORWARD_SIG = "(float64[:, ::1], float64[::1], float64[:, ::1], float64[::1], float64[:, ::1])"
+_SIMULATE_SIG = (
+    "(float64, float64[::1], int64, int64, int64, float64[:, ::1], float64[::1], float64[:, ::1], float64[::1],"
+    " float64[::1], float64[::1], float64, float64, float64, float64, uint32[::1])"
+)
 
 
 def _prepare_returns(prices, window=50):
@@ -36,15 +67,20 @@ def _prepare_returns(prices, window=50):
     return X_norm, y_norm, returns, norm
 
 
-@njit
-def _train_tiny_mlp_numba(X, y, hidden_dim, epochs, lr):
-    n_samples, input_dim = X.shape
-
+@njit(_INIT_SIG, cache=True)
+def _init_tiny_mlp_numba(input_dim, hidden_dim, seed):
+    np.random.seed(seed)
     W1 = 0.01 * np.random.randn(hidden_dim, input_dim)
     b1 = np.zeros(hidden_dim)
     W2 = 0.01 * np.random.randn(1, hidden_dim)
     b2 = np.zeros(1)
+    return W1, b1, W2, b2
+
 
+@njit(_EPOCHS_SIG, cache=True)
+def _train_epochs_numba(X, y, W1, b1, W2, b2, epochs, lr):
+    """Full-batch gradient descent on the weights in place, so training can resume."""
+    n_samples = X.shape[0]
     scale = 2.0 / n_samples
 
     for _ in range(epochs):
@@ -69,10 +105,138 @@ def _train_tiny_mlp_numba(X, y, hidden_dim, epochs, lr):
         W2 -= lr * dW2
         b2 -= lr * db2
 
+
+@njit(_TRAIN_SIG, cache=True)
+def _train_tiny_mlp_numba(X, y, hidden_dim, epochs, lr, seed=INIT_SEED):
+    W1, b1, W2, b2 = _init_tiny_mlp_numba(X.shape[1], hidden_dim, seed)
+    _train_epochs_numba(X, y, W1, b1, W2, b2, epochs, lr)
     return W1, b1, W2, b2
 
 
-@njit
+def _unpack(theta, hidden_dim, input_dim):
+    """(W1, b1, W2, b2) views into a flat parameter vector."""
+    n_w1 = hidden_dim * input_dim
+    return (
+        theta[:n_w1].reshape(hidden_dim, input_dim),
+        theta[n_w1:n_w1 + hidden_dim],
+        theta[n_w1 + hidden_dim:n_w1 + 2 * hidden_dim].reshape(1, hidden_dim),
+        theta[n_w1 + 2 * hidden_dim:],
+    )
+
+
+_unpack_numba = njit(cache=True)(_unpack)
+
+
+@njit(cache=True)
+def _as_dtype_of(value, arr):
+    """value as a scalar of arr's dtype; float literals would promote float32 math to float64."""
+    out = np.empty(1, dtype=arr.dtype)
+    out[0] = value
+    return out[0]
+
+
+@njit(_ADAM_SIGS, cache=True)
+def _adam_epochs_numba(X, y, X_val, y_val, theta, m, v, step, hidden_dim, epochs, lr,
+                       batch_size, patience, seed):
+    """
+    Mini-batch Adam on the flat parameters theta = (W1, b1, W2, b2). theta and
+    the moment estimates m, v are updated in place, so training can resume at
+    `step` (Adam updates so far). The validation MSE is measured after every
+    epoch; with patience > 0 training stops once it has not improved for
+    `patience` epochs and theta is restored to the best epoch.
+    Returns (step, epochs run, best epoch, validation MSE of the returned theta).
+    """
+    n, d = X.shape
+    h = hidden_dim
+    n_w1 = h * d
+    grad = np.zeros_like(theta)
+    best_theta = theta.copy()
+    best_loss = np.inf
+    best_epoch = 0
+    epochs_run = 0
+    loss = np.inf
+
+    np.random.seed(seed)
+    order = np.arange(n)
+    W1, b1, W2, b2 = _unpack_numba(theta, h, d)
+    one = _as_dtype_of(1.0, X)
+    # Adam constants in the parameter dtype, so float32 training stays float32
+    beta1 = _as_dtype_of(ADAM_BETA1, X)
+    beta2 = _as_dtype_of(ADAM_BETA2, X)
+    eps = _as_dtype_of(ADAM_EPS, X)
+
+    for epoch in range(epochs):
+        np.random.shuffle(order)
+        for start in range(0, n, batch_size):
+            idx = order[start:start + batch_size]
+            Xb = X[idx]
+            H1 = np.tanh(Xb @ W1.T + b1)
+            err = (H1 @ W2.T + b2).reshape(-1) - y[idx]
+            dY = err.reshape(-1, 1) * _as_dtype_of(2.0 / idx.shape[0], X)
+            dZ1 = (dY @ W2) * (one - H1 * H1)
+
+            grad[:n_w1] = (dZ1.T @ Xb).ravel()
+            grad[n_w1:n_w1 + h] = dZ1.sum(axis=0)
+            grad[n_w1 + h:n_w1 + 2 * h] = (dY.T @ H1).ravel()
+            grad[n_w1 + 2 * h:] = dY.sum()
+
+            step += 1
+            m[:] = beta1 * m + (one - beta1) * grad
+            v[:] = beta2 * v + (one - beta2) * grad * grad
+            step_size = _as_dtype_of(
+                lr * np.sqrt(1.0 - ADAM_BETA2 ** step) / (1.0 - ADAM_BETA1 ** step), X
+            )
+            theta -= step_size * m / (np.sqrt(v) + eps)
+        epochs_run += 1
+
+        if X_val.shape[0] == 0:
+            continue
+        pred = (np.tanh(X_val @ W1.T + b1) @ W2.T + b2).reshape(-1)
+        loss = np.mean((pred - y_val) ** 2)
+        if loss < best_loss:
+            best_loss = loss
+            best_epoch = epochs_run
+            best_theta[:] = theta
+        elif patience > 0 and epochs_run - best_epoch >= patience:
+            break
+
+    if patience > 0 and best_epoch > 0:
+        theta[:] = best_theta
+        loss = best_loss
+    return step, epochs_run, best_epoch, loss
+
+
+def _train_tiny_mlp_adam(X, y, hidden_dim, epochs, batch_size=64, patience=10, precision="float64",
+                         seed=INIT_SEED):
+    """
+    Adam with early stopping on the last VAL_FRACTION of the (time-ordered)
+    windows; with too few of them it trains on everything for `epochs`.
+    Returns float64 (W1, b1, W2, b2) and {"epochs_used", "best_epoch", "val_loss"}.
+    """
+    dtype = PRECISIONS[precision]
+    n_val = int(len(y) * VAL_FRACTION)
+    if n_val < MIN_VAL_SAMPLES:
+        n_val = 0
+    n_train = len(y) - n_val
+    X = np.ascontiguousarray(X, dtype=dtype)
+    y = np.ascontiguousarray(y, dtype=dtype)
+
+    theta = np.concatenate([w.ravel() for w in _init_tiny_mlp_numba(X.shape[1], hidden_dim, seed)]).astype(dtype)
+    _, epochs_used, best_epoch, val_loss = _adam_epochs_numba(
+        X[:n_train], y[:n_train], X[n_train:], y[n_train:],
+        theta, np.zeros_like(theta), np.zeros_like(theta), 0,
+        hidden_dim, epochs, ADAM_LR, batch_size, patience if n_val else 0, seed,
+    )
+    weights = tuple(np.ascontiguousarray(w, dtype=np.float64) for w in _unpack(theta, hidden_dim, X.shape[1]))
+    info = {
+        "epochs_used": int(epochs_used),
+        "best_epoch": int(best_epoch) if n_val else int(epochs_used),
+        "val_loss": float(val_loss) if n_val else None,
+    }
+    return weights, info
+
+
+@njit(_FORWARD_SIG, cache=True)
 def _mlp_forward_numba(W1, b1, W2, b2, X):
     Z1 = X @ W1.T + b1
     H1 = np.tanh(Z1)
@@ -80,7 +244,7 @@ def _mlp_forward_numba(W1, b1, W2, b2, X):
     return Y.reshape(-1)
 
 
-@njit(parallel=True)
+@njit(_SIMULATE_SIG, parallel=True, cache=True)
 def _simulate_paths_numba(
     last_price,
     returns,
@@ -96,11 +260,13 @@ def _simulate_paths_numba(
     y_mean,
     y_std,
     resid_std,
-    max_return
+    max_return,
+    seeds
 ):
     paths = np.empty((num_paths, steps), dtype=np.float64)
 
     for p in prange(num_paths):
+        np.random.seed(seeds[p])
         cur_price = last_price
         cur_window = returns[-window:].copy()
 
@@ -131,67 +297,156 @@ def _simulate_paths_numba(
 
 
 
-def simulate_tiny_mlp(
+def fit_tiny_mlp(
     historical,
-    horizon_days=60,
-    steps=30,
-    num_paths=3,
     window=50,
     hidden_dim=32,
     epochs=120,
     max_return=0.08,
-    auto_tune=False,           
+    auto_tune=False,
+    tune_budget=None,
+    optimizer="adam",
+    batch_size=64,
+    patience=10,
+    precision="float64",
 ):
+    """
+    Train the MLP on normalised return windows.
+    optimizer:
+      - "adam": mini-batch Adam; epochs is a cap, training stops once the
+        validation loss (last VAL_FRACTION of the windows) has not improved
+        for `patience` epochs and keeps the best epoch's weights.
+        precision="float32" trains in single precision.
+      - "gd": the original full-batch gradient descent for exactly `epochs`
+    auto_tune=True picks window / hidden_dim / epochs / max_return with
+    tune_mlp_hyperparams first, capped at tune_budget seconds when given.
+    Returns dict with the weights, normalisation stats, residual std, the
+    (possibly tuned) window / max_return used for simulation, the epochs
+    actually trained (epochs_used, best_epoch, val_loss) and, with auto_tune,
+    the search trace as "tuning" (tune_mlp_hyperparams output, else None).
+    """
     prices = np.asarray(historical, dtype=float)
     if len(prices) <= window + 5:
         raise ValueError("Not enough data for Tiny MLP.")
-
+    if optimizer not in OPTIMIZERS:
+        raise ValueError(f"optimizer must be one of {list(OPTIMIZERS)}")
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {list(PRECISIONS)}")
+    if batch_size < 1:
+        raise ValueError("batch_size must be >= 1")
+
+    tuned = None
     if auto_tune:
-        tuned = tune_mlp_hyperparams(
-            historical,
-            steps=steps,
-            horizon_days=horizon_days
-        )
-        best = tuned["best_params"]
+        # imported here: tunehyperparameters builds on this module's kernels
+        from app.utils.tunehyperparameters import tune_mlp_hyperparams
 
-        window      = best["window"]
-        hidden_dim  = best["hidden_dim"]
-        epochs      = best["epochs"]
-        max_return  = best["max_return"]
+        tuned = tune_mlp_hyperparams(historical, time_budget=tune_budget)
+        best = tuned["best_params"]
+        if best is not None:
+            window      = best["window"]
+            hidden_dim  = best["hidden_dim"]
+            epochs      = best["epochs"]
+            max_return  = best["max_return"]
 
     X, y, returns, norm = _prepare_returns(prices, window=window)
 
-    W1, b1, W2, b2 = _train_tiny_mlp_numba(
-        X, y,
-        hidden_dim=hidden_dim,
-        epochs=epochs,
-        lr=0.01,
-    )
+    if optimizer == "adam":
+        (W1, b1, W2, b2), training = _train_tiny_mlp_adam(
+            X, y, int(hidden_dim), int(epochs),
+            batch_size=int(batch_size), patience=int(patience), precision=precision,
+        )
+    else:
+        W1, b1, W2, b2 = _train_tiny_mlp_numba(
+            X, y,
+            hidden_dim=int(hidden_dim),
+            epochs=int(epochs),
+            lr=GD_LR,
+            seed=INIT_SEED,
+        )
+        training = {"epochs_used": int(epochs), "best_epoch": int(epochs), "val_loss": None}
 
     base_preds = _mlp_forward_numba(W1, b1, W2, b2, X)
     resid_norm = y - base_preds
     resid_real = resid_norm * norm["y_std"]
     resid_std = float(np.std(resid_real) + 1e-6)
 
+    return {
+        "W1": W1,
+        "b1": b1,
+        "W2": W2,
+        "b2": b2,
+        "norm": norm,
+        "resid_std": resid_std,
+        "window": window,
+        "max_return": max_return,
+        "tuning": tuned,
+        **training,
+    }
+
+
+def simulate_tiny_mlp(
+    historical,
+    horizon_days=60,
+    steps=30,
+    num_paths=3,
+    window=50,
+    hidden_dim=32,
+    epochs=120,
+    max_return=0.08,
+    auto_tune=False,
+    tune_budget=None,
+    optimizer="adam",
+    batch_size=64,
+    patience=10,
+    precision="float64",
+    calibration=None,
+    rng=None,
+):
+    """
+    calibration: optional fit_tiny_mlp(historical, ...) output, trained here if missing.
+    """
+    prices = np.asarray(historical, dtype=float)
+    if calibration is None:
+        calibration = fit_tiny_mlp(
+            prices,
+            window=window,
+            hidden_dim=hidden_dim,
+            epochs=epochs,
+            max_return=max_return,
+            auto_tune=auto_tune,
+            tune_budget=tune_budget,
+            optimizer=optimizer,
+            batch_size=batch_size,
+            patience=patience,
+            precision=precision,
+        )
+
+    window = calibration["window"]
+    norm = calibration["norm"]
+    returns = np.diff(np.log(prices + 1e-9))
+
     last_price = float(prices[-1])
     paths_arr = _simulate_paths_numba(
         last_price,
         returns,
-        steps,
-        num_paths,
-        window,
-        W1,
-        b1,
-        W2,
-        b2,
+        int(steps),
+        int(num_paths),
+        int(window),
+        calibration["W1"],
+        calibration["b1"],
+        calibration["W2"],
+        calibration["b2"],
         norm["X_mean"],
         norm["X_std"],
-        norm["y_mean"],
-        norm["y_std"],
-        resid_std,
-        max_return,
+        float(norm["y_mean"]),
+        float(norm["y_std"]),
+        calibration["resid_std"],
+        float(calibration["max_return"]),
+        path_seeds(rng, num_paths),
     )
 
     return {
-        "paths": paths_arr.tolist()
+        "paths": paths_arr,
+        "epochs_used": calibration["epochs_used"],
+        "tuning": calibration.get("tuning"),
     }
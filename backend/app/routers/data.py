@@ -1,49 +1,43 @@
+from typing import Optional
 from fastapi import APIRouter, Query, HTTPException
 import httpx
 import pandas as pd
-import os
-from dotenv import load_dotenv
+from app.services.candle_store import candle_store
 
-load_dotenv() 
-
-BINANCE_BASE_URL = os.getenv("BINANCE_BASE_URL", "https://api.binance.com/api/v3/klines")
 router = APIRouter(prefix="/data", tags=["Data"])
 
 @router.get("/{symbol}")
 async def get_symbol_data(
     symbol: str,
     interval: str = Query("1d", description="Candle interval: 1m, 5m, 1h, 1d, etc."),
-    limit: int = Query(100, description="Number of candles to fetch")
+    limit: int = Query(100, description="Number of candles to fetch"),
+    start_time: Optional[int] = Query(None, description="Range start (ms since epoch); enables range mode"),
+    end_time: Optional[int] = Query(None, description="Range end (ms since epoch), defaults to now"),
 ):
     """
     Fetch OHLC (Open, High, Low, Close) data for a crypto symbol from Binance.
+    Closed candles are kept in the local candle store, so only the missing tail is downloaded.
+    With start_time set, every candle in [start_time, end_time] is returned (limit is ignored)
+    and long ranges are fetched as concurrent pages.
     """
-    params = {
-        "symbol": symbol,
-        "interval": interval,
-        "limit": limit
-    }
-
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.get(BINANCE_BASE_URL, params=params)
-            resp.raise_for_status()
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(status_code=e.response.status_code, detail=str(e))
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
-
-    data = resp.json()
-
-    if not data:
+    try:
+        if start_time is not None:
+            columns = await candle_store.get_range(symbol, interval, start_time, end_time)
+        else:
+            columns = await candle_store.get(symbol, interval, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if not len(columns["open_time"]):
         raise HTTPException(status_code=404, detail=f"No data found for symbol {symbol}")
-    df = pd.DataFrame(data, columns=[
-        "open_time", "open", "high", "low", "close", "volume",
-        "close_time", "quote_asset_volume", "num_trades",
-        "taker_buy_base_asset_volume", "taker_buy_quote_asset_volume", "ignore"
-    ])
-
-    df[["open","high","low","close","volume"]] = df[["open","high","low","close","volume"]].astype(float)
+    df = pd.DataFrame({
+        name: columns[name]
+        for name in ["open_time", "open", "high", "low", "close", "volume", "close_time"]
+    })
 
     df["open_time"] = pd.to_datetime(df["open_time"], unit="ms")
     df["close_time"] = pd.to_datetime(df["close_time"], unit="ms")
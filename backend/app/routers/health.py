@@ -1,7 +1,12 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
+from app.services.warmup import warmup_status
 
 router = APIRouter(prefix="/health", tags=["Health"])
 
 @router.get("/")
-def health_check():
-    return {"status": "ok"}
+def health_check(response: Response):
+    """503 until the numba warm-up has run; the payload reports its compile time."""
+    status = warmup_status()
+    if not status["ready"]:
+        response.status_code = 503
+    return {"status": "ok" if status["ready"] else "warming", **status}
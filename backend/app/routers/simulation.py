@@ -1,46 +1,99 @@
-from fastapi import APIRouter, Body, HTTPException
+import asyncio
+import copy
+import time
+from fastapi import APIRouter, Body, HTTPException, Request, Response
 import pandas as pd
 import numpy as np
-import importlib
-from app.utils.signals import generate_signals_from_paths
-from app.backtest.smaStrategy import sma_strategy, compute_sma_series
-from app.backtest.backtestEngine import backtest
-from app.backtest.macdStrategy import macd_strategy, macd_indicator
-from app.backtest.fama_french import compute_ff_factors, fama_french_strategy
+import inspect
+from app.utils.calibration_cache import calibration_cache, make_calibration_key
+from app.services.executor import SIM_WORKERS, run_in_executor
+from app.services.simulation_engine import (
+    load_model, compute_signals, path_cuts, price_stats, ensemble_signals,
+    run_simulation as simulate_model, run_streaming_simulation, run_portfolio_simulation as simulate_portfolio,
+)
+from app.models.multi_asset import PROCESSES, align_histories, simulate_multi_asset
+from app.utils.streaming_stats import STREAM_RELATIVE_ACCURACY
+from app.utils.random_streams import RNG_BLOCK_PATHS, align_to_blocks
+from app.services.jobs import job_manager, JobQueueFull, DONE, FAILED
+from app.services.kalman_states import kalman_states
+from app.utils.payloads import (
+    JSON, ARROW, PayloadFormatError, negotiate_path_format, path_dtype, encode_paths,
+)
+from app.backtest.smaStrategy import sma_signals, compute_sma_series
+from app.backtest.backtestEngine import backtest_batch
+from app.backtest.macdStrategy import macd_signals, macd_indicator
+from app.backtest.fama_french import ff_factor_series, fama_french_signals
 
 router = APIRouter(prefix="/simulate", tags=["Simulation"])
 
+HISTORY = ["historical"]
+PRICE_STATS = ["last_price", "mu", "sigma"]
+
+# inputs: which of historical / last_price / mu / sigma the simulate function takes
+# streaming: cheap enough per path to run millions of paths in constant memory (streaming=true)
+# live_state: with symbol/interval in the payload, starts from a filter kept current by the candle store
 MODELS = {
-    "gbm": {"module": "app.models.gbm", "func": "simulate"},
-    "ou": {"module": "app.models.ou", "func": "simulate_ou"},
-    "garch": {"module": "app.models.garch", "func": "simulate_garch"},
-    "jump_diffusion": {"module": "app.models.jump_diffusion", "func": "simulate_jump_diffusion"},
-    "heston": {"module": "app.models.heston", "func": "simulate_heston"},
-    "hybrid_arima":{"module":"app.models.hybrid_arima","func":"simulate_hybrid_arima"},
-    "kalman":{"module":"app.models.kalman","func":"simulate_kalman"},
-    "tiny_mlp":{"module":"app.models.tiny_mlp","func":"simulate_tiny_mlp"},
-    "hmm":{"module":"app.models.hmm","func":"simulate_hmm"},
+    "gbm": {"module": "app.models.gbm", "func": "simulate", "inputs": PRICE_STATS, "streaming": True},
+    "ou": {"module": "app.models.ou", "func": "simulate_ou", "inputs": HISTORY, "streaming": True},
+    "garch": {"module": "app.models.garch", "func": "simulate_garch", "fit": "fit_garch", "inputs": HISTORY},
+    "jump_diffusion": {"module": "app.models.jump_diffusion", "func": "simulate_jump_diffusion", "inputs": HISTORY + PRICE_STATS},
+    "heston": {"module": "app.models.heston", "func": "simulate_heston", "inputs": PRICE_STATS, "streaming": True},
+    "hybrid_arima":{"module":"app.models.hybrid_arima","func":"simulate_hybrid_arima","fit":"fit_hybrid_arima","inputs":HISTORY},
+    "kalman":{"module":"app.models.kalman","func":"simulate_kalman","inputs":HISTORY,"live_state":True},
+    "tiny_mlp":{"module":"app.models.tiny_mlp","func":"simulate_tiny_mlp","fit":"fit_tiny_mlp","inputs":HISTORY},
+    "hmm":{"module":"app.models.hmm","func":"simulate_hmm","fit":"fit_hmm","inputs":HISTORY},
 }
 
+# paths per executor call for /simulate/jobs; progress is reported at this granularity
+JOB_CHUNK_PATHS = 1000
+# paths held in memory at once by each worker in streaming mode
+STREAM_CHUNK_PATHS = 10000
+
+# arguments the router fills in itself; everything else in payload["params"] is a model hyperparameter
+RESERVED_PARAMS = {
+    "historical", "last_price", "mu", "sigma",
+    "horizon_days", "steps", "num_paths", "calibration", "rng", "state",
+}
+
+# simulate_multi_asset arguments /simulate/portfolio fills in itself
+PORTFOLIO_RESERVED_PARAMS = {
+    "prices", "weights", "horizon_days", "steps", "num_paths", "process", "rng",
+}
+
+# most symbols in one /simulate/portfolio basket
+MAX_PORTFOLIO_ASSETS = 500
+
+
+def _model_params(func, params, reserved=RESERVED_PARAMS):
+    accepted = inspect.signature(func).parameters
+    unknown = [k for k in params if k not in accepted or k in reserved]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unsupported model params: {unknown}")
+    return dict(params)
+
+
+def _fit_key_params(fit_func, params):
+    """Fit hyperparameters with defaults filled in, so the cache key is explicit."""
+    sig = inspect.signature(fit_func)
+    bound = sig.bind_partial(**{k: v for k, v in params.items() if k in sig.parameters})
+    bound.apply_defaults()
+    return {k: v for k, v in bound.arguments.items() if k != "historical"}
+
 
 @router.get("/models")
 def get_models():
     return [{"id": k, "name": v["func"].replace("_", " ").title()} for k, v in MODELS.items()]
 
 
-@router.post("/")
-def run_simulation(payload: dict = Body(...)):
-    model = payload.get("model", "").lower()
-    historical = payload.get("historical")
-    horizon_days = int(payload.get("horizon_days", 30))
-    steps = int(payload.get("steps", 30))
-    num_paths = int(payload.get("paths") or payload.get("num_paths") or 3)
+@router.get("/cache")
+def get_calibration_cache_stats():
+    return calibration_cache.stats()
+
 
+def _parse_prices(historical):
+    """The close series of a payload's historical field, as a float array."""
     if not historical or not isinstance(historical, list):
         raise HTTPException(status_code=400, detail="Historical data required")
-
-    if model not in MODELS:
-        raise HTTPException(status_code=400, detail=f"Model '{model}' not supported")
     try:
         if isinstance(historical[0], dict) and "close" in historical[0]:
             prices = [float(x["close"]) for x in historical]
@@ -53,115 +106,595 @@ def run_simulation(payload: dict = Body(...)):
         if len(prices) < 2:
             raise HTTPException(status_code=400, detail="Need at least 2 data points to simulate")
 
-        prices = np.array(prices, dtype=float)
+        return np.array(prices, dtype=float)
 
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid historical data format")
 
-    log_returns = np.log(prices[1:] / prices[:-1])
-    mu = np.mean(log_returns)
-    sigma = np.std(log_returns)
-    last_price = prices[-1]
-    try:
-        module_info = MODELS[model]
-        module = importlib.import_module(module_info["module"])
-        simulate_func = getattr(module, module_info["func"])
-
-        if model == "gbm":
-            simulated_paths = simulate_func(
-                last_price=last_price,
-                mu=mu,
-                sigma=sigma,
-                horizon_days=horizon_days,
-                steps=steps,
-                num_paths=num_paths
-            )
 
-        elif model == "jump_diffusion":
+def _parse_seed(payload):
+    seed = payload.get("seed")
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or seed < 0):
+        raise HTTPException(status_code=400, detail="seed must be a non-negative integer")
+    return seed
 
-            result = simulate_func(
-                historical=list(prices),
-                last_price=last_price,
-                mu=mu,
-                sigma=sigma,
-                horizon_days=horizon_days,
-                steps=steps,
-                num_paths=num_paths
-            )
-            simulated_paths = result["paths"]
-
-        elif model in ["ou", "garch"]:
-            result = simulate_func(
-                historical=list(prices),
-                horizon_days=horizon_days,
-                steps=steps,
-                num_paths=num_paths
-            )
-            simulated_paths = result["paths"]
-        elif model == "heston":
-            result = simulate_func(
-                last_price=last_price,
-                mu=mu,
-                sigma=sigma,
-                horizon_days=horizon_days,
-                steps=steps,
-                num_paths=num_paths
-            )
-            simulated_paths = result["paths"]
-        elif model == "hybrid_arima":
-            result = simulate_func(
-                historical=list(prices),
-                horizon_days=horizon_days,
-                steps=steps,
-                num_paths=num_paths
-            )
-            simulated_paths = result["paths"]
-
-        elif model == "kalman":
-            result = simulate_func(
-                historical=list(prices),
-                horizon_days=horizon_days,
-                steps=steps,
-                num_paths=num_paths
-            )
-            simulated_paths = result["paths"]
-        elif model == "tiny_mlp":
-            result = simulate_func(
-                historical=list(prices),
-                horizon_days=horizon_days,
-                steps=steps,
-                num_paths=num_paths
-            )
-            simulated_paths = result["paths"]
-        elif model == "hmm":
-            result = simulate_func(
-                historical=list(prices),
-                horizon_days=horizon_days,
-                steps=steps,
-                num_paths=num_paths
-            )
-            simulated_paths = result["paths"]
 
-        else:
-            raise HTTPException(status_code=400, detail=f"Model {model} not implemented")
+def _model_spec(model, params, prices, payload):
+    """The per-model part of a request spec: checked params, live state and calibration cache key."""
+    if not isinstance(params, dict):
+        raise HTTPException(status_code=400, detail="params must be an object of model hyperparameters")
+    if model not in MODELS:
+        raise HTTPException(status_code=400, detail=f"Model '{model}' not supported")
+    module_info = MODELS[model]
+    model_params = _model_params(load_model(module_info), params)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    symbol, interval = payload.get("symbol"), payload.get("interval")
+    if symbol and interval and module_info.get("live_state"):
+        settings = _fit_key_params(load_model(module_info), model_params)
+        state = kalman_states.get(symbol, interval, settings["process_var"], settings["meas_var"])
+        # only when the live filter has seen exactly the history sent; otherwise
+        # the payload history is filtered as usual
+        if state is not None and np.isclose(state.last_price, prices[-1], rtol=1e-12, atol=0.0):
+            # a snapshot: the live filter keeps advancing while this request runs
+            model_params = {**model_params, "state": copy.deepcopy(state)}
+
+    fit_params, key = None, None
+    if "fit" in module_info:
+        fit_params = _fit_key_params(load_model(module_info, "fit"), model_params)
+        key = make_calibration_key(model, prices, fit_params)
 
-    signals = generate_signals_from_paths(
-        simulated_paths,
-        S0=float(last_price),
-        steps=steps,
-        horizon_days=horizon_days
-    )
     return {
         "model": model,
-        "paths": simulated_paths,
-        "steps": steps,
+        "module_info": module_info,
+        "params": model_params,
+        "fit_params": fit_params,
+        "calibration_key": key,
+    }
+
+
+def _parse_simulation_request(payload):
+    """Validate a /simulate payload; returns the request spec shared by the sync and job endpoints."""
+    model = payload.get("model", "").lower()
+    horizon_days = int(payload.get("horizon_days", 30))
+    steps = int(payload.get("steps", 30))
+    num_paths = int(payload.get("paths") or payload.get("num_paths") or 3)
+    prices = _parse_prices(payload.get("historical"))
+    model_spec = _model_spec(model, payload.get("params") or {}, prices, payload)
+
+    return_mode = payload.get("return") or "paths"
+    if return_mode not in ("paths", "summary"):
+        raise HTTPException(status_code=400, detail="return must be 'paths' or 'summary'")
+
+    streaming = bool(payload.get("streaming", False))
+    if streaming and not model_spec["module_info"].get("streaming"):
+        supported = [k for k, v in MODELS.items() if v.get("streaming")]
+        raise HTTPException(status_code=400, detail=f"Streaming mode supports only {supported}")
+    try:
+        chunk_paths = int(payload.get("chunk_paths") or STREAM_CHUNK_PATHS)
+        relative_accuracy = float(payload.get("relative_accuracy") or STREAM_RELATIVE_ACCURACY)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="chunk_paths and relative_accuracy must be numbers")
+    if chunk_paths <= 0 or not 0 < relative_accuracy < 1:
+        raise HTTPException(status_code=400, detail="chunk_paths must be positive and relative_accuracy in (0, 1)")
+
+    seed = _parse_seed(payload)
+    if seed is not None:
+        # seeded chunks cover whole random-stream blocks
+        chunk_paths = align_to_blocks(chunk_paths)
+
+    return {
+        **model_spec,
+        "prices": prices,
         "horizon_days": horizon_days,
+        "steps": steps,
         "num_paths": num_paths,
-        "signals": signals
+        # streaming results are summaries by construction
+        "summary": return_mode == "summary" or streaming,
+        "streaming": streaming,
+        "chunk_paths": chunk_paths,
+        "relative_accuracy": relative_accuracy,
+        "seed": seed,
     }
+
+
+async def _simulate(spec, num_paths, calibration=None, with_signals=True, summary=False, path_offset=0,
+                    include_ratios=None):
+    """
+    Run one simulation on the executor, reading and filling the calibration cache.
+    path_offset places these paths within a seeded run (see run_simulation).
+    """
+    key = spec["calibration_key"]
+    if calibration is None and key is not None:
+        calibration = calibration_cache.get(key)
+
+    simulated_paths, signals, fitted = await run_in_executor(
+        spec["model"],
+        simulate_model,
+        spec["module_info"],
+        spec["prices"],
+        spec["horizon_days"],
+        spec["steps"],
+        num_paths,
+        params=spec["params"],
+        fit_params=spec["fit_params"],
+        calibration=calibration,
+        with_signals=with_signals,
+        summary=summary,
+        seed=spec["seed"],
+        path_offset=path_offset,
+        include_ratios=include_ratios,
+        stats=spec.get("price_stats"),
+    )
+    if fitted is not None:
+        calibration_cache.put(key, fitted)
+        calibration = fitted
+    return simulated_paths, signals, calibration
+
+
+async def _simulate_streaming(spec, num_paths, calibration=None, path_offset=0):
+    """
+    Streaming mode: split num_paths over the executor workers, each simulating
+    in blocks of spec["chunk_paths"] and returning only its sketches, then merge.
+    Seeded runs split on random-stream block boundaries.
+    """
+    key = spec["calibration_key"]
+    if calibration is None and key is not None:
+        calibration = calibration_cache.get(key)
+
+    async def share(offset, n, calibration):
+        return await run_in_executor(
+            spec["model"],
+            run_streaming_simulation,
+            spec["module_info"],
+            spec["prices"],
+            spec["horizon_days"],
+            spec["steps"],
+            n,
+            spec["chunk_paths"],
+            params=spec["params"],
+            fit_params=spec["fit_params"],
+            calibration=calibration,
+            relative_accuracy=spec["relative_accuracy"],
+            seed=spec["seed"],
+            path_offset=path_offset + offset,
+        )
+
+    unit = RNG_BLOCK_PATHS if spec["seed"] is not None else 1
+    n_units = -(-num_paths // unit)
+    n_shares = max(1, min(SIM_WORKERS, -(-num_paths // spec["chunk_paths"]), n_units))
+    bounds = [min(num_paths, n_units * i // n_shares * unit) for i in range(n_shares + 1)]
+    shares = [(bounds[i], bounds[i + 1] - bounds[i]) for i in range(n_shares)]
+
+    stats, fitted = await share(*shares[0], calibration)
+    if fitted is not None:
+        # fit once on the first share; the others reuse it
+        calibration_cache.put(key, fitted)
+        calibration = fitted
+    results = await asyncio.gather(*(share(offset, n, calibration) for offset, n in shares[1:]))
+    for other, _ in results:
+        stats.merge(other)
+    return stats, calibration
+
+
+# training-cost fields of a fit (tiny_mlp), passed on as "training"
+TRAINING_FIELDS = ("epochs_used", "best_epoch", "val_loss")
+
+
+def _simulation_response(spec, simulated_paths, signals, calibration=None):
+    """
+    calibration: the fit used. A tiny_mlp fit's epochs_used / best_epoch /
+    val_loss are passed on as "training" and an auto_tune search trace as
+    "tuning". A cached fit reports the training it was built with.
+    """
+    extra = {}
+    if isinstance(calibration, dict) and "epochs_used" in calibration:
+        extra["training"] = {name: calibration.get(name) for name in TRAINING_FIELDS}
+    if isinstance(calibration, dict) and calibration.get("tuning") is not None:
+        extra["tuning"] = calibration["tuning"]
+    if spec["summary"]:
+        # stepwise quantiles live in signals["percentiles_stepwise"]
+        return {
+            "model": spec["model"],
+            "return": "summary",
+            "steps": spec["steps"],
+            "horizon_days": spec["horizon_days"],
+            "num_paths": spec["num_paths"],
+            "seed": spec["seed"],
+            "signals": signals,
+            **extra,
+        }
+    return {
+        "model": spec["model"],
+        "paths": simulated_paths,
+        "steps": spec["steps"],
+        "horizon_days": spec["horizon_days"],
+        "num_paths": spec["num_paths"],
+        "seed": spec["seed"],
+        "signals": signals,
+        **extra,
+    }
+
+
+def _response_format(request, payload=None):
+    """(media type, dtype) for the paths, from the Accept header and an optional dtype field."""
+    dtype = request.query_params.get("dtype") or (payload or {}).get("dtype")
+    try:
+        return negotiate_path_format(request.headers.get("accept")), path_dtype(dtype)
+    except PayloadFormatError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+
+def _render(result, media_type, dtype):
+    """
+    JSON keeps the nested-list body; binary formats send the path array as is,
+    with the scalar fields as X- headers (Arrow also embeds the signals, training
+    and any tuning trace).
+    Summary results have no paths and are always JSON.
+    """
+    if "paths" not in result:
+        return result
+    if media_type == JSON:
+        return {**result, "paths": result["paths"].tolist()}
+
+    metadata = {}
+    if media_type == ARROW and result["signals"] is not None:
+        metadata["signals"] = result["signals"]
+    if media_type == ARROW and result.get("training") is not None:
+        metadata["training"] = result["training"]
+    if media_type == ARROW and result.get("tuning") is not None:
+        metadata["tuning"] = result["tuning"]
+    try:
+        body, headers = encode_paths(result["paths"], media_type, dtype=dtype, metadata=metadata)
+    except PayloadFormatError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+    headers.update({
+        "X-Model": result["model"],
+        "X-Steps": str(result["steps"]),
+        "X-Horizon-Days": str(result["horizon_days"]),
+        "X-Num-Paths": str(result["num_paths"]),
+    })
+    if result.get("seed") is not None:
+        headers["X-Seed"] = str(result["seed"])
+    if result.get("training") is not None:
+        headers["X-Epochs-Used"] = str(result["training"]["epochs_used"])
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+@router.post("/")
+async def run_simulation(request: Request, payload: dict = Body(...)):
+    """
+    Paths are returned as JSON by default. Send Accept: application/octet-stream,
+    application/x-npy or application/vnd.apache.arrow.stream for a binary array
+    (dtype=float32|float64 via query or payload); signals are only computed for
+    JSON and Arrow responses.
+    With return=summary (query or payload) only the signals, including the
+    per-step quantiles, are returned and the paths never leave the worker.
+    With streaming=true (gbm, ou, heston) paths are simulated in blocks of
+    chunk_paths and reduced to quantile sketches, so num_paths is bounded by
+    time rather than memory; the summary then reports its accuracy.
+    For kalman, symbol and interval start the paths from the live filter on the
+    candle store's series instead of re-filtering the history, provided that
+    filter's last observation is the last price sent.
+    A seed reproduces the same paths however the run is chunked; seeded paths
+    come from random-stream blocks of 8 up to 1024 paths, so a seeded run
+    simulates at most about twice the paths requested (whole 1024-path
+    blocks beyond the first 1024 paths).
+    """
+    if "return" in request.query_params:
+        payload = {**payload, "return": request.query_params["return"]}
+    media_type, dtype = _response_format(request, payload)
+    spec = _parse_simulation_request(payload)
+    if spec["streaming"]:
+        try:
+            stats, _ = await _simulate_streaming(spec, spec["num_paths"])
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        return _simulation_response(spec, None, stats.to_signals())
+    try:
+        simulated_paths, signals, calibration = await _simulate(
+            spec, spec["num_paths"], with_signals=media_type in (JSON, ARROW), summary=spec["summary"]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return _render(_simulation_response(spec, simulated_paths, signals, calibration), media_type, dtype)
+
+
+def _parse_ensemble_request(payload):
+    """
+    Validate a /simulate/ensemble payload: the history is parsed, and its log
+    returns summarised, once for every model. Returns one spec per model.
+    """
+    models = payload.get("models") or list(MODELS)
+    if not isinstance(models, list) or not models:
+        raise HTTPException(status_code=400, detail="models must be a non-empty list of model ids")
+    models = list(dict.fromkeys(str(m).lower() for m in models))
+    params = payload.get("params") or {}
+    if not isinstance(params, dict):
+        raise HTTPException(status_code=400, detail="params must be an object of per-model hyperparameters")
+    unknown = [m for m in params if m not in models]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"params given for models not in the ensemble: {unknown}")
+
+    prices = _parse_prices(payload.get("historical"))
+    shared = {
+        "prices": prices,
+        "price_stats": price_stats(prices),
+        "horizon_days": int(payload.get("horizon_days", 30)),
+        "steps": int(payload.get("steps", 30)),
+        "num_paths": int(payload.get("paths") or payload.get("num_paths") or 3),
+        "seed": _parse_seed(payload),
+    }
+    return [
+        {**_model_spec(model, params.get(model) or {}, prices, payload), **shared}
+        for model in models
+    ]
+
+
+@router.post("/ensemble")
+async def run_ensemble(payload: dict = Body(...)):
+    """
+    Run several models (models, default all) on one history concurrently, one
+    executor call each, so the latency is close to the slowest model's.
+    params maps model id -> hyperparameters; the other fields are as for /simulate
+    and apply to every model (a seed gives every model the same random streams).
+    Returns per-model summaries, the fan chart and signals of all paths pooled
+    with equal weight per model, and model_agreement_score over the models.
+    Models that fail are reported under errors; the rest still form the ensemble.
+    """
+    specs = _parse_ensemble_request(payload)
+    first = specs[0]
+
+    async def run(spec):
+        start = time.perf_counter()
+        paths, signals, _ = await _simulate(spec, spec["num_paths"], include_ratios=False)
+        return paths, signals, round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(run(spec) for spec in specs), return_exceptions=True)
+
+    models, model_paths, errors = {}, {}, {}
+    for spec, outcome in zip(specs, outcomes):
+        if isinstance(outcome, BaseException):
+            errors[spec["model"]] = str(outcome)
+            continue
+        paths, signals, elapsed = outcome
+        model_paths[spec["model"]] = paths
+        models[spec["model"]] = {"signals": signals, "elapsed": elapsed}
+    if not model_paths:
+        raise HTTPException(status_code=500, detail={"errors": errors})
+
+    try:
+        merged = await run_in_executor(
+            "ensemble", ensemble_signals, model_paths,
+            first["prices"][-1], first["steps"], first["horizon_days"],
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "models": models,
+        "fan_chart": merged["signals"]["percentiles_stepwise"],
+        "signals": merged["signals"],
+        "agreement": merged["agreement"],
+        "errors": errors,
+        "steps": first["steps"],
+        "horizon_days": first["horizon_days"],
+        "num_paths": first["num_paths"],
+        "seed": first["seed"],
+        "elapsed": round(time.perf_counter() - start, 3),
+    }
+
+
+def _parse_portfolio_request(payload):
+    """
+    Validate a /simulate/portfolio payload. histories maps symbol -> candles
+    (with "close" and, to align on time, "open_time") or plain closes.
+    """
+    histories = payload.get("histories")
+    if not isinstance(histories, dict) or len(histories) < 2:
+        raise HTTPException(status_code=400, detail="histories must map at least 2 symbols to their history")
+    if len(histories) > MAX_PORTFOLIO_ASSETS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PORTFOLIO_ASSETS} symbols per portfolio")
+
+    series = {}
+    for symbol, historical in histories.items():
+        prices = _parse_prices(historical)
+        keys = None
+        if isinstance(historical[0], dict) and all("open_time" in x for x in historical):
+            keys = [x["open_time"] for x in historical]
+        series[symbol] = (keys, prices)
+    symbols, prices = align_histories(series)
+    if len(prices) < 3:
+        raise HTTPException(status_code=400, detail="Need at least 3 aligned data points across all symbols")
+
+    weights = payload.get("weights")
+    if weights is not None:
+        if not isinstance(weights, dict) or set(weights) - set(symbols):
+            raise HTTPException(status_code=400, detail="weights must map symbols in histories to numbers")
+        try:
+            weights = [float(weights.get(symbol, 0.0)) for symbol in symbols]
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="weights must map symbols in histories to numbers")
+
+    process = (payload.get("model") or "gbm").lower()
+    if process not in PROCESSES:
+        raise HTTPException(status_code=400, detail=f"Portfolio model must be one of {list(PROCESSES)}")
+    params = payload.get("params") or {}
+    if not isinstance(params, dict):
+        raise HTTPException(status_code=400, detail="params must be an object of model hyperparameters")
+
+    return {
+        "symbols": symbols,
+        "prices": prices,
+        "weights": weights,
+        "horizon_days": int(payload.get("horizon_days", 30)),
+        "steps": int(payload.get("steps", 30)),
+        "num_paths": int(payload.get("paths") or payload.get("num_paths") or 1000),
+        "params": {**_model_params(simulate_multi_asset, params, PORTFOLIO_RESERVED_PARAMS), "process": process},
+        "seed": _parse_seed(payload),
+    }
+
+
+@router.post("/portfolio")
+async def run_portfolio_simulation(payload: dict = Body(...)):
+    """
+    Joint paths for a basket of symbols: covariance from the aligned histories
+    (Ledoit-Wolf shrinkage by default), correlated GBM or jump-diffusion paths
+    (model) through a Cholesky or factor decomposition (params.decomposition),
+    reduced in the worker to the portfolio's signals (fan chart, percentiles,
+    CVaR) and a terminal summary per symbol; per-asset paths are never returned.
+    weights maps symbol -> capital weight (default equal).
+    """
+    spec = _parse_portfolio_request(payload)
+    try:
+        result = await run_in_executor(
+            "multi_asset",
+            simulate_portfolio,
+            spec["symbols"],
+            spec["prices"],
+            spec["horizon_days"],
+            spec["steps"],
+            spec["num_paths"],
+            weights=spec["weights"],
+            params=spec["params"],
+            seed=spec["seed"],
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "model": spec["params"]["process"],
+        "symbols": spec["symbols"],
+        "aligned_points": len(spec["prices"]),
+        "steps": spec["steps"],
+        "horizon_days": spec["horizon_days"],
+        "num_paths": spec["num_paths"],
+        "seed": spec["seed"],
+        **result,
+    }
+
+
+def _simulation_job_runner(spec, chunk_paths):
+    """
+    Job body: simulate in chunks of chunk_paths so progress can be reported and
+    cancellation takes effect between chunks. Every chunk reuses the first
+    chunk's calibration, so all paths come from the same fitted model.
+    Streaming jobs merge each round's sketches instead of keeping the paths.
+    """
+    async def runner(job):
+        if spec["streaming"]:
+            return await streaming_runner(job)
+        chunks, cuts = [], [np.zeros(1, dtype=int)]
+        calibration = None
+        remaining = spec["num_paths"]
+        while remaining > 0 and not job.cancel_requested:
+            n = min(chunk_paths, remaining)
+            offset = spec["num_paths"] - remaining
+            chunk, _, calibration = await _simulate(
+                spec, n, calibration=calibration, with_signals=False, path_offset=offset
+            )
+            chunks.append(chunk)
+            # every chunk is a separate simulate call: its cuts, shifted to its place
+            cuts.append(path_cuts(spec["params"], n, spec["seed"], offset)[1:] + offset)
+            remaining -= n
+            job.progress_done += n
+
+        if job.cancel_requested:
+            return None
+        simulated_paths = np.concatenate(chunks, axis=0)
+        signals = await run_in_executor(
+            spec["model"],
+            compute_signals,
+            simulated_paths,
+            spec["prices"][-1],
+            spec["steps"],
+            spec["horizon_days"],
+            include_ratios=not spec["summary"],
+            cuts=np.concatenate(cuts),
+        )
+        return _simulation_response(spec, simulated_paths, signals, calibration)
+
+    async def streaming_runner(job):
+        # one round keeps every worker busy with one block; only sketches come back
+        stats, calibration = None, None
+        remaining = spec["num_paths"]
+        while remaining > 0 and not job.cancel_requested:
+            n = min(chunk_paths * SIM_WORKERS, remaining)
+            round_stats, calibration = await _simulate_streaming(
+                spec, n, calibration=calibration, path_offset=spec["num_paths"] - remaining
+            )
+            if stats is None:
+                stats = round_stats
+            else:
+                stats.merge(round_stats)
+            remaining -= n
+            job.progress_done += n
+
+        if job.cancel_requested:
+            return None
+        return _simulation_response(spec, None, stats.to_signals())
+
+    return runner
+
+
+def _get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job
+
+
+@router.post("/jobs", status_code=202)
+async def submit_simulation_job(payload: dict = Body(...)):
+    spec = _parse_simulation_request(payload)
+    chunk_paths = spec["chunk_paths"] if spec["streaming"] else int(payload.get("chunk_paths") or JOB_CHUNK_PATHS)
+    if chunk_paths <= 0:
+        raise HTTPException(status_code=400, detail="chunk_paths must be positive")
+    if spec["seed"] is not None:
+        chunk_paths = align_to_blocks(chunk_paths)
+
+    try:
+        job = job_manager.submit(
+            _simulation_job_runner(spec, chunk_paths),
+            total=spec["num_paths"],
+            meta={"model": spec["model"]},
+        )
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return job.to_dict()
+
+
+@router.get("/jobs")
+def get_simulation_jobs_stats():
+    return job_manager.stats()
+
+
+@router.get("/jobs/{job_id}")
+def get_simulation_job(job_id: str):
+    return _get_job(job_id).to_dict()
+
+
+@router.get("/jobs/{job_id}/result")
+def get_simulation_job_result(job_id: str, request: Request):
+    media_type, dtype = _response_format(request)
+    job = _get_job(job_id)
+    if job.status == FAILED:
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status != DONE:
+        raise HTTPException(status_code=409, detail=f"Job '{job_id}' is {job.status}")
+    return _render(job.result, media_type, dtype)
+
+
+@router.delete("/jobs/{job_id}")
+def cancel_simulation_job(job_id: str):
+    _get_job(job_id)
+    return job_manager.cancel(job_id).to_dict()
+
+
 @router.post("/backtest")
 def run_backtest(payload: dict):
     strategy_type = payload.get("strategy", "").lower()
@@ -182,19 +715,23 @@ def run_backtest(payload: dict):
     indicators = {}
 
     if strategy_type == "sma":
-        signal = lambda i, prices: sma_strategy(i, prices)
+        signals = lambda prices: sma_signals(prices)
 
     elif strategy_type == "macd":
-        signal = lambda i, prices: macd_strategy(i, prices)
+        signals = lambda prices: macd_signals(prices)
 
     elif strategy_type == "fama_french":
-        signal = lambda i, prices: fama_french_strategy(i, prices)
+        try:
+            ff = ff_factor_series(closes)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        signals = lambda prices: fama_french_signals(prices, factors=ff)
 
     else:
         raise HTTPException(status_code=400, detail=f"Unknown strategy '{strategy_type}'")
 
     try:
-        result = backtest([{"close": c} for c in closes], signal, initial_capital=initialvalue)
+        result = backtest_batch([{"close": c} for c in closes], signals, initial_capital=initialvalue)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     if strategy_type == "sma":
@@ -206,7 +743,6 @@ def run_backtest(payload: dict):
         indicators["signal_line"] = signal_line
 
     elif strategy_type == "fama_french":
-        ff = compute_ff_factors(closes)
         indicators = {
             "mkt": ff["MKT"].tolist(),
             "mom": ff["MOM"].tolist(),
@@ -0,0 +1,334 @@
+import asyncio
+import os
+import threading
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+from app.services.http_client import get_with_retry
+
+load_dotenv()
+
+BINANCE_BASE_URL = os.getenv("BINANCE_BASE_URL", "https://api.binance.com/api/v3/klines")
+CANDLE_STORE_DIR = os.getenv("CANDLE_STORE_DIR", ".candle_store")
+# how long the still-open candle is served from memory before asking Binance again
+LIVE_CANDLE_TTL = float(os.getenv("CANDLE_STORE_LIVE_TTL", "5"))
+
+# Binance caps klines at 1000 rows per call
+MAX_KLINES_PER_CALL = 1000
+# range fetches: pages in flight at once, and the largest range accepted
+KLINE_FETCH_CONCURRENCY = int(os.getenv("KLINE_FETCH_CONCURRENCY", "8"))
+MAX_RANGE_CANDLES = int(os.getenv("MAX_RANGE_CANDLES", "500000"))
+
+INTERVAL_MS = {
+    "1s": 1_000,
+    "1m": 60_000,
+    "3m": 3 * 60_000,
+    "5m": 5 * 60_000,
+    "15m": 15 * 60_000,
+    "30m": 30 * 60_000,
+    "1h": 3_600_000,
+    "2h": 2 * 3_600_000,
+    "4h": 4 * 3_600_000,
+    "6h": 6 * 3_600_000,
+    "8h": 8 * 3_600_000,
+    "12h": 12 * 3_600_000,
+    "1d": 86_400_000,
+    "3d": 3 * 86_400_000,
+    "1w": 7 * 86_400_000,
+    "1M": 31 * 86_400_000,
+}
+
+COLUMNS = {
+    "open_time": np.int64,
+    "open": np.float64,
+    "high": np.float64,
+    "low": np.float64,
+    "close": np.float64,
+    "volume": np.float64,
+    "close_time": np.int64,
+}
+# one row per candle; all columns live in a single file so they are replaced together
+RECORD_DTYPE = np.dtype(list(COLUMNS.items()))
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def klines_to_columns(rows):
+    """Convert raw Binance kline rows into the store's column arrays."""
+    rows = list(rows)
+    columns = {}
+    for pos, (name, dtype) in enumerate(COLUMNS.items()):
+        columns[name] = np.array([row[pos] for row in rows], dtype=dtype)
+    return columns
+
+
+def _empty_columns():
+    return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+
+
+def _concat(*parts):
+    parts = [p for p in parts if p is not None and len(p["open_time"])]
+    if not parts:
+        return _empty_columns()
+    return {name: np.concatenate([p[name] for p in parts]) for name in COLUMNS}
+
+
+def _merge(stored, new):
+    """Union of two column sets, sorted by open_time; rows from `new` win on duplicates."""
+    merged = _concat(new, stored)
+    _, first = np.unique(merged["open_time"], return_index=True)
+    return {name: col[first] for name, col in merged.items()}
+
+
+class CandleStore:
+    """
+    Local columnar kline store keyed by (symbol, interval).
+
+    Each key is one structured .npy file, <root>/<SYMBOL>/<interval>/candles.npy,
+    opened memory-mapped, so repeated queries are served from disk or the page
+    cache. Saves write a new file and os.replace it in, so a reader sees either
+    the old rows or the new ones, never a mix. Disk I/O runs in worker threads,
+    off the event loop. Only closed candles are persisted; each query fetches the missing tail
+    after the last stored close_time (plus the still-open candle) and, when the
+    store holds fewer rows than requested, backfills older history.
+    """
+
+    def __init__(self, root=CANDLE_STORE_DIR, base_url=BINANCE_BASE_URL, client=None):
+        self.root = root
+        self.base_url = base_url
+        # None uses the application-wide pooled client
+        self.client = client
+        self._locks = {}
+        self._live = {}
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """callback(symbol, interval, columns) runs with every batch of newly persisted closed candles."""
+        self._listeners.append(callback)
+
+    def _notify(self, symbol, interval, columns):
+        for callback in self._listeners:
+            callback(symbol, interval, columns)
+
+    def _path(self, symbol, interval):
+        return os.path.join(self.root, symbol.upper(), interval, "candles.npy")
+
+    def _lock(self, key):
+        if key not in self._locks:
+            self._locks[key] = asyncio.Lock()
+        return self._locks[key]
+
+    def load(self, symbol, interval):
+        """Memory-map the stored columns; returns None when nothing is stored. Blocking."""
+        path = self._path(symbol, interval)
+        if not os.path.exists(path):
+            return None
+        records = np.load(path, mmap_mode="r")
+        return {name: records[name] for name in COLUMNS}
+
+    def save(self, symbol, interval, columns):
+        """Replace the stored rows with `columns` in one atomic rename. Blocking."""
+        path = self._path(symbol, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        records = np.empty(len(columns["open_time"]), dtype=RECORD_DTYPE)
+        for name in COLUMNS:
+            records[name] = columns[name]
+        # unique per writer, so concurrent processes never share a temp file
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as fh:
+            np.save(fh, records)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+
+    async def _fetch(self, symbol, interval, **params):
+        params = {"symbol": symbol, "interval": interval, **params}
+        resp = await get_with_retry(self.base_url, params=params, client=self.client)
+        return resp.json()
+
+    async def _fetch_after(self, symbol, interval, start_time):
+        """All candles opening at or after start_time, paging forward."""
+        rows = []
+        while True:
+            page = await self._fetch(
+                symbol, interval,
+                startTime=int(start_time), limit=MAX_KLINES_PER_CALL,
+            )
+            rows.extend(page)
+            if len(page) < MAX_KLINES_PER_CALL:
+                return rows
+            start_time = int(page[-1][6]) + 1
+
+    async def _fetch_before(self, symbol, interval, end_time, count):
+        """Up to `count` candles opening before end_time, paging backward."""
+        pages = []
+        while count > 0:
+            page = await self._fetch(
+                symbol, interval,
+                endTime=int(end_time), limit=min(count, MAX_KLINES_PER_CALL),
+            )
+            if not page:
+                break
+            pages.append(page)
+            count -= len(page)
+            end_time = int(page[0][0]) - 1
+        return [row for page in reversed(pages) for row in page]
+
+    async def get(self, symbol, interval, limit):
+        """
+        Return the latest `limit` candles as column arrays, syncing with Binance
+        only for what the store is missing.
+        """
+        if interval not in INTERVAL_MS:
+            raise ValueError(f"Unsupported interval '{interval}'")
+        limit = int(limit)
+        if limit <= 0:
+            raise ValueError("limit must be positive")
+        key = (symbol.upper(), interval)
+
+        async with self._lock(key):
+            now = _now_ms()
+            stored = await asyncio.to_thread(self.load, symbol, interval)
+            if stored is None:
+                stored = _empty_columns()
+            n_stored = len(stored["open_time"])
+            interval_ms = INTERVAL_MS[interval]
+
+            live = self._live.get(key)
+            live_fresh = (
+                live is not None
+                and n_stored
+                and n_stored + len(live["columns"]["open_time"]) >= limit
+                and now - live["fetched_at"] < LIVE_CANDLE_TTL * 1000
+                and live["columns"]["close_time"][-1] >= now
+                and live["columns"]["open_time"][0] == stored["close_time"][-1] + 1
+            )
+            if live_fresh:
+                return _tail(_concat(stored, live["columns"]), limit)
+
+            if n_stored:
+                last_close = int(stored["close_time"][-1])
+                gap = (now - last_close) // interval_ms
+                if gap > MAX_RANGE_CANDLES:
+                    # too far behind to backfill: serve the latest window and
+                    # leave the stored history as it is
+                    return await self._latest_window(symbol, interval, now, limit)
+                if gap > MAX_KLINES_PER_CALL:
+                    # several pages behind: fetch the missing span concurrently
+                    new_rows = await self._fetch_pages(symbol, interval, last_close + 1, now)
+                else:
+                    new_rows = await self._fetch_after(symbol, interval, last_close + 1)
+                missing = limit - n_stored - len(new_rows)
+                if missing > 0:
+                    older = await self._fetch_before(
+                        symbol, interval,
+                        int(stored["open_time"][0]) - 1, missing,
+                    )
+                    new_rows = older + new_rows
+            else:
+                new_rows = await self._fetch_before(symbol, interval, now, limit)
+
+            fetched = klines_to_columns(new_rows)
+            is_closed = fetched["close_time"] < now
+            closed = {name: col[is_closed] for name, col in fetched.items()}
+            still_open = {name: col[~is_closed] for name, col in fetched.items()}
+
+            if len(closed["open_time"]):
+                stored = _merge(stored, closed)
+                await asyncio.to_thread(self.save, symbol, interval, stored)
+                self._notify(symbol, interval, closed)
+
+            if len(still_open["open_time"]):
+                self._live[key] = {"fetched_at": now, "columns": still_open}
+                return _tail(_concat(stored, still_open), limit)
+
+            self._live.pop(key, None)
+            return _tail(stored, limit)
+
+    async def _latest_window(self, symbol, interval, now, limit):
+        """The latest `limit` candles straight from Binance, without touching the store."""
+        fetched = klines_to_columns(await self._fetch_before(symbol, interval, now, limit))
+        return _tail(fetched, limit)
+
+    async def _fetch_pages(self, symbol, interval, start_time, end_time):
+        """
+        Split [start_time, end_time] into MAX_KLINES_PER_CALL-candle pages, fetch
+        them concurrently (at most KLINE_FETCH_CONCURRENCY in flight, each with
+        retry/backoff) and stitch them back together in time order.
+        """
+        span = INTERVAL_MS[interval] * MAX_KLINES_PER_CALL
+        bounds = [
+            (page_start, min(page_start + span - 1, end_time))
+            for page_start in range(start_time, end_time + 1, span)
+        ]
+        semaphore = asyncio.Semaphore(KLINE_FETCH_CONCURRENCY)
+
+        async def fetch_page(page_start, page_end):
+            async with semaphore:
+                return await self._fetch(
+                    symbol, interval,
+                    startTime=page_start, endTime=page_end, limit=MAX_KLINES_PER_CALL,
+                )
+
+        pages = await asyncio.gather(*(fetch_page(a, b) for a, b in bounds))
+        return [row for page in pages for row in page]
+
+    async def get_range(self, symbol, interval, start_time, end_time=None):
+        """
+        Return every candle opening in [start_time, end_time] (ms timestamps).
+        Served from the store when it already covers the range; otherwise the
+        range is fetched page-concurrently, and closed candles that overlap or
+        adjoin the stored span are merged into it.
+        """
+        if interval not in INTERVAL_MS:
+            raise ValueError(f"Unsupported interval '{interval}'")
+        now = _now_ms()
+        start_time = int(start_time)
+        end_time = now if end_time is None else min(int(end_time), now)
+        if end_time < start_time:
+            raise ValueError("end_time must be after start_time")
+        interval_ms = INTERVAL_MS[interval]
+        if (end_time - start_time) // interval_ms > MAX_RANGE_CANDLES:
+            raise ValueError(f"Range too large: at most {MAX_RANGE_CANDLES} candles per request")
+        key = (symbol.upper(), interval)
+
+        async with self._lock(key):
+            stored = await asyncio.to_thread(self.load, symbol, interval)
+            if stored is not None and len(stored["open_time"]):
+                first_open = int(stored["open_time"][0])
+                last_close = int(stored["close_time"][-1])
+                if first_open <= start_time and end_time <= last_close:
+                    return _between(stored, start_time, end_time)
+
+            rows = await self._fetch_pages(symbol, interval, start_time, end_time)
+            fetched = _merge(_empty_columns(), klines_to_columns(rows))
+
+            closed_mask = fetched["close_time"] < now
+            if stored is not None and len(stored["open_time"]) and closed_mask.any():
+                closed = {name: col[closed_mask] for name, col in fetched.items()}
+                adjoins = (
+                    closed["open_time"][0] <= last_close + 1
+                    and closed["close_time"][-1] + 1 >= first_open
+                )
+                if adjoins:
+                    await asyncio.to_thread(self.save, symbol, interval, _merge(stored, closed))
+                    self._notify(symbol, interval, closed)
+
+            return _between(fetched, start_time, end_time)
+
+
+def _between(columns, start_time, end_time):
+    mask = (columns["open_time"] >= start_time) & (columns["open_time"] <= end_time)
+    return {name: col[mask] for name, col in columns.items()}
+
+
+def _tail(columns, limit):
+    if limit <= 0:
+        return _empty_columns()
+    return {name: col[-limit:] for name, col in columns.items()}
+
+
+candle_store = CandleStore()
@@ -0,0 +1,85 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "process" runs simulations in worker processes; "thread" keeps them in-process (debugging, tests)
+SIM_EXECUTOR = os.getenv("SIM_EXECUTOR", "process")
+SIM_WORKERS = int(os.getenv("SIM_WORKERS", str(os.cpu_count() or 1)))
+SIM_MP_START_METHOD = os.getenv("SIM_MP_START_METHOD", "spawn")
+# per-model limits, e.g. "hybrid_arima=2,tiny_mlp=2"; models not listed may use every worker
+SIM_MODEL_CONCURRENCY = os.getenv("SIM_MODEL_CONCURRENCY", "hybrid_arima=2,tiny_mlp=2")
+
+
+def _parse_limits(spec):
+    limits = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            limits[name.strip()] = max(1, int(value))
+    return limits
+
+
+MODEL_CONCURRENCY = _parse_limits(SIM_MODEL_CONCURRENCY)
+
+_executor = None
+_semaphores = {}
+
+
+def _create_executor():
+    if SIM_EXECUTOR == "thread":
+        return ThreadPoolExecutor(max_workers=SIM_WORKERS)
+    return ProcessPoolExecutor(
+        max_workers=SIM_WORKERS,
+        mp_context=multiprocessing.get_context(SIM_MP_START_METHOD),
+    )
+
+
+def start_executor():
+    global _executor
+    if _executor is None:
+        _executor = _create_executor()
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    _semaphores.clear()
+
+
+def get_executor():
+    """Executor for CPU-bound simulation work; created lazily outside the app lifespan."""
+    return start_executor()
+
+
+def _semaphore(model):
+    if model not in _semaphores:
+        _semaphores[model] = asyncio.Semaphore(MODEL_CONCURRENCY.get(model, SIM_WORKERS))
+    return _semaphores[model]
+
+
+async def run_in_executor(model, fn, *args, **kwargs):
+    """
+    Run fn(*args, **kwargs) on the simulation executor and await the result,
+    holding one of the model's concurrency slots while it runs.
+    """
+    global _executor
+    loop = asyncio.get_running_loop()
+    async with _semaphore(model):
+        try:
+            return await loop.run_in_executor(get_executor(), partial(fn, *args, **kwargs))
+        except BrokenProcessPool:
+            # a worker died (e.g. OOM on a huge run); replace the pool so later requests still work
+            broken, _executor = _executor, None
+            if broken is not None:
+                broken.shutdown(wait=False, cancel_futures=True)
+            raise
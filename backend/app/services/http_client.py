@@ -0,0 +1,98 @@
+import asyncio
+import os
+import random
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "4"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.25"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_client = None
+
+
+def _create_client():
+    return httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        timeout=HTTP_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        ),
+    )
+
+
+async def start_http_client():
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_http_client():
+    """
+    Application-lifetime pooled client (keep-alive, HTTP/2 when h2 is installed).
+    Opened by the FastAPI lifespan; created lazily if used outside of it.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+
+def _retry_delay(attempt, resp=None):
+    if resp is not None:
+        retry_after = resp.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+    # exponential backoff with jitter so concurrent pages don't retry in lockstep
+    return HTTP_BACKOFF * (2 ** attempt) * (0.5 + random.random())
+
+
+async def get_with_retry(url, params=None, retries=HTTP_RETRIES, client=None):
+    """
+    GET with retry/backoff on transport errors, 429 and 5xx responses.
+    Other error statuses raise httpx.HTTPStatusError straight away.
+    """
+    client = client or get_http_client()
+    attempt = 0
+    while True:
+        try:
+            resp = await client.get(url, params=params)
+        except httpx.TransportError:
+            if attempt >= retries:
+                raise
+            await asyncio.sleep(_retry_delay(attempt))
+            attempt += 1
+            continue
+
+        if resp.status_code in RETRY_STATUSES and attempt < retries:
+            await asyncio.sleep(_retry_delay(attempt, resp))
+            attempt += 1
+            continue
+
+        resp.raise_for_status()
+        return resp
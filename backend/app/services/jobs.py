@@ -0,0 +1,164 @@
+import asyncio
+import os
+import time
+import uuid
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# finished jobs (and their results) are kept this long before being dropped
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = {DONE, FAILED, CANCELLED}
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    """
+    One submitted unit of work. runner(job) is a coroutine function that
+    reports progress through job.progress_done and checks job.cancel_requested
+    between chunks; its return value becomes job.result.
+    """
+
+    def __init__(self, runner, total, meta=None):
+        self.id = uuid.uuid4().hex
+        self.runner = runner
+        self.meta = meta or {}
+        self.status = QUEUED
+        self.progress_total = total
+        self.progress_done = 0
+        self.result = None
+        self.error = None
+        self.cancel_requested = False
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": {
+                "done": self.progress_done,
+                "total": self.progress_total,
+                "fraction": self.progress_done / self.progress_total if self.progress_total else 0.0,
+            },
+            "error": self.error,
+            "cancel_requested": self.cancel_requested,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            **self.meta,
+        }
+
+
+class JobManager:
+    """Bounded queue of jobs drained by a fixed number of asyncio workers."""
+
+    def __init__(self, max_queue=JOB_QUEUE_SIZE, workers=JOB_WORKERS, result_ttl=JOB_RESULT_TTL):
+        self.max_queue = max_queue
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.jobs = {}
+        self._queue = None
+        self._tasks = []
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def submit(self, runner, total, meta=None):
+        if self._queue is None:
+            raise RuntimeError("Job manager is not running")
+        self._prune()
+        job = Job(runner, total, meta)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"Job queue is full ({self.max_queue} jobs waiting)")
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None or job.status in FINISHED:
+            return job
+        job.cancel_requested = True
+        if job.status == QUEUED:
+            self._finish(job, CANCELLED)
+        return job
+
+    def stats(self):
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "workers": self.workers,
+            "jobs": counts,
+        }
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.status in FINISHED and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status != QUEUED:
+                    continue
+                job.status = RUNNING
+                job.started_at = time.time()
+                try:
+                    result = await job.runner(job)
+                except asyncio.CancelledError:
+                    self._finish(job, CANCELLED)
+                    raise
+                except Exception as e:
+                    self._finish(job, FAILED, error=str(e))
+                    continue
+                if job.cancel_requested:
+                    self._finish(job, CANCELLED)
+                else:
+                    job.result = result
+                    self._finish(job, DONE)
+            finally:
+                self._queue.task_done()
+
+
+job_manager = JobManager()
@@ -0,0 +1,69 @@
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from app.models.kalman import KalmanState
+from app.services.candle_store import candle_store
+
+load_dotenv()
+
+# most (symbol, interval, process_var, meas_var) filters kept; the least recently used go first
+KALMAN_MAX_STATES = int(os.getenv("KALMAN_MAX_STATES", "256"))
+
+
+class KalmanStateRegistry:
+    """
+    Live Kalman filters per (symbol, interval, process_var, meas_var).
+    A filter is built once from the candle store's closed candles the first
+    time it is asked for, then advanced in O(1) per candle as the store
+    persists new closed candles, so simulations start from the current
+    filtered level and noise scale without re-filtering the history.
+    """
+
+    def __init__(self, store=candle_store, max_states=KALMAN_MAX_STATES):
+        self.store = store
+        self.max_states = max_states
+        self._states = {}
+        self._lock = threading.Lock()
+        store.add_listener(self.on_candles)
+
+    def get(self, symbol, interval, process_var, meas_var):
+        """The filter for this series, built from the store if needed; None when nothing is stored."""
+        key = (symbol.upper(), interval, float(process_var), float(meas_var))
+        with self._lock:
+            state = self._states.pop(key, None)
+            if state is None:
+                stored = self.store.load(symbol, interval)
+                if stored is None or not len(stored["close"]):
+                    return None
+                state = KalmanState(process_var, meas_var).update_many(stored["close"])
+                state.last_close_time = int(stored["close_time"][-1])
+            # re-insert to mark it most recently used
+            self._states[key] = state
+            while len(self._states) > self.max_states:
+                self._states.pop(next(iter(self._states)))
+            return state
+
+    def on_candles(self, symbol, interval, columns):
+        """Store listener: feed newly closed candles to every filter on this series."""
+        symbol = symbol.upper()
+        with self._lock:
+            for key in [k for k in self._states if k[:2] == (symbol, interval)]:
+                state = self._states[key]
+                new = columns["close_time"] > state.last_close_time
+                if not new.any():
+                    continue
+                if columns["open_time"][new][0] != state.last_close_time + 1:
+                    # a gap (e.g. the store restarted from a fresh window): rebuild on next use
+                    del self._states[key]
+                    continue
+                state.update_many(columns["close"][new])
+                state.last_close_time = int(columns["close_time"][new][-1])
+
+    def stats(self):
+        with self._lock:
+            return {"states": len(self._states), "max_states": self.max_states}
+
+
+kalman_states = KalmanStateRegistry()
@@ -1,29 +1,236 @@
-from app.models import gbm, ou, garch, jump_diffusion,heston,hybrid_arima, kalman, tiny_mlp, hmm
-def run_simulation(model_name: str, params: dict):
-    if model_name == "gbm":
-        return gbm.simulate_gbm(
-            S0=params["S0"],
-            mu=params["mu"],
-            sigma=params["sigma"],
-            T=params["T"],
-            N=params["N"],
-            paths=params["paths"]
+import importlib
+import numpy as np
+from app.utils.signals import generate_signals_from_paths, model_agreement_score
+from app.utils.streaming_stats import STREAM_RELATIVE_ACCURACY, StreamingPathStats
+from app.utils.random_streams import as_generator, block_generator, path_blocks
+from app.utils.variance_reduction import independent_bounds
+
+
+def load_model(module_info, name="func"):
+    """Resolve a MODELS registry entry to its simulate (or fit) function."""
+    module = importlib.import_module(module_info["module"])
+    return getattr(module, module_info[name])
+
+
+def price_stats(prices):
+    """last_price and the log-return mean and std: the scalar model inputs."""
+    log_returns = np.log(prices[1:] / prices[:-1])
+    return {
+        "last_price": prices[-1],
+        "mu": np.mean(log_returns),
+        "sigma": np.std(log_returns),
+    }
+
+
+def model_inputs(prices, stats=None):
+    """
+    Series-level inputs shared by every model, computed once per request.
+    stats: price_stats(prices) computed by the caller, e.g. once for every model of an ensemble.
+    """
+    return {"historical": list(prices), **(price_stats(prices) if stats is None else stats)}
+
+
+def compute_signals(simulated_paths, S0, steps, horizon_days, include_ratios=True, control=None, cuts=None):
+    return generate_signals_from_paths(
+        simulated_paths,
+        S0=float(S0),
+        steps=steps,
+        horizon_days=horizon_days,
+        include_ratios=include_ratios,
+        control=control,
+        cuts=cuts
+    )
+
+
+def path_cuts(params, num_paths, seed=None, path_offset=0):
+    """
+    Indices where the paths of one _simulate_paths call split into independent
+    groups, for the batch-means standard errors: one simulate call for unseeded
+    runs, one per random-stream block (cut to the rows kept) for seeded ones.
+    """
+    method = (params or {}).get("variance_reduction", "none")
+    if seed is None:
+        return independent_bounds(method, num_paths)
+    cuts, start = [], 0
+    for _, size, lo, hi in path_blocks(path_offset, num_paths):
+        block_bounds = independent_bounds(method, size)
+        inner = block_bounds[(block_bounds > lo) & (block_bounds < hi)]
+        cuts += [start, *(inner - lo + start)]
+        start += hi - lo
+    return np.array(cuts + [num_paths])
+
+
+def _calibrate(module_info, prices, fit_params, calibration):
+    """(calibration, fitted): fits only when the model needs it and none was given."""
+    if "fit" not in module_info or calibration is not None:
+        return calibration, None
+    fit_func = load_model(module_info, "fit")
+    fitted = fit_func(prices, **(fit_params or {}))
+    return fitted, fitted
+
+
+def _simulate_paths(module_info, inputs, horizon_days, steps, num_paths, params, calibration,
+                    seed=None, path_offset=0):
+    """
+    Paths [path_offset, path_offset + num_paths) of one simulation.
+    Unseeded runs draw from a fresh Generator. Seeded runs simulate every
+    random-stream block the range touches, each from its own substream of the
+    seed, and keep the rows in range, so a path's values never depend on how the
+    run was chunked. Blocks grow from 8 to 1024 paths (see random_streams), so
+    a run from path 0 simulates at most about twice the paths it returns.
+    Returns (paths, control): control is the model's control variate
+    (control_variate=True) with its terminal values cut to the same rows, else None.
+    """
+    params = dict(params or {})
+    if "fit" in module_info:
+        params["calibration"] = calibration
+    simulate_func = load_model(module_info)
+
+    def simulate(n, rng, lo=0, hi=None):
+        result = simulate_func(
+            **{name: inputs[name] for name in module_info["inputs"]},
+            horizon_days=horizon_days,
+            steps=steps,
+            num_paths=n,
+            rng=rng,
+            **params
         )
-    elif model_name == "ou":
-        return ou.simulate_ou(**params)
-    elif model_name == "garch":
-        return garch.simulate_garch(**params)
-    elif model_name == "jump_diffusion":
-        return jump_diffusion.simulate_jump_diffusion(**params)
-    elif model_name == "heston":
-        return heston.simulate_heston(**params)
-    elif model_name == "hybrid_arima":
-        return hybrid_arima.simulate_hybrid_arima(**params)
-    elif model_name == "kalman":
-        return kalman.simulate_kalman(**params)
-    elif model_name == "tiny_mlp":
-        return tiny_mlp.simulate_tiny_mlp(**params)
-    elif model_name == "hmm":
-        return hmm.simulate_hmm(**params)
-    else:
-        raise ValueError(f"Model '{model_name}' not implemented")
+        if not isinstance(result, dict):
+            return np.asarray(result, dtype=float)[lo:hi], None
+        control = result.get("control")
+        if control is not None:
+            control = {**control, "terminal": control["terminal"][lo:hi]}
+        return np.asarray(result["paths"], dtype=float)[lo:hi], control
+
+    if seed is None:
+        return simulate(num_paths, as_generator())
+    blocks = [
+        simulate(size, block_generator(seed, block), lo, hi)
+        for block, size, lo, hi in path_blocks(path_offset, num_paths)
+    ]
+    if len(blocks) == 1:
+        return blocks[0]
+    paths = np.concatenate([b[0] for b in blocks], axis=0)
+    control = blocks[0][1]
+    if control is not None:
+        control = {**control, "terminal": np.concatenate([b[1]["terminal"] for b in blocks])}
+    return paths, control
+
+
+def run_simulation(module_info, prices, horizon_days, steps, num_paths,
+                   params=None, fit_params=None, calibration=None, with_signals=True,
+                   summary=False, seed=None, path_offset=0, include_ratios=None, stats=None):
+    """
+    Calibrate (if the model needs it and no calibration is given) and simulate one model.
+    Runs inside executor worker processes, so every argument and result is picklable.
+    Returns (paths, signals, fitted) where fitted is the calibration computed here, or None.
+    signals is None when with_signals is False (e.g. for one chunk of a larger job).
+    With summary=True the paths never leave the worker: paths is None and the
+    signals omit per-path data.
+    seed / path_offset: this call covers paths path_offset.. of a seeded run;
+    the same seed gives the same paths however the run is split into calls.
+    include_ratios defaults to not summary; stats are precomputed price_stats.
+    """
+    prices = np.asarray(prices, dtype=float)
+    calibration, fitted = _calibrate(module_info, prices, fit_params, calibration)
+    inputs = model_inputs(prices, stats)
+    simulated_paths, control = _simulate_paths(
+        module_info, inputs, horizon_days, steps, num_paths, params, calibration,
+        seed=seed, path_offset=path_offset
+    )
+
+    signals = None
+    if with_signals or summary:
+        signals = compute_signals(
+            simulated_paths, inputs["last_price"], steps, horizon_days,
+            include_ratios=not summary if include_ratios is None else include_ratios, control=control,
+            cuts=path_cuts(params, num_paths, seed, path_offset),
+        )
+    if summary:
+        simulated_paths = None
+    return simulated_paths, signals, fitted
+
+
+def _with_start(paths, S0, steps):
+    """Models that return only the simulated steps get S0 as their first column."""
+    paths = np.asarray(paths, dtype=float)
+    if paths.shape[1] == steps:
+        paths = np.hstack([np.full((paths.shape[0], 1), float(S0)), paths])
+    return paths
+
+
+def ensemble_signals(model_paths, S0, steps, horizon_days):
+    """
+    Pool several models' paths (every model contributes num_paths, so each has
+    equal weight) into one set of signals, whose percentiles_stepwise is the
+    merged fan chart, and score how far the models agree on direction.
+    model_paths: dict model name -> (num_paths, steps or steps + 1) array.
+    Returns {"signals", "agreement"}.
+    """
+    aligned = {model: _with_start(paths, S0, steps) for model, paths in model_paths.items()}
+    pooled = np.concatenate(list(aligned.values()), axis=0)
+    return {
+        # different models' paths are not replicates of one estimator, so no batch-means SE
+        "signals": compute_signals(pooled, S0, steps, horizon_days, include_ratios=False,
+                                   cuts=[0, len(pooled)]),
+        "agreement": model_agreement_score(aligned),
+    }
+
+
+def run_streaming_simulation(module_info, prices, horizon_days, steps, num_paths, chunk_paths,
+                             params=None, fit_params=None, calibration=None,
+                             relative_accuracy=STREAM_RELATIVE_ACCURACY, seed=None, path_offset=0):
+    """
+    Simulate num_paths in blocks of chunk_paths, folding each block into a
+    StreamingPathStats and dropping it, so memory is bounded by one block
+    whatever num_paths is. Returns (stats, fitted); stats from several calls
+    merge with stats.merge().
+    """
+    prices = np.asarray(prices, dtype=float)
+    calibration, fitted = _calibrate(module_info, prices, fit_params, calibration)
+    inputs = model_inputs(prices)
+    stats = StreamingPathStats(inputs["last_price"], steps + 1, relative_accuracy=relative_accuracy)
+
+    done = 0
+    while done < num_paths:
+        n = min(chunk_paths, num_paths - done)
+        paths, _ = _simulate_paths(
+            module_info, inputs, horizon_days, steps, n, params, calibration,
+            seed=seed, path_offset=path_offset + done
+        )
+        stats.add(paths)
+        done += n
+    return stats, fitted
+
+
+def run_portfolio_simulation(symbols, prices, horizon_days, steps, num_paths,
+                             weights=None, params=None, seed=None,
+                             percentiles=(5, 25, 50, 75, 95)):
+    """
+    Simulate a basket with app.models.multi_asset and reduce it in the worker:
+    signals (fan chart, probabilities, CVaR) of the portfolio value and a
+    terminal-price summary per asset. No per-asset path leaves the worker.
+    """
+    from app.models.multi_asset import simulate_multi_asset
+
+    params = dict(params or {})
+    initial_value = float(params.get("initial_value", 1.0))
+    result = simulate_multi_asset(
+        prices, weights=weights, horizon_days=horizon_days, steps=steps,
+        num_paths=num_paths, rng=seed, **params
+    )
+    signals = compute_signals(result["paths"], initial_value, steps, horizon_days, include_ratios=False)
+    terminal = result["terminal"]
+    quantiles = np.percentile(terminal, percentiles, axis=0)
+    assets = {
+        symbol: {
+            "last_price": float(prices[-1, i]),
+            "weight": float(result["weights"][i]),
+            "mu": float(result["mu"][i]),
+            "sigma": float(result["sigma"][i]),
+            "mean_final": float(terminal[:, i].mean()),
+            "percentiles_final": {p: float(quantiles[j, i]) for j, p in enumerate(percentiles)},
+        }
+        for i, symbol in enumerate(symbols)
+    }
+    return {"signals": signals, "assets": assets, "covariance": result["covariance"]}
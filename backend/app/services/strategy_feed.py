@@ -0,0 +1,88 @@
+import itertools
+import threading
+
+from app.services.candle_store import candle_store
+
+
+class StrategyFeed:
+    """
+    Streaming strategies driven by the candle store's live feed.
+    subscribe() warms a strategy on the stored closed candles of (symbol, interval);
+    after that every closed candle the store persists is fed to it in O(1), and
+    on_signal(symbol, interval, close_time, signal) runs for each new bar.
+    """
+
+    def __init__(self, store=candle_store):
+        self.store = store
+        self._subscriptions = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        store.add_listener(self.on_candles)
+
+    def subscribe(self, symbol, interval, strategy, on_signal=None):
+        """Start feeding `strategy` (a StreamingStrategy); returns an id for latest() and unsubscribe()."""
+        sub = {
+            "symbol": symbol.upper(),
+            "interval": interval,
+            "strategy": strategy,
+            "on_signal": on_signal,
+            "last_close_time": None,
+            "signal": 0,
+        }
+        with self._lock:
+            self._replay(sub)
+            sub_id = next(self._ids)
+            self._subscriptions[sub_id] = sub
+        return sub_id
+
+    def unsubscribe(self, sub_id):
+        with self._lock:
+            self._subscriptions.pop(sub_id, None)
+
+    def latest(self, sub_id):
+        """(close_time, signal) of the last bar fed to the subscription; close_time is None before any bar."""
+        with self._lock:
+            sub = self._subscriptions[sub_id]
+            return sub["last_close_time"], sub["signal"]
+
+    def _replay(self, sub):
+        # rebuild the strategy from every stored closed candle of its series
+        sub["strategy"].reset()
+        sub["last_close_time"], sub["signal"] = None, 0
+        stored = self.store.load(sub["symbol"], sub["interval"])
+        if stored is None or not len(stored["close"]):
+            return
+        for close in stored["close"]:
+            sub["signal"] = sub["strategy"].update(close)
+        sub["last_close_time"] = int(stored["close_time"][-1])
+
+    def on_candles(self, symbol, interval, columns):
+        """Store listener: feed newly closed candles to every subscription on this series."""
+        symbol = symbol.upper()
+        events = []
+        with self._lock:
+            for sub in self._subscriptions.values():
+                if (sub["symbol"], sub["interval"]) != (symbol, interval):
+                    continue
+                last = sub["last_close_time"]
+                new = columns["close_time"] > last if last is not None else slice(None)
+                close_times = columns["close_time"][new]
+                if not len(close_times):
+                    continue
+                if last is not None and columns["open_time"][new][0] != last + 1:
+                    # a gap: the strategy's state no longer matches the series, rebuild it
+                    self._replay(sub)
+                    events.append((sub["on_signal"], sub["last_close_time"], sub["signal"]))
+                    continue
+                for close, close_time in zip(columns["close"][new], close_times):
+                    sub["signal"] = sub["strategy"].update(close)
+                    sub["last_close_time"] = int(close_time)
+                    events.append((sub["on_signal"], sub["last_close_time"], sub["signal"]))
+
+        # callbacks run outside the lock so they may subscribe or unsubscribe
+        for on_signal, close_time, signal in events:
+            if on_signal is not None:
+                on_signal(symbol, interval, close_time, signal)
+
+
+strategy_feed = StrategyFeed()
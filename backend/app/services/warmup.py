@@ -0,0 +1,151 @@
+import asyncio
+import os
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.services.executor import SIM_EXECUTOR, SIM_WORKERS, get_executor
+
+load_dotenv()
+
+# compile (or load from numba's on-disk cache) every kernel at startup; /health
+# reports not ready until this finishes. Set SIM_WARMUP=0 to skip it.
+SIM_WARMUP = os.getenv("SIM_WARMUP", "1") == "1"
+
+# just enough data for every model's minimum history
+WARMUP_PRICES = 120
+WARMUP_PATHS = 4
+WARMUP_STEPS = 5
+
+_state = {"state": "pending", "compile_seconds": None, "kernels": {}, "workers": [], "errors": {}}
+_task = None
+
+
+def _warmup_prices():
+    rng = np.random.default_rng(0)
+    return 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.02, WARMUP_PRICES)))
+
+
+def _warm_heston(prices):
+    from app.models.heston import simulate_heston
+    for scheme in ("euler", "qe"):
+        for variance_reduction in ("none", "antithetic"):
+            simulate_heston(prices[-1], 0.0, 0.5, steps=WARMUP_STEPS, num_paths=WARMUP_PATHS,
+                            scheme=scheme, variance_reduction=variance_reduction, rng=0)
+
+
+def _warm_garch(prices):
+    from app.models.garch import simulate_garch
+    calibration = {"vol": "garch", "omega": 1e-6, "alpha": 0.05, "gamma": 0.0, "beta": 0.9,
+                   "nu": None, "last_sigma2": 4e-4}
+    simulate_garch(prices, steps=WARMUP_STEPS, num_paths=WARMUP_PATHS, calibration=calibration, rng=0)
+
+
+def _warm_jump_diffusion(prices):
+    from app.models.jump_diffusion import simulate_jump_diffusion
+    simulate_jump_diffusion(last_price=prices[-1], mu=0.0, sigma=0.5, steps=WARMUP_STEPS,
+                            num_paths=WARMUP_PATHS, jump_lambda=5.0, rng=0)
+
+
+def _warm_hmm(prices):
+    from app.models.hmm import fit_hmm, simulate_hmm
+    calibration = fit_hmm(prices, n_states=2, em_iterations=2, n_restarts=2)
+    simulate_hmm(prices, steps=WARMUP_STEPS, num_paths=WARMUP_PATHS, calibration=calibration, rng=0)
+
+
+def _warm_tiny_mlp(prices):
+    from app.models.tiny_mlp import fit_tiny_mlp, simulate_tiny_mlp
+    calibration = fit_tiny_mlp(prices, window=10, hidden_dim=4, epochs=2)
+    simulate_tiny_mlp(prices, steps=WARMUP_STEPS, num_paths=WARMUP_PATHS, calibration=calibration, rng=0)
+
+
+def _warm_kalman(prices):
+    from app.models.kalman import simulate_kalman
+    simulate_kalman(prices, steps=WARMUP_STEPS, num_paths=WARMUP_PATHS, rng=0)
+
+
+def _warm_backtest(prices):
+    from app.backtest.backtestEngine import backtest_batch
+    from app.backtest.macdStrategy import macd_signals
+    backtest_batch([{"close": float(p)} for p in prices], macd_signals, 100.0)
+
+
+KERNEL_WARMUPS = {
+    "heston": _warm_heston,
+    "garch": _warm_garch,
+    "jump_diffusion": _warm_jump_diffusion,
+    "hmm": _warm_hmm,
+    "tiny_mlp": _warm_tiny_mlp,
+    "kalman": _warm_kalman,
+    "backtest": _warm_backtest,
+}
+
+
+def warm_up_kernels():
+    """
+    Run every numba kernel once on tiny inputs, in this process.
+    Returns {"seconds": {name: seconds}, "errors": {name: message}}; a failing
+    warm-up is reported, not raised, since the kernel still compiles on first use.
+    """
+    prices = _warmup_prices()
+    seconds, errors = {}, {}
+    for name, warm in KERNEL_WARMUPS.items():
+        start = time.perf_counter()
+        try:
+            warm(prices)
+        except Exception as e:
+            errors[name] = str(e)
+        seconds[name] = round(time.perf_counter() - start, 3)
+    return {"seconds": seconds, "errors": errors}
+
+
+async def _run_warmup():
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    _state["state"] = "running"
+    try:
+        # the API process first: backtests run here, and it fills the on-disk
+        # cache so the simulation workers only load compiled code
+        local = await asyncio.to_thread(warm_up_kernels)
+        _state["kernels"] = local["seconds"]
+        _state["errors"] = local["errors"]
+        if SIM_EXECUTOR == "process":
+            # one call per worker slot: each keeps a worker busy long enough
+            # for the pool to start the next one
+            executor = get_executor()
+            workers = await asyncio.gather(
+                *(loop.run_in_executor(executor, warm_up_kernels) for _ in range(SIM_WORKERS))
+            )
+            _state["workers"] = [round(sum(w["seconds"].values()), 3) for w in workers]
+        _state["state"] = "done"
+    except Exception as e:
+        _state["errors"]["warmup"] = str(e)
+        _state["state"] = "failed"
+    _state["compile_seconds"] = round(time.perf_counter() - start, 3)
+
+
+async def start_warmup():
+    """Start the warm-up in the background, so the server accepts /health while it runs."""
+    global _task
+    if not SIM_WARMUP:
+        _state["state"] = "disabled"
+        return
+    if _task is None:
+        _task = asyncio.create_task(_run_warmup())
+
+
+async def stop_warmup():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+def warmup_status():
+    """Readiness for /health: ready once the warm-up has finished (or failed, or is disabled)."""
+    return {"ready": _state["state"] in ("done", "failed", "disabled"), "warmup": dict(_state)}
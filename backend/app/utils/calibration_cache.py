@@ -0,0 +1,109 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CALIBRATION_CACHE_MAX_BYTES = int(os.getenv("CALIBRATION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+def _estimate_size(value):
+    """Approximate memory footprint of a calibration result."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_estimate_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_estimate_size(v) for v in value)
+    if isinstance(value, (int, float, bool, str, type(None))):
+        return 64
+    # fitted statsmodels / sklearn objects: pickled size is a reasonable proxy
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 1024 * 1024
+
+
+def make_calibration_key(model, history, params=None):
+    """
+    Cache key: model name, a hash of the history array and the sorted
+    hyperparameters the fit depends on.
+    """
+    history = np.ascontiguousarray(history, dtype=np.float64)
+    digest = hashlib.blake2b(history.tobytes(), digest_size=16).hexdigest()
+    params = tuple(sorted((params or {}).items()))
+    return (model, history.shape[0], digest, repr(params))
+
+
+class CalibrationCache:
+    """
+    Memory-bounded LRU cache of fitted model parameters.
+    Values are shared between requests and must be treated as read-only.
+    """
+
+    def __init__(self, max_bytes=CALIBRATION_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def get_or_fit(self, key, fit):
+        value = self.get(key)
+        if value is None:
+            value = fit()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+calibration_cache = CalibrationCache()
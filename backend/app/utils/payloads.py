@@ -0,0 +1,105 @@
+import io
+import json
+
+import numpy as np
+
+JSON = "application/json"
+OCTET_STREAM = "application/octet-stream"
+NPY = "application/x-npy"
+ARROW = "application/vnd.apache.arrow.stream"
+
+# media types we can serve, in server preference order for wildcard Accepts
+PATH_FORMATS = [JSON, OCTET_STREAM, NPY, ARROW]
+PATH_DTYPES = {"float64": np.float64, "float32": np.float32}
+
+
+class PayloadFormatError(ValueError):
+    pass
+
+
+def negotiate_path_format(accept):
+    """
+    Pick the response media type for simulated paths from an Accept header.
+    JSON is the default; q-values are honoured, and ties keep the client's order.
+    """
+    if not accept:
+        return JSON
+
+    offers = []
+    for pos, part in enumerate(accept.split(",")):
+        fields = [f.strip() for f in part.split(";")]
+        media = fields[0].lower()
+        q = 1.0
+        for field in fields[1:]:
+            if field.startswith("q="):
+                try:
+                    q = float(field[2:])
+                except ValueError:
+                    q = 0.0
+        if media and q > 0:
+            offers.append((-q, pos, media))
+
+    for _, _, media in sorted(offers):
+        if media in ("*/*", "application/*"):
+            return JSON
+        if media in PATH_FORMATS:
+            return media
+    raise PayloadFormatError(f"None of the requested media types are supported: {', '.join(PATH_FORMATS)}")
+
+
+def path_dtype(name):
+    if name is None:
+        return np.float64
+    if name not in PATH_DTYPES:
+        raise PayloadFormatError(f"dtype must be one of {list(PATH_DTYPES)}")
+    return PATH_DTYPES[name]
+
+
+def encode_paths(paths, media_type, dtype=np.float64, metadata=None):
+    """
+    Encode a (num_paths, path_len) array without going through Python lists.
+    Returns (body bytes, headers). Shape and dtype always travel as headers;
+    Arrow payloads also carry `metadata` (e.g. signals) in the schema metadata.
+
+    - application/octet-stream: raw little-endian C-order values
+    - application/x-npy: a .npy file (np.load-able)
+    - application/vnd.apache.arrow.stream: Arrow IPC stream, one row per path,
+      the path stored as a fixed-size list column "path"
+    """
+    arr = np.ascontiguousarray(paths, dtype=np.dtype(dtype).newbyteorder("<"))
+    if arr.ndim == 1:
+        arr = arr.reshape(1, -1)
+
+    headers = {
+        "X-Paths-Shape": ",".join(str(d) for d in arr.shape),
+        "X-Paths-Dtype": arr.dtype.name,
+    }
+
+    if media_type == OCTET_STREAM:
+        return arr.tobytes(), headers
+
+    if media_type == NPY:
+        buf = io.BytesIO()
+        np.lib.format.write_array(buf, arr, allow_pickle=False)
+        return buf.getvalue(), headers
+
+    if media_type == ARROW:
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise PayloadFormatError("Arrow output requires pyarrow to be installed")
+
+        n_paths, path_len = arr.shape
+        values = pa.array(arr.reshape(-1))
+        column = pa.FixedSizeListArray.from_arrays(values, path_len)
+        schema = pa.schema(
+            [pa.field("path", column.type)],
+            metadata={k: json.dumps(v) for k, v in (metadata or {}).items()},
+        )
+        batch = pa.record_batch([column], schema=schema)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, schema) as writer:
+            writer.write_batch(batch)
+        return sink.getvalue().to_pybytes(), headers
+
+    raise PayloadFormatError(f"Unsupported media type '{media_type}'")
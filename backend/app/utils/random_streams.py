@@ -0,0 +1,73 @@
+import numpy as np
+
+# Paths per independent substream of a seeded simulation. Blocks start at
+# RNG_FIRST_BLOCK_PATHS and double up to RNG_BLOCK_PATHS (8, 8, 16, ..., 512,
+# then 1024 each), so a small seeded run only simulates about twice its paths.
+# Seeded results depend on both, so changing them changes every reproduced run.
+# Both must be powers of two.
+RNG_BLOCK_PATHS = 1024
+RNG_FIRST_BLOCK_PATHS = 8
+
+# blocks 1..RNG_RAMP_BLOCKS double in size; later ones are all RNG_BLOCK_PATHS
+RNG_RAMP_BLOCKS = RNG_BLOCK_PATHS.bit_length() - RNG_FIRST_BLOCK_PATHS.bit_length()
+
+
+def as_generator(rng=None):
+    """A numpy Generator from rng: a Generator (returned as is), a seed or None (fresh entropy)."""
+    if isinstance(rng, np.random.Generator):
+        return rng
+    return np.random.default_rng(rng)
+
+
+def block_generator(seed, block):
+    """
+    Generator for block `block` of a seeded simulation: the stream
+    SeedSequence(seed).spawn() would hand out as child number `block`,
+    built directly so any worker can create it without the others.
+    """
+    return np.random.Generator(np.random.PCG64(np.random.SeedSequence(seed, spawn_key=(block,))))
+
+
+def _block_of(path):
+    """Index of the block holding path number `path`."""
+    if path >= RNG_BLOCK_PATHS:
+        return RNG_RAMP_BLOCKS + path // RNG_BLOCK_PATHS
+    return max(int(path).bit_length() - RNG_FIRST_BLOCK_PATHS.bit_length() + 1, 0)
+
+
+def block_span(block):
+    """(start, stop) path numbers of block `block`."""
+    if block == 0:
+        return 0, RNG_FIRST_BLOCK_PATHS
+    if block <= RNG_RAMP_BLOCKS:
+        return RNG_FIRST_BLOCK_PATHS << (block - 1), RNG_FIRST_BLOCK_PATHS << block
+    start = (block - RNG_RAMP_BLOCKS) * RNG_BLOCK_PATHS
+    return start, start + RNG_BLOCK_PATHS
+
+
+def path_blocks(offset, num_paths):
+    """
+    (block, size, lo, hi) for every block overlapping paths [offset, offset + num_paths):
+    rows lo:hi of that block's `size` paths belong to the range.
+    """
+    end = offset + num_paths
+    for block in range(_block_of(offset), _block_of(end - 1) + 1):
+        start, stop = block_span(block)
+        yield block, stop - start, max(offset - start, 0), min(end, stop) - start
+
+
+def align_to_blocks(num_paths):
+    """
+    Round a chunk size up to a multiple of RNG_BLOCK_PATHS, so seeded chunks
+    never simulate a block twice (every such multiple is a block boundary).
+    """
+    return -(-num_paths // RNG_BLOCK_PATHS) * RNG_BLOCK_PATHS
+
+
+def path_seeds(rng, num_paths):
+    """
+    One 32-bit seed per path for numba kernels: prange bodies reseed numba's
+    per-thread generator with np.random.seed(seeds[p]) at the start of each path,
+    so a path's draws don't depend on which thread runs it.
+    """
+    return as_generator(rng).integers(0, 2 ** 32, size=num_paths, dtype=np.uint32)
@@ -2,6 +2,8 @@ import numpy as np
 import math 
 from typing import List,Tuple,Any, Union, Dict 
 from collections import Counter 
+from scipy.special import ndtr
+from app.utils.variance_reduction import SE_BATCHES, batch_bounds
 
 
 ArrayLike = Union[List[float],np.ndarray]
@@ -97,10 +99,11 @@ def time_to_target_distribution(paths: Paths, target: float, direction: str = "a
         "counts": counts
     }
 
-def scenario_bucket_for_price_ratio(paths: Paths, S0: float, bull_thresh: float = 1.2, bear_thresh: float = 0.9) -> Dict[str, Any]:
+def scenario_bucket_for_price_ratio(paths: Paths, S0: float, bull_thresh: float = 1.2, bear_thresh: float = 0.9, include_ratios: bool = True) -> Dict[str, Any]:
     """
     Bucket simulation outcomes at final step by ratio ST/S0 into Bull/Flat/Bear.
     Returns proportions and the bucket assigned by majority.
+    include_ratios=False drops the per-path ratios list (summary responses).
     """
     arr = _to_numpy(paths)
     ST = arr[:, -1]
@@ -113,7 +116,10 @@ def scenario_bucket_for_price_ratio(paths: Paths, S0: float, bull_thresh: float
         majority = "bull"
     elif bear > max(bull, flat):
         majority = "bear"
-    return {"bull": float(bull), "flat": float(flat), "bear": float(bear), "majority": majority, "ratios": ratios.tolist()}
+    bucket = {"bull": float(bull), "flat": float(flat), "bear": float(bear), "majority": majority}
+    if include_ratios:
+        bucket["ratios"] = ratios.tolist()
+    return bucket
 
 DEFAULT_ACTION_MAP = {
     "bull": "increase_exposure",
@@ -181,44 +187,187 @@ def compute_step_percentiles(paths, percentiles=[5, 25, 50, 75, 95]):
         }
 
     return stepwise
-def generate_signals_from_paths(
-        paths: Paths,
+def _sorted_percentiles(sorted_rows: np.ndarray, percentiles: List[int]) -> np.ndarray:
+    """
+    np.percentile(rows, percentiles, axis=1) for rows that are already sorted
+    ascending: same virtual index and interpolation, no partitioning.
+    """
+    n = sorted_rows.shape[1]
+    out = np.empty((len(percentiles), sorted_rows.shape[0]))
+    for i, p in enumerate(percentiles):
+        virtual = p / 100 * (n - 1)
+        lo = int(np.floor(virtual))
+        hi = min(lo + 1, n - 1)
+        t = virtual - lo
+        a = sorted_rows[:, lo]
+        b = sorted_rows[:, hi]
+        diff = b - a
+        # numpy's _lerp: interpolate from the nearer end for stability
+        out[i] = b - diff * (1 - t) if t >= 0.5 else a + diff * t
+    return out
+
+DEFAULT_PROB_THRESHOLDS = {
+    "add": (1.08, 0.45),
+    "reduce": (0.968, 0.35)
+}
+
+def _tail_mean(losses: np.ndarray, alpha: float = 0.95) -> float:
+    k = max(1, int((1 - alpha) * len(losses)))
+    return float(np.mean(np.partition(losses, len(losses) - k)[len(losses) - k:]))
+
+def estimator_standard_errors(
+        final: np.ndarray,
+        loss_ref: float,
+        percentiles: List[int],
+        targets: Dict[str, float],
+        batches: int = SE_BATCHES,
+        cuts: np.ndarray = None
+    ) -> Dict[str, Any]:
+    """
+    Batch-means standard errors of the final-step estimators: the paths are
+    split into contiguous batches, each statistic is recomputed per batch and
+    SE = std(batch values) / sqrt(batches). That needs independent batches, so
+    batches only end at `cuts`, the indices where the paths split into
+    independent groups (see independent_bounds; None when every path is
+    independent): antithetic pairs and Sobol scrambles are never split, and a
+    moment-matched call is one group. None when fewer than 2 batches fit.
+    """
+    n = len(final)
+    batches = min(batches, n // 2)
+    if batches < 2:
+        return None
+    bounds = batch_bounds(n, batches)
+    if cuts is not None:
+        # move every boundary to the nearest allowed cut
+        cuts = np.asarray(cuts)
+        bounds = np.asarray(bounds)
+        pos = np.clip(np.searchsorted(cuts, bounds), 1, len(cuts) - 1)
+        lower, upper = cuts[pos - 1], cuts[pos]
+        bounds = [int(b) for b in np.unique(np.where(bounds - lower <= upper - bounds, lower, upper))]
+        if len(bounds) < 3:
+            return None
+        batches = len(bounds) - 1
+    parts = [final[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+    def se(values):
+        return float(np.std(values, ddof=1) / np.sqrt(len(values)))
+
+    batch_percentiles = np.array([np.percentile(part, percentiles) for part in parts])
+    return {
+        "method": "batch_means",
+        "batches": batches,
+        "mean_final": se([part.mean() for part in parts]),
+        "percentiles_final": {
+            p: se(batch_percentiles[:, i]) for i, p in enumerate(percentiles)
+        },
+        "prob_checks": {
+            label: se([
+                ((part < target) if label == "reduce" else (part > target)).mean()
+                for part in parts
+            ])
+            for label, target in targets.items()
+        },
+        "tail_risk_cvar95": se([_tail_mean(np.maximum(loss_ref - part, 0)) for part in parts]),
+    }
+
+def control_variate_estimate(y: np.ndarray, x: np.ndarray, x_mean: float) -> Dict[str, float]:
+    """
+    mean(y) - b * (mean(x) - E[x]) with the regression-optimal b, and its
+    standard error next to the plain one.
+    """
+    n = len(y)
+    xc = x - x.mean()
+    var_x = float(xc @ xc)
+    b = float((y - y.mean()) @ xc / var_x) if var_x > 0 else 0.0
+    plain_se = float(np.std(y, ddof=1) / np.sqrt(n))
+    cv_se = float(np.std(y - b * x, ddof=1) / np.sqrt(n))
+    corr = 0.0
+    if var_x > 0 and np.std(y) > 0:
+        corr = float(np.corrcoef(y, x)[0, 1])
+    return {
+        "estimate": float(y.mean() - b * (x.mean() - x_mean)),
+        "standard_error": cv_se,
+        "plain_standard_error": plain_se,
+        "correlation": corr,
+    }
+
+def path_analytics(
+        arr: np.ndarray,
         S0: float = None,
-        steps: int = None,
-        horizon_days: int = None,
         percentiles: List[int] = [5, 25, 50, 75, 95],
-        prob_thresholds: Dict[str, Tuple[float, float]] = None
+        prob_thresholds: Dict[str, Tuple[float, float]] = None,
+        include_ratios: bool = True,
+        control: Dict[str, Any] = None,
+        cuts: np.ndarray = None
     ) -> Dict[str, Any]:
+    """
+    Single-pass analytics over one (num_paths, path_len) array.
+    Also reports batch-means standard errors of the final-step estimators
+    (cuts: where the paths split into independent groups, see estimator_standard_errors).
+    control: optional GBM control variate from the model ({"terminal",
+    "log_mean", "log_std"}, see gbm_control); the final mean and the
+    probability checks are then control-variate adjusted.
+    Same output as the individual helpers (compute_step_percentiles, prob_exceed,
+    prob_below, cvar, scenario_bucket_for_price_ratio, signal_confidence), but:
+      - the paths are copied once step-major and sorted in place per step;
+        every stepwise percentile is then an index lookup (linear
+        interpolation, as np.percentile does) instead of a partition per
+        percentile per step
+      - CVaR reads the worst losses straight off the sorted final step
+    """
+    arr = np.asarray(arr, dtype=float)
+    if arr.ndim == 1:
+        arr = arr.reshape(1, -1)
+    n_paths = arr.shape[0]
 
-    arr = _to_numpy(paths)
-
-    # S0
     if S0 is None:
         S0 = float(np.median(arr[:, 0]))
-    final_percentiles = compute_percentiles(paths, percentiles)
+    if prob_thresholds is None:
+        prob_thresholds = DEFAULT_PROB_THRESHOLDS
+
+    # step-major so every sort runs over contiguous memory
+    by_step = np.ascontiguousarray(arr.T)
+    by_step.sort(axis=1)
+    quantiles = _sorted_percentiles(by_step, percentiles)
+    quantile_rows = quantiles.T.tolist()
+    keys = [str(p) for p in percentiles]
+    step_percentiles = {
+        t: dict(zip(keys, row))
+        for t, row in enumerate(quantile_rows)
+    }
     percentiles_at_final = {
-        p: float(final_percentiles[p][-1])
-        for p in percentiles
+        p: float(quantiles[i, -1])
+        for i, p in enumerate(percentiles)
     }
 
-    step_percentiles = compute_step_percentiles(paths, percentiles)
-
-    if prob_thresholds is None:
-        prob_thresholds = {
-            "add": (1.08, 0.45),
-            "reduce": (0.968, 0.35)
-        }
-
+    final = arr[:, -1]
+    sorted_final = by_step[-1]
     probs = {}
     actions = []
-
+    cv_estimates = {} if control is not None and n_paths > 1 else None
+    if cv_estimates is not None:
+        X = np.asarray(control["terminal"], dtype=float)
+        m, s = control["log_mean"], control["log_std"]
+        cv_estimates["mean_final"] = control_variate_estimate(final, X, float(np.exp(m + 0.5 * s * s)))
+        cv_estimates["prob_checks"] = {}
     for label, (ratio, prob_thresh) in prob_thresholds.items():
         target = S0 * ratio
 
         if label == "reduce":
-            p = prob_below(paths, target, at_step=-1)
+            hits = final < target
         else:
-            p = prob_exceed(paths, target, at_step=-1)
+            hits = final > target
+        p = float(hits.mean())
+
+        if cv_estimates is not None:
+            # P(X < target) for the lognormal control, in closed form
+            x_below = float(ndtr((np.log(target) - m) / s)) if s > 0 else float(np.log(target) > m)
+            if label == "reduce":
+                est = control_variate_estimate(hits.astype(float), (X < target).astype(float), x_below)
+            else:
+                est = control_variate_estimate(hits.astype(float), (X > target).astype(float), 1.0 - x_below)
+            cv_estimates["prob_checks"][label] = est
+            p = float(min(1.0, max(0.0, est["estimate"])))
 
         probs[label] = {"target": target, "prob": p}
 
@@ -227,10 +376,37 @@ def generate_signals_from_paths(
         if label == "reduce" and p > prob_thresh:
             actions.append("consider_reduce")
 
-    # CVaR, scenario, confidence
-    tail_risk = cvar(paths, alpha=0.95, at_step=-1)
-    bucket = scenario_bucket_for_price_ratio(paths, S0)
-    conf = signal_confidence(paths)
+    # CVaR95 of losses against the median starting value (see cvar);
+    # sorted_final is ascending, so the losses come out largest first
+    losses = np.maximum(float(np.median(arr[:, 0])) - sorted_final, 0)
+    k = max(1, int((1 - 0.95) * n_paths))
+    tail_risk = float(np.mean(losses[:k]))
+
+    standard_errors = estimator_standard_errors(
+        final, float(np.median(arr[:, 0])), percentiles,
+        {label: S0 * ratio for label, (ratio, _) in prob_thresholds.items()},
+        cuts=cuts
+    )
+
+    ratios = final / float(S0)
+    bull = (ratios >= 1.2).mean()
+    bear = (ratios <= 0.9).mean()
+    flat = 1.0 - (bull + bear)
+    majority = "flat"
+    if bull > max(bear, flat):
+        majority = "bull"
+    elif bear > max(bull, flat):
+        majority = "bear"
+    bucket = {"bull": float(bull), "flat": float(flat), "bear": float(bear), "majority": majority}
+    if include_ratios:
+        bucket["ratios"] = ratios.tolist()
+
+    conf = 0.0
+    if n_paths > 1:
+        mean = float(np.mean(final))
+        std = float(np.std(final))
+        cv = 1.0 if mean == 0 else std / abs(mean)
+        conf = float(min(1.0, max(0.0, max(0.0, 1.0 - cv))))
 
     return {
         "S0": S0,
@@ -240,5 +416,29 @@ def generate_signals_from_paths(
         "tail_risk_cvar95": tail_risk,
         "scenario": bucket,
         "suggested_actions": list(set(actions)) or ["hold"],
-        "confidence": conf
+        "confidence": conf,
+        "standard_errors": standard_errors,
+        **({"control_variate": cv_estimates} if cv_estimates is not None else {})
     }
+
+def generate_signals_from_paths(
+        paths: Paths,
+        S0: float = None,
+        steps: int = None,
+        horizon_days: int = None,
+        percentiles: List[int] = [5, 25, 50, 75, 95],
+        prob_thresholds: Dict[str, Tuple[float, float]] = None,
+        include_ratios: bool = True,
+        control: Dict[str, Any] = None,
+        cuts: np.ndarray = None
+    ) -> Dict[str, Any]:
+
+    return path_analytics(
+        _to_numpy(paths),
+        S0=S0,
+        percentiles=percentiles,
+        prob_thresholds=prob_thresholds,
+        include_ratios=include_ratios,
+        control=control,
+        cuts=cuts
+    )
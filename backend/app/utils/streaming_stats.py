@@ -0,0 +1,314 @@
+import os
+import numpy as np
+from typing import Any, Dict, List, Tuple
+from dotenv import load_dotenv
+
+from app.utils.signals import DEFAULT_PROB_THRESHOLDS
+
+load_dotenv()
+
+# relative accuracy of every streamed quantile: |estimate - exact| <= alpha * |exact|
+STREAM_RELATIVE_ACCURACY = float(os.getenv("STREAM_RELATIVE_ACCURACY", "0.005"))
+# bins per step; past this the lowest bins are collapsed (only the smallest quantiles lose accuracy)
+STREAM_MAX_BINS = int(os.getenv("STREAM_MAX_BINS", "4096"))
+
+# prices are positive; anything below this is binned with it
+MIN_SKETCH_VALUE = 1e-12
+
+
+class StepQuantileSketch:
+    """
+    Mergeable log-bucket quantile sketch (DDSketch) kept for every time step at once.
+    Bucket k holds values in (gamma^(k-1), gamma^k] with gamma = (1+a)/(1-a), so
+    reporting its midpoint 2*gamma^k/(gamma+1) is within relative error a of any
+    value in it. Memory is n_steps * bins, independent of the number of paths.
+    With track_sums, per-bucket value sums are kept too (for tail means).
+    """
+
+    def __init__(self, n_steps: int, relative_accuracy: float = STREAM_RELATIVE_ACCURACY,
+                 max_bins: int = STREAM_MAX_BINS, track_sums: bool = False):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        self.n_steps = n_steps
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = np.log(self.gamma)
+        self.max_bins = max_bins
+        self.key_min = 0
+        self.counts = np.zeros((n_steps, 0), dtype=np.int64)
+        self.sums = np.zeros((n_steps, 0)) if track_sums else None
+        self.count = 0
+        self.collapsed = False
+
+    @property
+    def n_bins(self) -> int:
+        return self.counts.shape[1]
+
+    def _keys(self, values: np.ndarray) -> np.ndarray:
+        logs = np.log(np.maximum(values, MIN_SKETCH_VALUE))
+        return np.ceil(logs / self._log_gamma).astype(np.int64)
+
+    def _cover(self, lo: int, hi: int):
+        """Grow the bin range to [lo, hi], collapsing the lowest keys past max_bins."""
+        if self.n_bins:
+            lo = min(lo, self.key_min)
+            hi = max(hi, self.key_min + self.n_bins - 1)
+        if hi - lo + 1 > self.max_bins:
+            lo = hi - self.max_bins + 1
+            self.collapsed = True
+        if self.n_bins and lo == self.key_min and hi - lo + 1 == self.n_bins:
+            return
+
+        counts = np.zeros((self.n_steps, hi - lo + 1), dtype=np.int64)
+        sums = np.zeros(counts.shape) if self.sums is not None else None
+        if self.n_bins:
+            # existing keys below the new lo fold into its first bin
+            old_keys = np.maximum(np.arange(self.key_min, self.key_min + self.n_bins), lo) - lo
+            for step in range(self.n_steps):
+                np.add.at(counts[step], old_keys, self.counts[step])
+                if sums is not None:
+                    np.add.at(sums[step], old_keys, self.sums[step])
+        self.key_min = lo
+        self.counts = counts
+        self.sums = sums
+
+    def add(self, values: np.ndarray):
+        """values: (n, n_steps), one row per path."""
+        values = np.asarray(values, dtype=float)
+        keys = self._keys(values)
+        self._cover(int(keys.min()), int(keys.max()))
+        n_bins = self.n_bins
+        flat = np.maximum(keys - self.key_min, 0) + np.arange(self.n_steps) * n_bins
+        size = self.n_steps * n_bins
+        self.counts += np.bincount(flat.ravel(), minlength=size).reshape(self.n_steps, n_bins)
+        if self.sums is not None:
+            self.sums += np.bincount(flat.ravel(), weights=values.ravel(), minlength=size).reshape(self.n_steps, n_bins)
+        self.count += values.shape[0]
+
+    def merge(self, other: "StepQuantileSketch"):
+        if other.n_steps != self.n_steps or other.gamma != self.gamma:
+            raise ValueError("Can only merge sketches with the same steps and accuracy")
+        if not other.count:
+            return
+        self._cover(other.key_min, other.key_min + other.n_bins - 1)
+        keys = np.maximum(np.arange(other.key_min, other.key_min + other.n_bins), self.key_min) - self.key_min
+        for step in range(self.n_steps):
+            np.add.at(self.counts[step], keys, other.counts[step])
+            if self.sums is not None and other.sums is not None:
+                np.add.at(self.sums[step], keys, other.sums[step])
+        self.count += other.count
+        self.collapsed = self.collapsed or other.collapsed
+
+    def bin_edges(self) -> Tuple[np.ndarray, np.ndarray]:
+        upper = self.gamma ** np.arange(self.key_min, self.key_min + self.n_bins)
+        return upper / self.gamma, upper
+
+    def bin_values(self) -> np.ndarray:
+        keys = np.arange(self.key_min, self.key_min + self.n_bins)
+        return 2 * self.gamma ** keys / (self.gamma + 1)
+
+    def quantiles(self, percentiles: List[int]) -> np.ndarray:
+        """
+        (len(percentiles), n_steps) estimates of np.percentile(values, p, axis=0):
+        the same linear interpolation between order statistics, each order
+        statistic read from its bucket.
+        """
+        if not self.count:
+            raise ValueError("Sketch is empty")
+        cumulative = np.cumsum(self.counts, axis=1)
+        values = self.bin_values()
+        n = self.count
+        out = np.empty((len(percentiles), self.n_steps))
+        for i, p in enumerate(percentiles):
+            virtual = p / 100 * (n - 1)
+            lo = int(np.floor(virtual))
+            hi = min(lo + 1, n - 1)
+            t = virtual - lo
+            a = values[np.argmax(cumulative > lo, axis=1)]
+            b = values[np.argmax(cumulative > hi, axis=1)]
+            out[i] = a + (b - a) * t
+        return out
+
+
+class RunningMoments:
+    """Per-step count, mean and sum of squared deviations, merged with Chan's formula."""
+
+    def __init__(self, n_steps: int):
+        self.count = 0
+        self.mean = np.zeros(n_steps)
+        self.m2 = np.zeros(n_steps)
+
+    def _combine(self, count, mean, m2):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total)
+        self.m2 = self.m2 + m2 + delta * delta * (self.count * count / total)
+        self.count = total
+
+    def add(self, values: np.ndarray):
+        if len(values):
+            mean = values.mean(axis=0)
+            self._combine(len(values), mean, ((values - mean) ** 2).sum(axis=0))
+
+    def merge(self, other: "RunningMoments"):
+        if other.count:
+            self._combine(other.count, other.mean, other.m2)
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.m2 / self.count) if self.count else np.zeros_like(self.mean)
+
+
+class StreamingPathStats:
+    """
+    Constant-memory replacement for path_analytics over paths that arrive in chunks.
+    Every chunk updates:
+      - a quantile sketch per step (stepwise and final percentiles)
+      - running moments per step (mean / std, confidence)
+      - exact counters for the probability checks and the scenario buckets
+      - a final-step sketch with per-bucket loss sums (CVaR95)
+    Instances from different workers merge, so chunks can run anywhere.
+    Losses are measured from S0, which is the starting value of every path.
+    """
+
+    def __init__(self, S0: float, n_steps: int,
+                 prob_thresholds: Dict[str, Tuple[float, float]] = None,
+                 relative_accuracy: float = STREAM_RELATIVE_ACCURACY,
+                 max_bins: int = STREAM_MAX_BINS,
+                 bull_thresh: float = 1.2, bear_thresh: float = 0.9):
+        self.S0 = float(S0)
+        self.n_steps = n_steps
+        self.prob_thresholds = dict(prob_thresholds or DEFAULT_PROB_THRESHOLDS)
+        self.bull_thresh = bull_thresh
+        self.bear_thresh = bear_thresh
+        self.steps = StepQuantileSketch(n_steps, relative_accuracy, max_bins)
+        self.final_sketch = StepQuantileSketch(1, relative_accuracy, max_bins, track_sums=True)
+        self.moments = RunningMoments(n_steps)
+        self.prob_counts = {label: 0 for label in self.prob_thresholds}
+        self.bull = 0
+        self.bear = 0
+        self.chunks = 0
+
+    @property
+    def count(self) -> int:
+        return self.moments.count
+
+    def add(self, paths: np.ndarray):
+        arr = np.asarray(paths, dtype=float)
+        if arr.ndim == 1:
+            arr = arr.reshape(1, -1)
+        if arr.shape[1] != self.n_steps:
+            raise ValueError(f"Expected paths with {self.n_steps} points, got {arr.shape[1]}")
+
+        final = arr[:, -1]
+        self.steps.add(arr)
+        self.final_sketch.add(final.reshape(-1, 1))
+        self.moments.add(arr)
+
+        for label, (ratio, _) in self.prob_thresholds.items():
+            target = self.S0 * ratio
+            hits = final < target if label == "reduce" else final > target
+            self.prob_counts[label] += int(np.count_nonzero(hits))
+        ratios = final / self.S0
+        self.bull += int(np.count_nonzero(ratios >= self.bull_thresh))
+        self.bear += int(np.count_nonzero(ratios <= self.bear_thresh))
+        self.chunks += 1
+
+    def merge(self, other: "StreamingPathStats"):
+        self.steps.merge(other.steps)
+        self.final_sketch.merge(other.final_sketch)
+        self.moments.merge(other.moments)
+        for label, hits in other.prob_counts.items():
+            self.prob_counts[label] += hits
+        self.bull += other.bull
+        self.bear += other.bear
+        self.chunks += other.chunks
+
+    def _cvar(self, alpha: float = 0.95) -> Tuple[float, float]:
+        """
+        Mean of the k largest losses max(S0 - S_T, 0), k as in cvar(), and a bound
+        on its absolute error. Walks the final-step buckets from the lowest price
+        up: whole buckets below S0 are exact, while the bucket cut at k and the
+        one straddling S0 can each be off by at most their width per path taken.
+        """
+        sketch = self.final_sketch
+        k = max(1, int((1 - alpha) * sketch.count))
+        counts = sketch.counts[0]
+        loss_sums = np.maximum(counts * self.S0 - sketch.sums[0], 0.0)
+        before = np.cumsum(counts) - counts
+        take = np.clip(k - before, 0, counts)
+        tail = float((loss_sums * (take / np.maximum(counts, 1))).sum() / k)
+
+        lower, upper = sketch.bin_edges()
+        approx = (take > 0) & ((take < counts) | ((lower < self.S0) & (upper > self.S0)))
+        error = float(((upper - lower) * take)[approx].sum() / k)
+        return tail, error
+
+    def to_signals(self, percentiles: List[int] = [5, 25, 50, 75, 95]) -> Dict[str, Any]:
+        """Same fields as path_analytics(include_ratios=False), plus moments and accuracy."""
+        if not self.count:
+            raise ValueError("No paths have been added")
+        n = self.count
+        quantiles = self.steps.quantiles(percentiles)
+        keys = [str(p) for p in percentiles]
+        step_percentiles = {
+            t: dict(zip(keys, row))
+            for t, row in enumerate(quantiles.T.tolist())
+        }
+        percentiles_at_final = {
+            p: float(quantiles[i, -1])
+            for i, p in enumerate(percentiles)
+        }
+
+        probs = {}
+        actions = []
+        for label, (ratio, prob_thresh) in self.prob_thresholds.items():
+            p = self.prob_counts[label] / n
+            probs[label] = {"target": self.S0 * ratio, "prob": p}
+            if label == "add" and p > prob_thresh:
+                actions.append("consider_add")
+            if label == "reduce" and p > prob_thresh:
+                actions.append("consider_reduce")
+
+        bull = self.bull / n
+        bear = self.bear / n
+        flat = 1.0 - (bull + bear)
+        majority = "flat"
+        if bull > max(bear, flat):
+            majority = "bull"
+        elif bear > max(bull, flat):
+            majority = "bear"
+
+        means = self.moments.mean
+        stds = self.moments.std
+        conf = 0.0
+        if n > 1:
+            mean, std = float(means[-1]), float(stds[-1])
+            cv = 1.0 if mean == 0 else std / abs(mean)
+            conf = float(min(1.0, max(0.0, max(0.0, 1.0 - cv))))
+
+        tail_risk, tail_error = self._cvar(0.95)
+        return {
+            "S0": self.S0,
+            "percentiles_final": percentiles_at_final,
+            "percentiles_stepwise": step_percentiles,
+            "prob_checks": probs,
+            "tail_risk_cvar95": tail_risk,
+            "scenario": {"bull": float(bull), "flat": float(flat), "bear": float(bear), "majority": majority},
+            "suggested_actions": list(set(actions)) or ["hold"],
+            "confidence": conf,
+            "moments_stepwise": {"mean": means.tolist(), "std": stds.tolist()},
+            "accuracy": {
+                "method": "log-bucket quantile sketch",
+                "num_paths": n,
+                "chunks": self.chunks,
+                # every percentile is within this relative error of the exact value
+                "percentile_relative_error": self.steps.relative_accuracy,
+                "cvar_abs_error_bound": tail_error,
+                "exact": ["prob_checks", "scenario", "confidence", "moments_stepwise"],
+                # true if prices spanned more than max_bins buckets; the lowest
+                # percentiles are then only upper bounds
+                "collapsed": self.steps.collapsed or self.final_sketch.collapsed,
+                "bins": self.steps.n_bins,
+            },
+        }
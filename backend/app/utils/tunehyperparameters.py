@@ -1,86 +1,222 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
 import numpy as np
-import app.models.tiny_mlp 
+from dotenv import load_dotenv
+
+from app.models.tiny_mlp import ADAM_LR, INIT_SEED, _prepare_returns, _init_tiny_mlp_numba, _adam_epochs_numba
+
+load_dotenv()
+
+# processes training search configurations in parallel; 1 trains them in-process.
+# Unset: one per CPU in the API process, 1 inside a simulation executor worker,
+# since those already run one per CPU
+TUNE_WORKERS = os.getenv("TUNE_WORKERS")
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _default_workers():
+    if TUNE_WORKERS is not None:
+        return int(TUNE_WORKERS)
+    if multiprocessing.parent_process() is not None:
+        return 1
+    return os.cpu_count() or 1
+
+
+def _get_pool(workers):
+    """The process pool of this size, started on first use and shared by every search."""
+    with _pools_lock:
+        if workers not in _pools:
+            _pools[workers] = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pools[workers]
+
+
+def _drop_pool(workers):
+    with _pools_lock:
+        pool = _pools.pop(workers, None)
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+BATCH_SIZE = 64
+
+
+def _train_config(X, y, n_val, hidden_dim, epochs, state=None, deadline=None):
+    """
+    Train one configuration with Adam for `epochs` more epochs on all but the
+    last n_val samples, resuming from `state` (theta, m, v, step) or a fresh
+    init, and score it on those n_val.
+    deadline (time.time()) is checked before every epoch, so a search that ran
+    out of budget doesn't leave its configurations training on the shared pool;
+    past it the score is None.
+    Returns (state, validation RMSE in normalised units); runs in the search processes.
+    """
+    if state is None:
+        theta = np.concatenate([w.ravel() for w in _init_tiny_mlp_numba(X.shape[1], hidden_dim, INIT_SEED)])
+        state = (theta, np.zeros_like(theta), np.zeros_like(theta), 0)
+    theta, m, v, step = state
+    loss = np.inf
+    # one epoch per call, whether or not there is a deadline, so results don't depend on it
+    for _ in range(epochs):
+        if deadline is not None and time.time() >= deadline:
+            return (theta, m, v, step), None
+        step, _, _, loss = _adam_epochs_numba(
+            X[:-n_val], y[:-n_val], X[-n_val:], y[-n_val:], theta, m, v, step,
+            hidden_dim, 1, ADAM_LR, BATCH_SIZE, 0, INIT_SEED + step,
+        )
+    return (theta, m, v, step), float(np.sqrt(loss))
+
+
+def _rung_epochs(search_epochs, min_epochs):
+    """Cumulative epoch counts at which configurations are compared."""
+    rungs = sorted({int(e) for e in search_epochs if e > min_epochs})
+    return [int(min_epochs)] + rungs
+
+
 def tune_mlp_hyperparams(
     historical,
     search_window=[30, 40, 50, 60],
     search_hidden=[16, 32, 48],
-    search_epochs=[60, 100, 140],
+    search_epochs=[20, 40, 80],
     search_max_return=[0.05, 0.08, 0.10],
     steps=30,
-    horizon_days=60
+    horizon_days=60,
+    val_size=50,
+    min_epochs=5,
+    keep_fraction=0.5,
+    time_budget=None,
+    workers=None,
 ):
-
+    """
+    Successive halving over (window, hidden_dim): every configuration trains
+    (mini-batch Adam) for min_epochs, then at each rung of search_epochs only
+    the best keep_fraction (by validation RMSE on the last val_size returns)
+    keeps training, resuming from its weights and optimizer state. The epochs
+    chosen are the rung where the winner's validation error was lowest.
+    Configurations of one rung train in parallel on a shared pool of `workers`
+    processes (see TUNE_WORKERS); each window's _prepare_returns output is computed once.
+    time_budget (seconds) stops the search early, keeping the best result so far;
+    configurations still training stop at their next epoch, so no work outlives it.
+    Returns {"best_params", "best_error", "results" (one entry per trained
+    configuration and rung), "elapsed", "budget_exhausted"}; best_params is
+    None if nothing finished inside the budget.
+    """
+    start = time.perf_counter()
+    deadline = None if time_budget is None else time.time() + time_budget
     prices = np.asarray(historical, dtype=float)
+    workers = _default_workers() if workers is None else workers
 
-    best_error = 1e12
-    best_cfg = None
+    prepared = {}
+    for w in search_window:
+        if len(prices) > w + 5 + val_size:
+            X, y, _, norm = _prepare_returns(prices, window=w)
+            prepared[w] = (np.ascontiguousarray(X), np.ascontiguousarray(y), norm["y_std"])
+    if not prepared:
+        raise ValueError("Not enough data to tune Tiny MLP with a validation split.")
+
+    survivors = [(w, h) for w in prepared for h in search_hidden]
+    states = {}
     results = []
-    log_prices = np.log(prices + 1e-9)
-    returns = np.diff(log_prices)
-    val_true = returns[-50:]
+    best, best_error = None, np.inf
+    budget_exhausted = False
+    trained = 0
 
-    for w in search_window:
-        if len(prices) <= w + 5:
-            continue 
-        X, y, _, norm = _prepare_returns(prices, window=w)
-
-        for h in search_hidden:
-            for ep in search_epochs:
-                W1, b1, W2, b2 = _train_tiny_mlp_numba(
-                    X, y,
-                    hidden_dim=h,
-                    epochs=ep,
-                    lr=0.01
-                )
-                preds_norm = _mlp_forward_numba(W1, b1, W2, b2, X)
-                resid_norm = y - preds_norm
-                resid_real = resid_norm * norm["y_std"]
-                err = float(np.std(resid_real))
-                score = err
+    pool = _get_pool(workers) if workers > 1 else None
+    futures = {}
+
+    def remaining():
+        return None if time_budget is None else time_budget - (time.perf_counter() - start)
 
+    try:
+        for rung, total_epochs in enumerate(_rung_epochs(search_epochs, min_epochs)):
+            extra = total_epochs - trained
+            scores = {}
+            if pool is None:
+                for cfg in survivors:
+                    left = remaining()
+                    if left is not None and left <= 0:
+                        budget_exhausted = True
+                        break
+                    X, y, _ = prepared[cfg[0]]
+                    states[cfg], scores[cfg] = _train_config(X, y, val_size, cfg[1], extra, states.get(cfg), deadline)
+            else:
+                futures = {
+                    pool.submit(
+                        _train_config, *prepared[cfg[0]][:2], val_size, cfg[1], extra, states.get(cfg), deadline
+                    ): cfg
+                    for cfg in survivors
+                }
+                pending = set(futures)
+                while pending:
+                    left = remaining()
+                    if left is not None and left <= 0:
+                        budget_exhausted = True
+                        for future in pending:
+                            future.cancel()
+                        break
+                    done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        cfg = futures[future]
+                        states[cfg], scores[cfg] = future.result()
+            trained = total_epochs
+            if any(score is None for score in scores.values()):
+                # cut off by the deadline mid-training: not comparable, drop them
+                budget_exhausted = True
+
+            errors = {cfg: score * prepared[cfg[0]][2] for cfg, score in scores.items() if score is not None}
+            for (w, h), error in errors.items():
                 results.append({
                     "window": w,
                     "hidden_dim": h,
-                    "epochs": ep,
+                    "epochs": total_epochs,
+                    "rung": rung,
                     "max_return": None,
-                    "score": score,
+                    "score": float(error),
                 })
+                if error < best_error:
+                    best_error = error
+                    best = (w, h, total_epochs)
 
-                if score < best_error:
-                    best_error = score
-                    best_cfg = (w, h, ep)
-
-    w, h, ep = best_cfg
-
-    _, _, _, norm = _prepare_returns(prices, window=w)
-    X, y, ret_series, norm = _prepare_returns(prices, window=w)
-    
-    W1, b1, W2, b2 = _train_tiny_mlp_numba(X, y, h, ep, 0.01)
-    preds_norm = _mlp_forward_numba(W1, b1, W2, b2, X)
-    resid_real = (y - preds_norm) * norm["y_std"]
-    base_std = float(np.std(resid_real))
-
-    best_mr = None
-    best_mr_err = 1e12
-
-    for mr in search_max_return:
-        
-        smooth_err = abs(mr - base_std)
-        if smooth_err < best_mr_err:
-            best_mr = mr
-            best_mr_err = smooth_err
-
-    best_params = {
-        "window": w,
-        "hidden_dim": h,
-        "epochs": ep,
-        "max_return": best_mr,
-        "horizon_days": horizon_days,
-        "steps": steps,
-    }
+            if budget_exhausted or len(errors) <= 1:
+                break
+            ranked = sorted(errors, key=errors.get)
+            survivors = ranked[:max(1, int(np.ceil(len(ranked) * keep_fraction)))]
+            states = {cfg: states[cfg] for cfg in survivors}
+    except BrokenProcessPool:
+        # a worker died; start a fresh pool for the next search
+        _drop_pool(workers)
+        raise
+    finally:
+        # on budget exhaustion or an error: drop queued work, the shared pool stays up
+        for future in futures:
+            future.cancel()
+
+    best_params = None
+    if best is not None:
+        w, h, ep = best
+        # max_return: the candidate closest to the winner's validation residual std
+        best_mr = min(search_max_return, key=lambda mr: abs(mr - best_error))
+        best_params = {
+            "window": w,
+            "hidden_dim": h,
+            "epochs": ep,
+            "max_return": best_mr,
+            "horizon_days": horizon_days,
+            "steps": steps,
+        }
 
     return {
         "best_params": best_params,
-        "best_error": float(best_error),
-        "results": results
+        "best_error": float(best_error) if best is not None else None,
+        "results": results,
+        "elapsed": round(time.perf_counter() - start, 3),
+        "budget_exhausted": budget_exhausted,
     }
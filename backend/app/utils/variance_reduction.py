@@ -0,0 +1,125 @@
+import warnings
+import numpy as np
+from scipy.special import ndtri
+from scipy.stats import qmc
+
+from app.utils.random_streams import as_generator
+
+# path-generation options shared by gbm, ou, heston and jump_diffusion
+VARIANCE_REDUCTION = ("none", "antithetic", "moment_matching", "sobol")
+
+# batches for batch-means standard errors; Sobol draws use one independent
+# scramble per batch of a call, so whole scrambles are independent replicates
+SE_BATCHES = 16
+
+# scipy's Sobol direction numbers stop here
+MAX_SOBOL_DIMS = 21201
+
+
+def batch_bounds(n, batches=SE_BATCHES):
+    """Start/stop indices of `batches` contiguous, near-equal batches of n items."""
+    batches = max(1, min(batches, n))
+    return [n * i // batches for i in range(batches + 1)]
+
+
+def independent_bounds(method, num_paths):
+    """
+    Indices in [0, num_paths] where the paths of one normal_draws call split
+    into mutually independent groups: every path for "none", whole antithetic
+    pairs, whole Sobol scrambles, and only the whole call for
+    "moment_matching" (each column is rescaled over every path).
+    """
+    if method == "antithetic":
+        return np.unique(np.append(np.arange(0, num_paths + 1, 2), num_paths))
+    if method == "sobol":
+        return np.array(batch_bounds(num_paths))
+    if method == "moment_matching":
+        return np.array([0, num_paths])
+    return np.arange(num_paths + 1)
+
+
+def brownian_bridge(normals):
+    """
+    Map (n, steps) standard normals to Brownian increments on a unit grid with
+    Brownian-bridge ordering: column 0 fixes the endpoint, the next columns the
+    midpoints of ever finer intervals. Low-discrepancy points put their best
+    coordinates on the coarse path shape, which is what QMC needs to beat MC.
+    Returns (n, steps) increments, each N(0, 1).
+    """
+    n, steps = normals.shape
+    W = np.zeros((n, steps + 1))
+    W[:, steps] = np.sqrt(steps) * normals[:, 0]
+
+    k = 1
+    intervals = [(0, steps)]
+    while intervals:
+        next_intervals = []
+        for left, right in intervals:
+            if right - left < 2:
+                continue
+            mid = (left + right) // 2
+            w_left = (right - mid) / (right - left)
+            w_right = (mid - left) / (right - left)
+            std = np.sqrt((mid - left) * (right - mid) / (right - left))
+            W[:, mid] = w_left * W[:, left] + w_right * W[:, right] + std * normals[:, k]
+            k += 1
+            next_intervals += [(left, mid), (mid, right)]
+        intervals = next_intervals
+    return np.diff(W, axis=1)
+
+
+def _sobol_normals(rng, num_paths, dims):
+    if dims > MAX_SOBOL_DIMS:
+        raise ValueError(f"Sobol sampling supports at most {MAX_SOBOL_DIMS} dimensions (steps x factors)")
+    bounds = batch_bounds(num_paths)
+    out = np.empty((num_paths, dims))
+    with warnings.catch_warnings():
+        # batch sizes are rarely powers of two; the balance warning is expected
+        warnings.simplefilter("ignore", UserWarning)
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            sampler = qmc.Sobol(d=dims, scramble=True, seed=rng)
+            out[start:stop] = sampler.random(stop - start)
+    return ndtri(np.clip(out, 1e-12, 1 - 1e-12))
+
+
+def normal_draws(rng, num_paths, steps, factors=1, method="none"):
+    """
+    Standard normal shocks of shape (factors, num_paths, steps).
+    method:
+      - "none": plain pseudo-random draws
+      - "antithetic": paths come in adjacent (Z, -Z) pairs
+      - "moment_matching": every (factor, step) column rescaled to mean 0, std 1
+      - "sobol": scrambled Sobol points (SE_BATCHES scrambles per call), inverse-CDF
+        to normals and assembled per factor with a Brownian bridge
+    """
+    if method not in VARIANCE_REDUCTION:
+        raise ValueError(f"variance_reduction must be one of {list(VARIANCE_REDUCTION)}")
+    rng = as_generator(rng)
+
+    if method == "antithetic":
+        half = rng.standard_normal((factors, (num_paths + 1) // 2, steps))
+        pairs = np.stack([half, -half], axis=2).reshape(factors, -1, steps)
+        return pairs[:, :num_paths]
+
+    if method == "sobol":
+        z = _sobol_normals(rng, num_paths, steps * factors).reshape(num_paths, steps, factors)
+        return np.stack([brownian_bridge(z[:, :, f]) for f in range(factors)])
+
+    Z = rng.standard_normal((factors, num_paths, steps))
+    if method == "moment_matching" and num_paths > 1:
+        Z -= Z.mean(axis=1, keepdims=True)
+        Z /= Z.std(axis=1, keepdims=True)
+    return Z
+
+
+def gbm_control(S0, log_increments, log_drift, log_vol, T):
+    """
+    GBM control variate driven by the model's own shocks: terminal values
+    S0 * exp(sum of log_increments) with log S_T ~ N(log S0 + log_drift*T, log_vol^2*T)
+    known in closed form. Returned as the "control" entry of a model result.
+    """
+    return {
+        "terminal": S0 * np.exp(log_increments.sum(axis=1)),
+        "log_mean": float(np.log(S0) + log_drift * T),
+        "log_std": float(log_vol * np.sqrt(T)),
+    }
@@ -0,0 +1,206 @@
+import asyncio
+import os
+
+import httpx
+import numpy as np
+import pytest
+
+from app.services import candle_store as cs
+from app.services.candle_store import CandleStore, INTERVAL_MS
+
+INTERVAL = "1m"
+STEP = INTERVAL_MS[INTERVAL]
+# first candle the stand-in exchange knows about
+GENESIS = 1_700_000_000_000 - 1_700_000_000_000 % STEP
+
+
+class FakeKlines:
+    """
+    Stand-in for Binance's klines endpoint over one synthetic 1m series:
+    startTime/endTime/limit behave like the real API (startTime pages forward,
+    endTime alone returns the latest candles before it), and only candles that
+    have opened by `now` exist. Every request is recorded.
+    """
+
+    def __init__(self, now):
+        self.now = now
+        self.requests = []
+
+    def handler(self, request):
+        params = dict(request.url.params)
+        self.requests.append(params)
+        limit = int(params.get("limit", 500))
+        opens = np.arange(GENESIS, self.now + 1, STEP)
+        if "startTime" in params:
+            opens = opens[opens >= int(params["startTime"])]
+            if "endTime" in params:
+                opens = opens[opens <= int(params["endTime"])]
+            opens = opens[:limit]
+        else:
+            if "endTime" in params:
+                opens = opens[opens <= int(params["endTime"])]
+            opens = opens[-limit:]
+        return httpx.Response(200, json=[self.row(int(t)) for t in opens])
+
+    @staticmethod
+    def row(open_time):
+        close = 100 + (open_time - GENESIS) // STEP * 0.01
+        return [
+            open_time, f"{close - 0.005:.8f}", f"{close + 0.01:.8f}", f"{close - 0.01:.8f}",
+            f"{close:.8f}", "1.5", open_time + STEP - 1, "0", 10, "0", "0", "0",
+        ]
+
+
+@pytest.fixture
+def exchange(monkeypatch):
+    # mid-candle, so the latest candle is still open
+    fake = FakeKlines(GENESIS + 5000 * STEP + STEP // 2)
+    monkeypatch.setattr(cs, "_now_ms", lambda: fake.now)
+    return fake
+
+
+@pytest.fixture
+def store(tmp_path, exchange):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(exchange.handler))
+    yield CandleStore(root=str(tmp_path), base_url="http://klines.test/api/v3/klines", client=client)
+    asyncio.run(client.aclose())
+
+
+def _expected_opens(exchange, count):
+    last_open = exchange.now - (exchange.now - GENESIS) % STEP
+    return np.arange(last_open - (count - 1) * STEP, last_open + 1, STEP)
+
+
+def _assert_contiguous(columns):
+    assert np.all(np.diff(columns["open_time"]) == STEP)
+    assert np.array_equal(columns["close_time"], columns["open_time"] + STEP - 1)
+    expected_close = 100 + (columns["open_time"] - GENESIS) // STEP * 0.01
+    assert np.allclose(columns["close"], expected_close)
+
+
+def test_first_fetch_returns_latest_candles_and_persists_closed_ones(store, exchange):
+    columns = asyncio.run(store.get("btcusdt", INTERVAL, 50))
+
+    assert np.array_equal(columns["open_time"], _expected_opens(exchange, 50))
+    _assert_contiguous(columns)
+    assert len(exchange.requests) == 1
+    assert exchange.requests[0]["symbol"] == "btcusdt"
+
+    stored = store.load("BTCUSDT", INTERVAL)
+    # the still-open candle is served but not persisted
+    assert np.array_equal(stored["open_time"], columns["open_time"][:-1])
+    assert os.listdir(os.path.dirname(store._path("BTCUSDT", INTERVAL))) == ["candles.npy"]
+
+
+def test_repeat_query_is_served_without_upstream_calls(store, exchange):
+    first = asyncio.run(store.get("BTCUSDT", INTERVAL, 50))
+    calls = len(exchange.requests)
+
+    again = asyncio.run(store.get("BTCUSDT", INTERVAL, 50))
+    fewer = asyncio.run(store.get("BTCUSDT", INTERVAL, 20))
+
+    assert len(exchange.requests) == calls
+    for name in cs.COLUMNS:
+        assert np.array_equal(again[name], first[name])
+        assert np.array_equal(fewer[name], first[name][-20:])
+
+
+def test_only_the_missing_tail_is_fetched(store, exchange):
+    asyncio.run(store.get("BTCUSDT", INTERVAL, 50))
+    last_close = int(store.load("BTCUSDT", INTERVAL)["close_time"][-1])
+    exchange.now += 5 * STEP
+    exchange.requests.clear()
+
+    columns = asyncio.run(store.get("BTCUSDT", INTERVAL, 50))
+
+    assert exchange.requests == [
+        {"symbol": "BTCUSDT", "interval": INTERVAL, "startTime": str(last_close + 1), "limit": "1000"}
+    ]
+    assert np.array_equal(columns["open_time"], _expected_opens(exchange, 50))
+    stored = store.load("BTCUSDT", INTERVAL)
+    assert len(stored["open_time"]) == 49 + 5
+    _assert_contiguous(stored)
+
+
+def test_backfills_history_when_fewer_rows_are_stored_than_requested(store, exchange):
+    asyncio.run(store.get("BTCUSDT", INTERVAL, 50))
+    first_open = int(store.load("BTCUSDT", INTERVAL)["open_time"][0])
+    exchange.requests.clear()
+
+    columns = asyncio.run(store.get("BTCUSDT", INTERVAL, 1500))
+
+    assert np.array_equal(columns["open_time"], _expected_opens(exchange, 1500))
+    _assert_contiguous(columns)
+    backward = [r for r in exchange.requests if "endTime" in r]
+    assert backward[0]["endTime"] == str(first_open - 1)
+    stored = store.load("BTCUSDT", INTERVAL)
+    assert len(stored["open_time"]) == 1499
+    _assert_contiguous(stored)
+
+
+def test_gap_of_several_pages_is_backfilled_without_losing_history(store, exchange, monkeypatch):
+    monkeypatch.setattr(cs, "MAX_KLINES_PER_CALL", 10)
+    asyncio.run(store.get("BTCUSDT", INTERVAL, 40))
+    before = store.load("BTCUSDT", INTERVAL)
+    first_open = int(before["open_time"][0])
+    exchange.now += 55 * STEP
+    exchange.requests.clear()
+
+    columns = asyncio.run(store.get("BTCUSDT", INTERVAL, 40))
+
+    assert np.array_equal(columns["open_time"], _expected_opens(exchange, 40))
+    # the span is fetched as bounded pages rather than one forward crawl
+    assert all("startTime" in r and "endTime" in r for r in exchange.requests)
+    stored = store.load("BTCUSDT", INTERVAL)
+    assert int(stored["open_time"][0]) == first_open
+    assert len(stored["open_time"]) == 39 + 55
+    _assert_contiguous(stored)
+
+
+def test_stale_store_serves_latest_window_and_keeps_its_history(store, exchange, monkeypatch):
+    monkeypatch.setattr(cs, "MAX_RANGE_CANDLES", 100)
+    asyncio.run(store.get("BTCUSDT", INTERVAL, 30))
+    before = {name: np.array(col) for name, col in store.load("BTCUSDT", INTERVAL).items()}
+    exchange.now += 500 * STEP
+
+    columns = asyncio.run(store.get("BTCUSDT", INTERVAL, 30))
+
+    assert np.array_equal(columns["open_time"], _expected_opens(exchange, 30))
+    _assert_contiguous(columns)
+    after = store.load("BTCUSDT", INTERVAL)
+    for name in cs.COLUMNS:
+        assert np.array_equal(after[name], before[name])
+
+
+def test_get_range_merges_adjoining_candles_into_the_store(store, exchange):
+    asyncio.run(store.get("BTCUSDT", INTERVAL, 100))
+    stored = store.load("BTCUSDT", INTERVAL)
+    first_open, last_open = int(stored["open_time"][0]), int(stored["open_time"][-1])
+    start, end = first_open - 300 * STEP, first_open + 10 * STEP
+    exchange.requests.clear()
+
+    columns = asyncio.run(store.get_range("BTCUSDT", INTERVAL, start, end))
+
+    assert np.array_equal(columns["open_time"], np.arange(start, end + 1, STEP))
+    _assert_contiguous(columns)
+    merged = store.load("BTCUSDT", INTERVAL)
+    assert int(merged["open_time"][0]) == start
+    assert int(merged["open_time"][-1]) == last_open
+    _assert_contiguous(merged)
+
+    # now covered by the store: no upstream call
+    exchange.requests.clear()
+    inner = asyncio.run(store.get_range("BTCUSDT", INTERVAL, start + STEP, end - STEP))
+    assert exchange.requests == []
+    assert np.array_equal(inner["open_time"], np.arange(start + STEP, end, STEP))
+
+
+def test_get_range_does_not_merge_disjoint_candles(store, exchange):
+    asyncio.run(store.get("BTCUSDT", INTERVAL, 100))
+    before = np.array(store.load("BTCUSDT", INTERVAL)["open_time"])
+    start = int(before[0]) - 1000 * STEP
+
+    columns = asyncio.run(store.get_range("BTCUSDT", INTERVAL, start, start + 20 * STEP))
+
+    assert len(columns["open_time"]) == 21
+    assert np.array_equal(store.load("BTCUSDT", INTERVAL)["open_time"], before)
@@ -0,0 +1,30 @@
+import numpy as np
+
+from app.backtest.backtestEngine import backtest, backtest_batch
+from app.backtest.fama_french import (
+    fama_french_signals,
+    fama_french_strategy,
+    make_fama_french_strategy,
+)
+
+
+def _prices(n, seed=1):
+    return 100 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.02, n)))
+
+
+def test_bound_strategy_matches_per_prefix_and_batch_signals():
+    prices = _prices(400)
+    historical = [{"close": c} for c in prices]
+
+    bound = backtest(historical, make_fama_french_strategy(prices), 100)
+    per_prefix = backtest(historical, fama_french_strategy, 100)
+    batch = backtest_batch(historical, fama_french_signals, 100)
+
+    assert bound["returns"] == per_prefix["returns"] == batch["returns"]
+
+
+def test_bound_strategy_on_a_series_shorter_than_the_warm_up():
+    prices = _prices(15)
+    strategy = make_fama_french_strategy(prices)
+
+    assert [strategy(i, prices) for i in range(len(prices))] == [0] * len(prices)
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from app.backtest.backtestEngine import backtest, backtest_batch
+from app.backtest.fama_french import fama_french_signals
+from app.backtest.macdStrategy import macd_signals
+from app.backtest.smaStrategy import sma_signals
+from app.backtest.streamingStrategy import (
+    StreamingFamaFrench,
+    StreamingMACD,
+    StreamingSMA,
+    StreamingStrategy,
+)
+from app.services.candle_store import COLUMNS
+from app.services.strategy_feed import StrategyFeed
+
+STRATEGIES = [
+    (StreamingSMA, sma_signals),
+    (StreamingMACD, macd_signals),
+    (StreamingFamaFrench, fama_french_signals),
+]
+
+
+def _prices(n, seed=3):
+    return 100 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.02, n)))
+
+
+class FakeStore:
+    """The two CandleStore hooks the feed uses: add_listener and load."""
+
+    def __init__(self, closes):
+        self.listeners = []
+        self.columns = self._columns(closes, 0)
+
+    @staticmethod
+    def _columns(closes, first):
+        open_time = (first + np.arange(len(closes))) * 60_000
+        columns = {name: np.zeros(len(closes), dtype=dtype) for name, dtype in COLUMNS.items()}
+        columns.update(open_time=open_time, close_time=open_time + 59_999, close=np.asarray(closes, dtype=float))
+        return columns
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def load(self, symbol, interval):
+        return self.columns
+
+    def persist(self, closes, first):
+        new = self._columns(closes, first)
+        self.columns = {name: np.concatenate([self.columns[name], new[name]]) for name in COLUMNS}
+        for callback in self.listeners:
+            callback("btcusdt", "1m", new)
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        StreamingStrategy()
+
+
+@pytest.mark.parametrize("cls, batch", STRATEGIES)
+def test_backtest_matches_batch_signals_and_reruns_after_reset(cls, batch):
+    historical = [{"close": c} for c in _prices(300)]
+    strategy = cls()
+
+    first = backtest(historical, strategy, 100)
+    second = backtest(historical, strategy, 100)
+
+    assert first["returns"] == second["returns"] == backtest_batch(historical, batch, 100)["returns"]
+
+
+@pytest.mark.parametrize("cls, batch", STRATEGIES)
+def test_feed_warms_on_stored_candles_then_follows_new_ones(cls, batch):
+    prices = _prices(300)
+    expected = batch(prices)
+    store = FakeStore(prices[:200])
+    feed = StrategyFeed(store)
+    seen = []
+
+    sub = feed.subscribe("BTCUSDT", "1m", cls(), lambda *event: seen.append(event))
+    assert feed.latest(sub) == (200 * 60_000 - 1, expected[199])
+
+    store.persist(prices[200:250], 200)
+    store.persist(prices[250:], 250)
+
+    assert [signal for *_, signal in seen] == list(expected[200:])
+    assert seen[-1][:3] == ("BTCUSDT", "1m", 300 * 60_000 - 1)
+
+    feed.unsubscribe(sub)
+    store.persist(prices[:1], 300)
+    assert len(seen) == 100
+
+
+def test_feed_rebuilds_after_a_gap():
+    prices = _prices(300)
+    store = FakeStore(prices[:200])
+    feed = StrategyFeed(store)
+    sub = feed.subscribe("BTCUSDT", "1m", StreamingSMA())
+
+    # candles 200..209 never reach the listener
+    store.columns = FakeStore._columns(prices[:210], 0)
+    store.persist(prices[210:], 210)
+
+    rebuilt = StreamingSMA()
+    last = [rebuilt.update(p) for p in prices][-1]
+    assert feed.latest(sub) == (300 * 60_000 - 1, last)